@@ -1,9 +1,8 @@
-import xml.etree.ElementTree as ET
-
-from constants import TOKEN_TYPE
+import frontend_path # adds the shared jack_frontend package to the import path
 from exceptions import CompilationEngineError
-from JackTokenizer import JackTokenizer
-from xml_formatter import make_pretty
+from jack_frontend.constants import TOKEN_TYPE
+from jack_frontend.JackTokenizer import JackTokenizer
+from jack_frontend.xml_formatter import XmlStreamWriter
 
 class CompilationEngine():
     """Class for lexing and parsing Jack source code."""
@@ -14,10 +13,14 @@ class CompilationEngine():
         self.file_name = jack_file_path.stem
         self.debug = debug
 
-        self.tokenizer = JackTokenizer(jack_file_path, debug)
+        self.tokenizer = JackTokenizer(jack_file_path, xml_output=True, xml_name_suffix='_DEBUG' if debug else '')
 
-        # store the etree as a stack so the final xml is not flat
-        self.internal_etree_stack = [ET.Element('class')]
+        # the parse tree is streamed to the XML file as it is parsed
+        try:
+            self.xml_writer = XmlStreamWriter(self.get_output_file_path(), indent=2)
+        except OSError as error:
+            raise IOError(f"Unable to create XML class file at: '{self.get_output_file_path()}'") from error
+        self.xml_writer.open_element('class')
 
     def get_output_file_path(self):
         """
@@ -29,41 +32,36 @@ class CompilationEngine():
         return f'{self.parent_dir}/{self.file_name}.xml'
 
     def add_current_token_to_xml(self):
-        """Inserts the current token into the internal XML etree."""
+        """Inserts the current token into the XML output."""
         if self.tokenizer.current_token is not None:
-            # always use the top of the stack
-            new_token = ET.SubElement(self.internal_etree_stack[-1], self.tokenizer.current_token.type)
-            new_token.text = self.tokenizer.current_token.get_xml_value()
+            self.xml_writer.add_element(self.tokenizer.current_token.type, self.tokenizer.current_token.get_xml_value())
 
     def add_sub_element_to_xml(self, name):
-        """Creates a new sub-element in the xml and move it to the top of the etree stack."""
+        """Creates a new sub-element in the xml so subsequent elements are nested in it."""
         if name is not None:
-            new_sub_element = ET.SubElement(self.internal_etree_stack[-1], name)
-            # push onto the stack so subsequent elements are nested
-            self.internal_etree_stack.append(new_sub_element)
+            self.xml_writer.open_element(name)
+
+    def close_sub_element_in_xml(self):
+        """Closes the most recent sub-element in the xml."""
+        self.xml_writer.close_element()
 
     def insert_xml_empty_escape_string(self):
         """XML formatting helper for ensuring tags follow the <xml><xml/> format instead of </xml>."""
-        self.internal_etree_stack[-1].text = '__XML_EMPTY__'
+        self.xml_writer.mark_empty()
 
     def write_xml(self):
         """
-        Creates XML files from the tokenizer and the CompilationEngine
-        internal etrees.
-        """
+        Completes the XML files of the tokenizer and the CompilationEngine.
 
-        # first write the tokenizer's XML
+        Elements left open by a parsing error are closed.
+        """
         self.tokenizer.write_xml()
+        self.xml_writer.close()
 
-        # now write the CompilationEngine's XML
-        # get the root element of the etree which is always at the bottom of the stack
-        xml_tree = ET.ElementTree(self.internal_etree_stack[0])
-        xml_text = make_pretty(xml_tree, indent=2)
-        try:
-            with open(self.get_output_file_path(), 'w') as output_file:
-                output_file.write(xml_text)
-        except OSError as error:
-            raise IOError(f"Unable to create XML class file at: '{self.get_output_file_path()}'") from error
+    def discard_xml(self):
+        """Removes the XML files which were not completed, after an error."""
+        self.tokenizer.discard_xml()
+        self.xml_writer.discard()
 
     def get_current_token_value(self):
         """Returns the text value of the current token."""
@@ -140,7 +138,7 @@ class CompilationEngine():
 
         self.eat_token_by_value(';')
 
-        self.internal_etree_stack.pop()
+        self.close_sub_element_in_xml()
         return True
 
     def complileSubroutineDec(self):
@@ -167,7 +165,7 @@ class CompilationEngine():
         self.eat_token_by_value(')')
         self.complileSubroutineBody()
 
-        self.internal_etree_stack.pop()
+        self.close_sub_element_in_xml()
         return True
 
     def complileParameterList(self):
@@ -194,7 +192,7 @@ class CompilationEngine():
         else:
             self.insert_xml_empty_escape_string()
 
-        self.internal_etree_stack.pop()
+        self.close_sub_element_in_xml()
 
     def complileSubroutineBody(self):
         """Parses a sub-routine body."""
@@ -213,7 +211,7 @@ class CompilationEngine():
 
         self.eat_token_by_value('}')
 
-        self.internal_etree_stack.pop()
+        self.close_sub_element_in_xml()
 
     def complileVarDec(self):
         """Parses a var declaration."""
@@ -245,7 +243,7 @@ class CompilationEngine():
             else:
                 raise CompilationEngineError(self.tokenizer, f"Expected ',' or ';' not '{next_token.value}'")
 
-        self.internal_etree_stack.pop()
+        self.close_sub_element_in_xml()
         return True
 
     def complileStatements(self):
@@ -257,7 +255,7 @@ class CompilationEngine():
 
         if next_token.value not in {'let', 'if', 'while', 'do', 'return'}:
             self.insert_xml_empty_escape_string()
-            self.internal_etree_stack.pop()
+            self.close_sub_element_in_xml()
             return
 
         while True:
@@ -277,7 +275,7 @@ class CompilationEngine():
             if next_token.value not in {'let', 'if', 'while', 'do', 'return'}:
                 break
 
-        self.internal_etree_stack.pop()
+        self.close_sub_element_in_xml()
 
     def complileLet(self):
         """Parses a let statement."""
@@ -302,7 +300,7 @@ class CompilationEngine():
         self.complileExpression()
         self.eat_token_by_value(';')
 
-        self.internal_etree_stack.pop()
+        self.close_sub_element_in_xml()
 
     def complileIf(self):
         """Parses an if statement."""
@@ -324,7 +322,7 @@ class CompilationEngine():
             self.complileStatements()
             self.eat_token_by_value('}')
 
-        self.internal_etree_stack.pop()
+        self.close_sub_element_in_xml()
 
     def complileWhile(self):
         """Parses a while statement."""
@@ -336,7 +334,7 @@ class CompilationEngine():
         self.eat_token_by_value('{')
         self.complileStatements()
         self.eat_token_by_value('}')
-        self.internal_etree_stack.pop()
+        self.close_sub_element_in_xml()
 
     def complileDo(self):
         """Parses a do statement."""
@@ -345,7 +343,7 @@ class CompilationEngine():
         self.eat_token_by_type(TOKEN_TYPE.IDENTIFIER)
         self.complileSubroutineCall()
         self.eat_token_by_value(';')
-        self.internal_etree_stack.pop()
+        self.close_sub_element_in_xml()
 
     def complileReturn(self):
         """Parses a return statement."""
@@ -359,7 +357,7 @@ class CompilationEngine():
             self.complileExpression()
 
         self.eat_token_by_value(';')
-        self.internal_etree_stack.pop()
+        self.close_sub_element_in_xml()
 
     def complileExpressionList(self):
         """Parses an expression list."""
@@ -388,7 +386,7 @@ class CompilationEngine():
         if expression_count == 0:
             self.insert_xml_empty_escape_string()
 
-        self.internal_etree_stack.pop()
+        self.close_sub_element_in_xml()
 
     def complileExpression(self):
         """Parses an expression."""
@@ -406,7 +404,7 @@ class CompilationEngine():
             self.add_current_token_to_xml()
             self.compileTerm()
 
-        self.internal_etree_stack.pop()
+        self.close_sub_element_in_xml()
 
     def compileTerm(self):
         """Parses a term."""
@@ -455,7 +453,7 @@ class CompilationEngine():
         else:
           raise CompilationEngineError(self.tokenizer, f"CompilationEngine.compileTerm() cannot start with '{next_token.value}'")
 
-        self.internal_etree_stack.pop()
+        self.close_sub_element_in_xml()
 
     def complileSubroutineCall(self):
         """
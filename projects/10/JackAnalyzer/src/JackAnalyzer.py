@@ -4,7 +4,7 @@ import traceback
 from pathlib import Path
 
 from CompilationEngine import CompilationEngine
-from exceptions import JackAnalyzerError
+from exceptions import JackAnalyzerError, JackError
 from file_util import is_jack_file
 
 def main():
@@ -60,15 +60,19 @@ def main():
         print(f'\nAnalysis complete. Output XMLs exported to: {output_path}')
         print(f'Execution time: {exec_time} seconds\n')
 
-    except JackAnalyzerError as error:
+    except JackError as error:
         print(error)
         if debug:
             ce.write_xml()
             print('\nDebug - wrote XML output with errors')
+        elif ce is not None:
+            ce.discard_xml()
         sys.exit(1)
 
     except Exception:
         print(traceback.format_exc())
+        if ce is not None:
+            ce.discard_xml()
         sys.exit(2)
 
 if __name__ == '__main__':
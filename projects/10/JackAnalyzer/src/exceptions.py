@@ -1,7 +1,8 @@
-class JackAnalyzerError(Exception):
+import frontend_path # adds the shared jack_frontend package to the import path
+from jack_frontend.exceptions import JackError, JackTokenizerError
+
+class JackAnalyzerError(JackError):
     """Base exception for errors handled by the JackAnalyzer."""
-    def __str__(self):
-        return f'Error - {self.message}'
 
 class CompilationEngineError(JackAnalyzerError):
     """Base exception for errors handled by the CompilationEngine."""
@@ -13,8 +14,3 @@ class CompilationEngineError(JackAnalyzerError):
 
     def __str__(self):
         return f'Error - line {self.tokenizer.line_num} - {self.message}'
-
-class JackTokenizerError(JackAnalyzerError):
-    """Base exception for errors handled by the JackTokenizer."""
-    def __str__(self):
-        return f'Error - {self.message}'
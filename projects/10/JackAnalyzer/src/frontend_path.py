@@ -0,0 +1,9 @@
+import sys
+from pathlib import Path
+
+# the jack_frontend package shared by the JackAnalyzer and the JackCompiler is
+# in the projects directory, so it is added to the import path of the tool
+PROJECTS_DIR = str(Path(__file__).resolve().parents[3])
+
+if PROJECTS_DIR not in sys.path:
+    sys.path.append(PROJECTS_DIR)
@@ -1,9 +1,13 @@
+import tempfile
 import unittest
 from pathlib import Path
 
+import frontend_path # adds the shared jack_frontend package to the import path
+from CompilationEngine import CompilationEngine
+from exceptions import JackError
 from file_util import is_jack_file
-from lexical_elements import get_token
-import tokens as T
+from jack_frontend import tokens as T
+from jack_frontend.lexical_elements import get_token
 
 class TestFileUtil(unittest.TestCase):
 
@@ -60,3 +64,24 @@ class TestFileUtil(unittest.TestCase):
         value = str(T.IntegerConstantToken.MAX + 1)
         output = T.IntegerConstantToken.is_integer_token(value)
         self.assertFalse(output)
+
+
+class TestCompilationEngine(unittest.TestCase):
+
+    def test_discard_xml(self):
+        """The XML files of a class with a syntax error are removed, and kept once they are completed."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            jack_path = Path(temp_dir) / 'Main.jack'
+            jack_path.write_text('class Main { function void main() { let ; } }')
+            ce = CompilationEngine(jack_path)
+            with self.assertRaises(JackError):
+                ce.compileClass()
+            ce.discard_xml()
+            self.assertEqual(sorted(path.name for path in Path(temp_dir).iterdir()), ['Main.jack'])
+
+            jack_path.write_text('class Main {}')
+            ce = CompilationEngine(jack_path)
+            ce.compileClass()
+            ce.write_xml()
+            ce.discard_xml()
+            self.assertEqual(sorted(path.name for path in Path(temp_dir).iterdir()), ['Main.jack', 'Main.xml', 'MainT.xml'])
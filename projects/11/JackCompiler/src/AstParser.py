@@ -0,0 +1,298 @@
+import frontend_path # adds the shared jack_frontend package to the import path
+from exceptions import AstParserError
+from jack_ast import (ArrayTerm, BinaryExpression, ClassVarDec, DoStatement, IfStatement, IntegerConstant, JackClass, KeywordConstant, LetStatement,
+                      ReturnStatement, StringConstant, SubroutineCall, SubroutineDec, UnaryExpression, VarDec, VarTerm, WhileStatement)
+from jack_frontend.constants import TOKEN_TYPE
+
+STATEMENT_KEYWORDS = {'let', 'if', 'while', 'do', 'return'}
+BINARY_OPS = {'+', '-', '*', '/', '&', '|', '<', '>', '='}
+
+class AstParser():
+    """
+    Parses the tokens of a Jack class into an AST, without writing any VM
+    commands or XML. Names are not resolved, that is left to the CodeGenerator.
+    """
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+
+    def get_current_token_value(self):
+        """Returns the text value of the current token."""
+        if self.tokenizer.current_token is not None:
+            return self.tokenizer.current_token.value
+        return None
+
+    def eat_token_by_value(self, value):
+        """Advances to the next token and checks its value."""
+        self.tokenizer.advance()
+        if self.get_current_token_value() != value:
+            raise AstParserError(self.tokenizer, f"AstParser.eat_token_by_value() expected '{value}' but got '{self.get_current_token_value()}'")
+
+    def eat_token_by_type(self, type):
+        """Advances to the next token, checks its type and returns its value."""
+        self.tokenizer.advance()
+        if self.tokenizer.tokenType() != type:
+            raise AstParserError(self.tokenizer, f"AstParser.eat_token_by_type() expected '{type}' but got '{self.tokenizer.tokenType()}'")
+        return self.get_current_token_value()
+
+    def eat_type(self, allow_void=False):
+        """Advances to the next token, checks it is a type and returns it."""
+        next_token = self.tokenizer.peek_next_token()
+        if not (next_token.value in {'int', 'char', 'boolean'} or next_token.type == TOKEN_TYPE.IDENTIFIER or (allow_void and next_token.value == 'void')):
+            raise AstParserError(self.tokenizer, f"'{next_token.value}' is not a valid type")
+        self.tokenizer.advance()
+        return self.get_current_token_value()
+
+    def eat_names(self):
+        """Parses 1+ variable names separated by ',' and the ';' after them."""
+        names = [self.eat_token_by_type(TOKEN_TYPE.IDENTIFIER)]
+        while True:
+            next_token = self.tokenizer.peek_next_token()
+            if next_token.value == ',':
+                self.eat_token_by_value(',')
+                names.append(self.eat_token_by_type(TOKEN_TYPE.IDENTIFIER))
+            elif next_token.value == ';':
+                self.eat_token_by_value(';')
+                return names
+            else:
+                raise AstParserError(self.tokenizer, f"Expected ',' or ';' not '{next_token.value}'")
+
+    def parseClass(self):
+        """Parses a class declaration and returns its JackClass."""
+        self.eat_token_by_value('class')
+        name = self.eat_token_by_type(TOKEN_TYPE.IDENTIFIER)
+        self.eat_token_by_value('{')
+
+        var_decs = []
+        while self.tokenizer.peek_next_token().value in {'static', 'field'}:
+            self.tokenizer.advance()
+            kind = self.get_current_token_value()
+            var_decs.append(ClassVarDec(kind, self.eat_type(), self.eat_names()))
+
+        subroutines = []
+        while self.tokenizer.peek_next_token().value in {'constructor', 'function', 'method'}:
+            subroutines.append(self.parseSubroutineDec())
+
+        self.eat_token_by_value('}')
+        return JackClass(name, var_decs, subroutines)
+
+    def parseSubroutineDec(self):
+        """Parses a sub-routine declaration and its body."""
+        self.tokenizer.advance()
+        kind = self.get_current_token_value()
+        return_type = self.eat_type(allow_void=True)
+        name = self.eat_token_by_type(TOKEN_TYPE.IDENTIFIER)
+
+        # parameter list
+        self.eat_token_by_value('(')
+        parameters = []
+        if self.tokenizer.peek_next_token().value != ')':
+            while True:
+                parameter_type = self.eat_type()
+                parameters.append((parameter_type, self.eat_token_by_type(TOKEN_TYPE.IDENTIFIER)))
+                if self.tokenizer.peek_next_token().value != ',':
+                    break
+                self.eat_token_by_value(',')
+        self.eat_token_by_value(')')
+
+        # body
+        self.eat_token_by_value('{')
+        var_decs = []
+        while self.tokenizer.peek_next_token().value == 'var':
+            self.eat_token_by_value('var')
+            var_decs.append(VarDec(self.eat_type(), self.eat_names()))
+        statements = self.parseStatements()
+        self.eat_token_by_value('}')
+
+        return SubroutineDec(kind, return_type, name, parameters, var_decs, statements)
+
+    def parseStatements(self):
+        """Parses 0+ statements and returns them as a list."""
+        statements = []
+
+        while True:
+            next_token = self.tokenizer.peek_next_token()
+            if next_token.value == 'let':
+                statements.append(self.parseLet())
+            elif next_token.value == 'if':
+                statements.append(self.parseIf())
+            elif next_token.value == 'while':
+                statements.append(self.parseWhile())
+            elif next_token.value == 'do':
+                statements.append(self.parseDo())
+            elif next_token.value == 'return':
+                statements.append(self.parseReturn())
+            else:
+                return statements
+
+    def parseLet(self):
+        """Parses a let statement."""
+        self.eat_token_by_value('let')
+        name = self.eat_token_by_type(TOKEN_TYPE.IDENTIFIER)
+
+        index = None
+        next_token = self.tokenizer.peek_next_token()
+        if next_token.value == '[':
+            self.eat_token_by_value('[')
+            index = self.parseExpression()
+            self.eat_token_by_value(']')
+        elif next_token.value != '=':
+            raise AstParserError(self.tokenizer, f"AstParser.parseLet() expected '[' or '=' but got '{next_token.value}'")
+
+        self.eat_token_by_value('=')
+        value = self.parseExpression()
+        self.eat_token_by_value(';')
+        return LetStatement(name, index, value)
+
+    def parseIf(self):
+        """Parses an if statement."""
+        self.eat_token_by_value('if')
+        condition = self.parseBlockCondition()
+        statements = self.parseBlock()
+
+        else_statements = None
+        if self.tokenizer.peek_next_token().value == 'else':
+            self.eat_token_by_value('else')
+            else_statements = self.parseBlock()
+
+        return IfStatement(condition, statements, else_statements)
+
+    def parseWhile(self):
+        """Parses a while statement."""
+        self.eat_token_by_value('while')
+        condition = self.parseBlockCondition()
+        return WhileStatement(condition, self.parseBlock())
+
+    def parseBlockCondition(self):
+        """Parses the expression in '(' and ')' of an if or while statement."""
+        self.eat_token_by_value('(')
+        condition = self.parseExpression()
+        self.eat_token_by_value(')')
+        return condition
+
+    def parseBlock(self):
+        """Parses the statements in '{' and '}' of an if, else or while statement."""
+        self.eat_token_by_value('{')
+        statements = self.parseStatements()
+        self.eat_token_by_value('}')
+        return statements
+
+    def parseDo(self):
+        """Parses a do statement."""
+        self.eat_token_by_value('do')
+        name = self.eat_token_by_type(TOKEN_TYPE.IDENTIFIER)
+        call = self.parseSubroutineCall(name)
+        self.eat_token_by_value(';')
+        return DoStatement(call)
+
+    def parseReturn(self):
+        """Parses a return statement."""
+        self.eat_token_by_value('return')
+
+        value = None
+        if self.tokenizer.peek_next_token().value != ';':
+            value = self.parseExpression()
+
+        self.eat_token_by_value(';')
+        return ReturnStatement(value)
+
+    def parseExpressionList(self):
+        """Parses an expression list and returns the expressions."""
+        expressions = []
+
+        # 0+ expressions seperated by ','
+        while True:
+            next_token = self.tokenizer.peek_next_token()
+            if (next_token.type not in {TOKEN_TYPE.INTEGER_CONSTANT, TOKEN_TYPE.STRING_CONSTANT, TOKEN_TYPE.IDENTIFIER}
+                and next_token.value not in {'true', 'false', 'null', 'this', '(', '-', '~'}
+            ):
+                break
+
+            expressions.append(self.parseExpression())
+
+            if self.tokenizer.peek_next_token().value != ',':
+                break
+            self.eat_token_by_value(',')
+
+        return expressions
+
+    def parseExpression(self):
+        """Parses an expression, the operators are applied from left to right."""
+        expression = self.parseTerm()
+
+        while self.tokenizer.peek_next_token().value in BINARY_OPS:
+            self.tokenizer.advance()
+            op = self.get_current_token_value()
+            expression = BinaryExpression(op, expression, self.parseTerm())
+
+        return expression
+
+    def parseTerm(self):
+        """Parses a term."""
+        next_token = self.tokenizer.peek_next_token()
+
+        if next_token.type == TOKEN_TYPE.INTEGER_CONSTANT:
+            return IntegerConstant(int(self.eat_token_by_type(TOKEN_TYPE.INTEGER_CONSTANT)))
+
+        if next_token.type == TOKEN_TYPE.STRING_CONSTANT:
+            return StringConstant(self.eat_token_by_type(TOKEN_TYPE.STRING_CONSTANT))
+
+        if next_token.value in {'true', 'false', 'null', 'this'}:
+            self.tokenizer.advance()
+            return KeywordConstant(self.get_current_token_value())
+
+        if next_token.type == TOKEN_TYPE.IDENTIFIER:
+            name = self.eat_token_by_type(TOKEN_TYPE.IDENTIFIER)
+            next_token = self.tokenizer.peek_next_token()
+
+            # varName[expression]
+            if next_token.value == '[':
+                self.eat_token_by_value('[')
+                index = self.parseExpression()
+                self.eat_token_by_value(']')
+                return ArrayTerm(name, index)
+
+            # subroutineCall
+            if next_token.value in {'(', '.'}:
+                return self.parseSubroutineCall(name)
+
+            return VarTerm(name)
+
+        # (expression)
+        if next_token.value == '(':
+            self.eat_token_by_value('(')
+            expression = self.parseExpression()
+            self.eat_token_by_value(')')
+            return expression
+
+        # unaryOp
+        if next_token.value in {'-', '~'}:
+            self.tokenizer.advance()
+            op = self.get_current_token_value()
+            return UnaryExpression(op, self.parseTerm())
+
+        raise AstParserError(self.tokenizer, f"AstParser.parseTerm() cannot start with '{next_token.value}'")
+
+    def parseSubroutineCall(self, name):
+        """
+        Parses a sub-routine call.
+
+        Assumes the class, variable or sub-routine name has already been eaten.
+        """
+        target = None
+        next_token = self.tokenizer.peek_next_token()
+
+        # example: 'MyClass.func()'
+        if next_token.value == '.':
+            self.eat_token_by_value('.')
+            target = name
+            name = self.eat_token_by_type(TOKEN_TYPE.IDENTIFIER)
+
+        # Example: 'func()'
+        elif next_token.value != '(':
+            raise AstParserError(self.tokenizer, f"AstParser.parseSubroutineCall() expected '.' or '(' but got '{next_token.value}'")
+
+        self.eat_token_by_value('(')
+        arguments = self.parseExpressionList()
+        self.eat_token_by_value(')')
+        return SubroutineCall(target, name, arguments)
@@ -0,0 +1,271 @@
+from expression_ir import BinaryNode, CodeNode, ConstantNode, UnaryNode
+from jack_ast import (ArrayTerm, BinaryExpression, DoStatement, IfStatement, IntegerConstant, KeywordConstant, LetStatement, ReturnStatement,
+                      StringConstant, SubroutineCall, UnaryExpression, VarTerm, WhileStatement)
+from string_pool import StringPool
+from SymbolTable import SymbolTable
+
+class CodeGenerator():
+    """
+    Writes the VM commands of a Jack class from its AST.
+
+    The VM output is the same as the CompilationEngine writes while parsing,
+    so labels are numbered in the same order and names are resolved with the
+    same SymbolTable.
+    """
+
+    def __init__(self, file_name, vm_writer, verbose=False, fold_expressions=False, string_pool=False):
+        """
+        When fold_expressions is True, constant expressions are folded. When
+        string_pool is True, each string constant of the class is built once.
+        """
+        self.file_name = file_name
+        self.vm_writer = vm_writer
+        self.verbose_output = verbose
+        self.fold_expressions = fold_expressions
+        self.folded_command_count = 0
+        self.use_string_pool = string_pool
+        self.string_pool = None
+        self.symbol_table = SymbolTable()
+        self.class_name = None
+
+    def get_next_label(self):
+        """Returns a new label in the 'Class_N' format."""
+        label = f'{self.class_name}_{self.vm_writer.label_count}'
+        self.vm_writer.increment_label_count()
+        return label
+
+    def generateClass(self, jack_class):
+        """Writes the VM commands of a class."""
+        self.class_name = jack_class.name
+        self.vm_writer.writeComment(f'Compiled {self.file_name}.jack:')
+
+        for var_dec in jack_class.var_decs:
+            for name in var_dec.names:
+                self.symbol_table.define(name, var_dec.type, var_dec.kind)
+
+        if self.verbose_output:
+            self.symbol_table.print_class_table(self.file_name)
+
+        if self.use_string_pool:
+            self.string_pool = StringPool(self.file_name, self.symbol_table.VarCount('static'))
+
+        for subroutine in jack_class.subroutines:
+            self.generateSubroutine(subroutine)
+
+        if self.string_pool is not None:
+            self.vm_writer.writeStringPool(self.string_pool)
+
+    def generateSubroutine(self, subroutine):
+        """Writes the VM function of a sub-routine."""
+        self.symbol_table.startSubroutine()
+
+        # for methods, insert the 'this' as the first argument
+        if subroutine.kind == 'method':
+            self.symbol_table.define('this', self.class_name, 'argument')
+
+        for symbol_type, name in subroutine.parameters:
+            self.symbol_table.define(name, symbol_type, 'argument')
+
+        for var_dec in subroutine.var_decs:
+            for name in var_dec.names:
+                self.symbol_table.define(name, var_dec.type, 'local')
+
+        if self.verbose_output:
+            self.symbol_table.print_subroutine_table(subroutine.kind, subroutine.name)
+
+        self.vm_writer.writeFunction(f'{self.file_name}.{subroutine.name}', self.symbol_table.VarCount('local'))
+
+        # constructors allocate the object, methods select the object passed as the first argument
+        if subroutine.kind == 'constructor':
+            self.vm_writer.writePush('constant', self.symbol_table.VarCount('field'))
+            self.vm_writer.writeCall('Memory.alloc', 1)
+            self.vm_writer.writePop('pointer', 0)
+        elif subroutine.kind == 'method':
+            self.vm_writer.writePush('argument', 0)
+            self.vm_writer.writePop('pointer', 0)
+
+        self.generateStatements(subroutine.statements)
+
+    def generateStatements(self, statements):
+        """Writes the VM commands of a list of statements."""
+        for statement in statements:
+            if isinstance(statement, LetStatement):
+                self.generateLet(statement)
+            elif isinstance(statement, IfStatement):
+                self.generateIf(statement)
+            elif isinstance(statement, WhileStatement):
+                self.generateWhile(statement)
+            elif isinstance(statement, DoStatement):
+                self.generateSubroutineCall(statement.call)
+                # the return value of a do statement is discarded
+                self.vm_writer.writePop('temp', 0)
+            elif isinstance(statement, ReturnStatement):
+                self.generateReturn(statement)
+
+    def generateLet(self, statement):
+        """Writes the VM commands of a let statement."""
+        if statement.index is not None:
+            # calculate the address of the element before the value is known
+            self.generateExpression(statement.index)
+            symbol = self.symbol_table.resolve(statement.name)
+            self.vm_writer.writePush(symbol.kind_name, symbol.index)
+            self.vm_writer.WriteArithmatic('+')
+
+        self.generateExpression(statement.value)
+
+        if statement.index is not None:
+            self.vm_writer.writePop('temp', 0) # backup of the value to be set (from the expression)
+            self.vm_writer.writePop('pointer', 1) # select 'that' (the array pointer)
+            self.vm_writer.writePush('temp', 0) # return the value to be set to the stack
+            self.vm_writer.writePop('that', 0) # set the value into the head of the array
+        else:
+            symbol = self.symbol_table.resolve(statement.name)
+            self.vm_writer.writePop(symbol.kind_name, symbol.index)
+
+    def generateIf(self, statement):
+        """Writes the VM commands of an if statement, the else label is always placed."""
+        self.generateExpression(statement.condition)
+
+        exit_label = self.get_next_label()
+        else_label = self.get_next_label()
+
+        self.vm_writer.WriteIf(else_label)
+        self.generateStatements(statement.statements)
+        self.vm_writer.WriteGoto(exit_label)
+        self.vm_writer.WriteLabel(else_label)
+
+        if statement.else_statements is not None:
+            self.generateStatements(statement.else_statements)
+
+        self.vm_writer.WriteLabel(exit_label)
+
+    def generateWhile(self, statement):
+        """Writes the VM commands of a while statement."""
+        start_label = self.get_next_label()
+        self.vm_writer.WriteLabel(start_label)
+
+        self.generateExpression(statement.condition)
+
+        end_label = self.get_next_label()
+        self.vm_writer.WriteIf(end_label)
+        self.generateStatements(statement.statements)
+        self.vm_writer.WriteGoto(start_label)
+        self.vm_writer.WriteLabel(end_label)
+
+    def generateReturn(self, statement):
+        """Writes the VM commands of a return statement, 0 is returned when there is no value."""
+        if statement.value is not None:
+            self.generateExpression(statement.value)
+        else:
+            self.vm_writer.writePush('constant', 0)
+
+        self.vm_writer.writeReturn()
+
+    def generateExpression(self, expression):
+        """Writes the VM commands of an expression, folded when optimizing."""
+        node = self.get_expression_node(expression)
+
+        if self.fold_expressions:
+            folded_node = node.fold()
+            self.folded_command_count += node.command_count() - folded_node.command_count()
+            node = folded_node
+
+        node.write(self.vm_writer)
+
+    def get_expression_node(self, expression):
+        """
+        Returns the expression IR node of an expression. The VM commands of
+        terms which are not constants or operators are captured in a CodeNode.
+        """
+        if isinstance(expression, BinaryExpression):
+            left = self.get_expression_node(expression.left)
+
+            # a right operand which fails writes its partial VM commands here,
+            # so they can be written after the left operand
+            self.vm_writer.start_capture()
+            try:
+                right = self.get_expression_node(expression.right)
+            except Exception:
+                partial_lines = self.vm_writer.end_capture()
+                left.write(self.vm_writer)
+                self.vm_writer.add_lines(partial_lines)
+                raise
+            self.vm_writer.end_capture()
+
+            return BinaryNode(expression.op, left, right)
+
+        if isinstance(expression, UnaryExpression):
+            return UnaryNode(expression.op, self.get_expression_node(expression.term))
+
+        if isinstance(expression, IntegerConstant):
+            return ConstantNode(expression.value)
+
+        if isinstance(expression, KeywordConstant) and expression.value != 'this':
+            # true is -1 in Hack ASM b/c all bits are 1
+            return ConstantNode(-1 if expression.value == 'true' else 0)
+
+        self.vm_writer.start_capture()
+        try:
+            self.generateTerm(expression)
+        except Exception:
+            # keep the VM commands written for the term before the error
+            self.vm_writer.add_lines(self.vm_writer.end_capture())
+            raise
+        return CodeNode(self.vm_writer.end_capture())
+
+    def generateTerm(self, term):
+        """Writes the VM commands of a term which is not a constant or an operator."""
+        if isinstance(term, StringConstant):
+            if self.string_pool is not None:
+                self.vm_writer.writePooledStringConstant(self.string_pool, term.value, self.get_next_label())
+            else:
+                self.vm_writer.writeStringConstant(term.value)
+
+        elif isinstance(term, KeywordConstant):
+            self.vm_writer.writeKeyword(term.value)
+
+        elif isinstance(term, VarTerm):
+            symbol = self.symbol_table.resolve(term.name)
+            self.vm_writer.writePush(symbol.kind_name, symbol.index)
+
+        elif isinstance(term, ArrayTerm):
+            self.generateExpression(term.index)
+
+            # calculate array position by adding the array base address to the index offset value
+            symbol = self.symbol_table.resolve(term.name)
+            self.vm_writer.writePush(symbol.kind_name, symbol.index)
+            self.vm_writer.WriteArithmatic('+')
+
+            # then select the array pointer and push the value in the array onto the stack
+            self.vm_writer.writePop('pointer', 1)
+            self.vm_writer.writePush('that', 0)
+
+        elif isinstance(term, SubroutineCall):
+            self.generateSubroutineCall(term)
+
+    def generateSubroutineCall(self, call):
+        """Writes the VM commands of a sub-routine call."""
+
+        # 'func()' is always a method of the current class, called on 'this'
+        if call.target is None:
+            self.vm_writer.writePush('pointer', 0)
+            self.generateArguments(call.arguments)
+            self.vm_writer.writeCall(f'{self.class_name}.{call.name}', len(call.arguments) + 1)
+            return
+
+        # 'var.method()' calls the method of the class of the variable, with the variable as 'this'
+        if self.symbol_table.varExists(call.target):
+            symbol = self.symbol_table.resolve(call.target)
+            self.vm_writer.writePush(symbol.kind_name, symbol.index)
+            self.generateArguments(call.arguments)
+            self.vm_writer.writeCall(f'{symbol.type}.{call.name}', len(call.arguments) + 1)
+            return
+
+        # 'MyClass.func()'
+        self.generateArguments(call.arguments)
+        self.vm_writer.writeCall(f'{call.target}.{call.name}', len(call.arguments))
+
+    def generateArguments(self, arguments):
+        """Writes the VM commands of the arguments of a call."""
+        for argument in arguments:
+            self.generateExpression(argument)
@@ -1,31 +1,79 @@
-import xml.etree.ElementTree as ET
-
-from constants import IDENTIFER_ATTR, TOKEN_TYPE
+import frontend_path # adds the shared jack_frontend package to the import path
+from AstParser import AstParser
+from CodeGenerator import CodeGenerator
+from constants import IDENTIFER_ATTR
 from exceptions import CompilationEngineError, SymbolTableError
-from JackTokenizer import JackTokenizer
-from xml_formatter import make_pretty
+from expression_ir import BinaryNode, CodeNode, ConstantNode, UnaryNode
+from jack_frontend.constants import TOKEN_TYPE
+from jack_frontend.JackTokenizer import JackBufferedTokenizer, JackRegexTokenizer, JackTokenizer
+from jack_frontend.xml_sinks import NullSink, XmlFileSink
+from string_pool import StringPool
 from SymbolTable import SymbolTable
 from VMWriter import VMWriter
 
 class CompilationEngine():
     """Class for lexing and parsing Jack source code."""
 
-    def __init__(self, jack_file_path, verbose=False):
+    def __init__(self, jack_file_path, verbose=False, regex_lexer=False, buffered_lexer=False, stream_buffer_size=None, xml_output=True, optimize=False, identifier_attributes=True, string_pool=False, use_ast=False, ast_cache=None):
+        """
+        When xml_output is True, the XML parse tree and tokens are streamed to
+        their files during parsing and completed by write_xml().
+
+        When identifier_attributes is False, identifiers are written without
+        their symbol table attributes, so the XML matches the JackAnalyzer's.
+
+        When optimize is True, constant expressions are folded, the VM output
+        is rewritten by the peephole optimizer and the reduction is printed by
+        write_vm_file().
+
+        When string_pool is True, each string constant of the class is built
+        once in a static variable and the savings are printed by write_vm_file().
 
+        When use_ast is True, the class is parsed into an AST first and the VM
+        is written from it by the CodeGenerator, without any XML output. An AST
+        found in ast_cache (a CompileCache) is used instead of the source, and
+        a parsed AST is stored in it.
+        """
+
+        self.jack_file_path = jack_file_path
         self.parent_dir = jack_file_path.parent
         self.file_name = jack_file_path.stem
         self.verbose_output = verbose
+        self.identifier_attributes = identifier_attributes
 
-        self.tokenizer = JackTokenizer(jack_file_path)
+        if xml_output:
+            try:
+                self.xml_sink = XmlFileSink(self.get_xml_output_file_path(), 'class', indent=2)
+            except OSError as error:
+                raise IOError(f"Unable to create XML class file at: '{self.get_xml_output_file_path()}'") from error
+        else:
+            self.xml_sink = NullSink()
+
+        self.use_ast = use_ast
+        self.ast_cache = ast_cache
+        self.jack_class = ast_cache.load_ast(jack_file_path) if use_ast and ast_cache is not None else None
+
+        # a cached AST does not need to be lexed
+        if self.jack_class is not None:
+            self.tokenizer = None
+        elif buffered_lexer:
+            self.tokenizer = JackBufferedTokenizer(jack_file_path, xml_output)
+        elif regex_lexer:
+            self.tokenizer = JackRegexTokenizer(jack_file_path, xml_output)
+        else:
+            self.tokenizer = JackTokenizer(jack_file_path, xml_output)
         self.symbol_table = SymbolTable()
         self.class_name = None
         self.current_subroutine = None
         self.current_subroutine_type = None
 
-        self.vm_writer = VMWriter(f'{self.parent_dir}/{self.file_name}')
+        self.vm_writer = VMWriter(f'{self.parent_dir}/{self.file_name}', stream_buffer_size, optimize)
+        self.fold_expressions = optimize
+        self.folded_command_count = 0
 
-        # store the etree as a stack so the final xml is not flat
-        self.internal_etree_stack = [ET.Element('class')]
+        # created once the statics of the class are declared
+        self.use_string_pool = string_pool
+        self.string_pool = None
 
     def get_current_subroutine_full_name(self):
         """Constucts the current subroutine name using the 'Class.subroutine' format."""
@@ -35,53 +83,63 @@ class CompilationEngine():
         """Writes the VM file output."""
         self.vm_writer.close()
 
+        if self.vm_writer.optimize:
+            self.print_optimization_report()
+
+        if self.string_pool is not None and self.string_pool.use_count:
+            self.print_string_pool_report()
+
+    def discard_vm_file(self):
+        """Removes any partially streamed VM file after an unexpected error."""
+        self.vm_writer.discard()
+
+    def print_optimization_report(self):
+        """Prints the VM command count before and after expression folding and the peephole optimizer."""
+        before = self.vm_writer.command_count + self.folded_command_count
+        after = self.vm_writer.optimized_command_count
+        reduction = round((before - after) * 100 / before, 1) if before else 0.0
+        print(f"Optimized '{self.file_name}': {before} -> {after} VM commands ({reduction}% fewer)")
+
+    def print_string_pool_report(self):
+        """Prints the VM commands of the string constants with and without the pool, and the heap allocations saved."""
+        pool = self.string_pool
+        print(f"String pool '{self.file_name}': {pool.use_count} string constants built once as {len(pool.static_indexes)}"
+              f" ({pool.use_command_count} -> {pool.pooled_command_count} VM commands, {pool.get_allocations_saved()} fewer heap allocations when each constant is used once)")
+
     def get_xml_output_file_path(self):
         """Returns the output file path for the XML file."""
         return f'{self.parent_dir}/{self.file_name}.xml'
 
     def add_current_token_to_xml(self, attrs=None):
         """
-        Inserts the current token into the internal XML etree.
+        Inserts the current token into the XML output.
 
         Optionally define custom attributes for XML tag.
         """
         if self.tokenizer.current_token is not None:
-            # always use the top of the stack
-            new_token = ET.SubElement(self.internal_etree_stack[-1], self.tokenizer.current_token.type)
-            new_token.text = self.tokenizer.current_token.get_xml_value()
-            if attrs is not None:
-                for k, v in attrs.items():
-                    new_token.set(k, str(v))
+            self.xml_sink.add_token(self.tokenizer.current_token, attrs)
 
     def add_sub_element_to_xml(self, name):
-        """Creates a new sub-element in the xml and move it to the top of the etree stack."""
+        """Creates a new sub-element in the xml so subsequent elements are nested in it."""
         if name is not None:
-            new_sub_element = ET.SubElement(self.internal_etree_stack[-1], name)
-            # push onto the stack so subsequent elements are nested
-            self.internal_etree_stack.append(new_sub_element)
+            self.xml_sink.open_element(name)
+
+    def close_sub_element_in_xml(self):
+        """Closes the most recent sub-element in the xml."""
+        self.xml_sink.close_element()
 
     def insert_xml_empty_escape_string(self):
         """XML formatting helper for ensuring tags follow the <xml><xml/> format instead of </xml>."""
-        self.internal_etree_stack[-1].text = '__XML_EMPTY__'
+        self.xml_sink.mark_empty()
 
     def write_xml(self):
         """
-        Creates XML files from the tokenizer and the CompilationEngine
-        internal etrees.
-        """
+        Completes the XML files of the tokenizer and the CompilationEngine.
 
-        # first write the tokenizer's XML
+        Elements left open by a compilation error are closed.
+        """
         self.tokenizer.write_xml()
-
-        # now write the CompilationEngine's XML
-        # get the root element of the etree which is always at the bottom of the stack
-        xml_tree = ET.ElementTree(self.internal_etree_stack[0])
-        xml_text = make_pretty(xml_tree, indent=2)
-        try:
-            with open(self.get_xml_output_file_path(), 'w') as output_file:
-                output_file.write(xml_text)
-        except OSError as error:
-            raise IOError(f"Unable to create XML class file at: '{self.get_xml_output_file_path()}'") from error
+        self.xml_sink.close()
 
     def get_current_token_value(self):
         """Returns the text value of the current token."""
@@ -114,10 +172,18 @@ class CompilationEngine():
         if defined_or_used == IDENTIFER_ATTR.DEFINED:
             self.symbol_table.define(name, symbol_type, symbol_kind)
 
+        if not self.xml_sink.enabled:
+            return
+
+        if not self.identifier_attributes:
+            self.add_current_token_to_xml()
+            return
+
         # add identifier attributes
         try:
-            category = symbol_kind if symbol_kind else self.symbol_table.KindOf(name)
-            attrs = {'category': category, 'index': self.symbol_table.IndexOf(name)}
+            symbol = self.symbol_table.resolve(name)
+            category = symbol_kind if symbol_kind else symbol.kind_name
+            attrs = {'category': category, 'index': symbol.index}
             attrs[defined_or_used] = 'true'
             self.add_current_token_to_xml(attrs=attrs)
         except SymbolTableError:
@@ -133,6 +199,10 @@ class CompilationEngine():
     def compileClass(self):
         """Parses a class declaration."""
 
+        if self.use_ast:
+            self.compileClassFromAst()
+            return
+
         self.vm_writer.writeComment(f'Compiled {self.file_name}.jack:')
         self.eat_token_by_value('class')
 
@@ -150,6 +220,9 @@ class CompilationEngine():
         if self.verbose_output:
             self.symbol_table.print_class_table(self.file_name)
 
+        if self.use_string_pool:
+            self.string_pool = StringPool(self.file_name, self.symbol_table.VarCount('static'))
+
         while True:
             if self.complileSubroutineDec():
                 continue
@@ -157,6 +230,26 @@ class CompilationEngine():
 
         self.eat_token_by_value('}')
 
+        if self.string_pool is not None:
+            self.vm_writer.writeStringPool(self.string_pool)
+
+    def compileClassFromAst(self):
+        """Parses the class into an AST, unless it was cached, and writes its VM with the CodeGenerator."""
+
+        if self.jack_class is None:
+            self.jack_class = AstParser(self.tokenizer).parseClass()
+            if self.ast_cache is not None:
+                self.ast_cache.store_ast(self.jack_file_path, self.jack_class)
+
+        code_generator = CodeGenerator(self.file_name, self.vm_writer, self.verbose_output, self.fold_expressions, self.use_string_pool)
+        try:
+            code_generator.generateClass(self.jack_class)
+        finally:
+            # the reports of write_vm_file() also cover a class with errors
+            self.class_name = code_generator.class_name
+            self.folded_command_count = code_generator.folded_command_count
+            self.string_pool = code_generator.string_pool
+
     def compileClassVarDec(self):
         """Parses a class variable declaration."""
 
@@ -191,7 +284,7 @@ class CompilationEngine():
 
         self.eat_token_by_value(';')
 
-        self.internal_etree_stack.pop()
+        self.close_sub_element_in_xml()
         return True
 
     def complileSubroutineDec(self):
@@ -229,7 +322,7 @@ class CompilationEngine():
         self.eat_token_by_value(')')
         self.complileSubroutineBody()
 
-        self.internal_etree_stack.pop()
+        self.close_sub_element_in_xml()
         return True
 
     def complileParameterList(self):
@@ -264,7 +357,7 @@ class CompilationEngine():
         else:
             self.insert_xml_empty_escape_string()
 
-        self.internal_etree_stack.pop()
+        self.close_sub_element_in_xml()
 
     def complileSubroutineBody(self):
         """Parses a sub-routine body."""
@@ -301,7 +394,7 @@ class CompilationEngine():
 
         self.eat_token_by_value('}')
 
-        self.internal_etree_stack.pop()
+        self.close_sub_element_in_xml()
 
     def complileVarDec(self):
         """Parses a var declaration."""
@@ -337,7 +430,7 @@ class CompilationEngine():
             else:
                 raise CompilationEngineError(self.tokenizer, f"Expected ',' or ';' not '{next_token.value}'")
 
-        self.internal_etree_stack.pop()
+        self.close_sub_element_in_xml()
         return True
 
     def complileStatements(self):
@@ -349,7 +442,7 @@ class CompilationEngine():
 
         if next_token.value not in {'let', 'if', 'while', 'do', 'return'}:
             self.insert_xml_empty_escape_string()
-            self.internal_etree_stack.pop()
+            self.close_sub_element_in_xml()
             return
 
         while True:
@@ -369,7 +462,7 @@ class CompilationEngine():
             if next_token.value not in {'let', 'if', 'while', 'do', 'return'}:
                 break
 
-        self.internal_etree_stack.pop()
+        self.close_sub_element_in_xml()
 
     def complileLet(self):
         """Parses a let statement."""
@@ -394,7 +487,8 @@ class CompilationEngine():
 
             # calculate array position by adding the array base address
             # to the index offset value
-            self.vm_writer.writePush(self.symbol_table.KindOf(var_name), self.symbol_table.IndexOf(var_name))
+            symbol = self.symbol_table.resolve(var_name)
+            self.vm_writer.writePush(symbol.kind_name, symbol.index)
             self.vm_writer.WriteArithmatic('+')
 
         # set variable
@@ -414,9 +508,10 @@ class CompilationEngine():
             self.vm_writer.writePop('that', 0) # set the value into the head of the array
         else:
             # when setting a non-array variable, pop the value into the memory segement
-            self.vm_writer.writePop(self.symbol_table.KindOf(var_name), self.symbol_table.IndexOf(var_name))
+            symbol = self.symbol_table.resolve(var_name)
+            self.vm_writer.writePop(symbol.kind_name, symbol.index)
 
-        self.internal_etree_stack.pop()
+        self.close_sub_element_in_xml()
 
     def complileIf(self):
         """Parses an if statement."""
@@ -455,7 +550,7 @@ class CompilationEngine():
 
         self.vm_writer.WriteLabel(exit_label)
 
-        self.internal_etree_stack.pop()
+        self.close_sub_element_in_xml()
 
     def complileWhile(self):
         """Parses a while statement."""
@@ -481,7 +576,7 @@ class CompilationEngine():
         self.complileStatements()
         self.eat_token_by_value('}')
 
-        self.internal_etree_stack.pop()
+        self.close_sub_element_in_xml()
         self.vm_writer.WriteGoto(start_label)
         self.vm_writer.WriteLabel(end_label)
 
@@ -502,7 +597,7 @@ class CompilationEngine():
         # do this always because a function that returns a value
         # will no appear in a do-statement, but only in let-statements
         self.vm_writer.writePop('temp', 0)
-        self.internal_etree_stack.pop()
+        self.close_sub_element_in_xml()
 
     def complileReturn(self):
         """Parses a return statement."""
@@ -521,7 +616,7 @@ class CompilationEngine():
         self.eat_token_by_value(';')
 
         self.vm_writer.writeReturn()
-        self.internal_etree_stack.pop()
+        self.close_sub_element_in_xml()
 
     def complileExpressionList(self):
         """Parses an expression list and returns the number of expressions."""
@@ -550,103 +645,154 @@ class CompilationEngine():
         if expression_count == 0:
             self.insert_xml_empty_escape_string()
 
-        self.internal_etree_stack.pop()
+        self.close_sub_element_in_xml()
         return expression_count
 
     def complileExpression(self):
-        """Parses an expression."""
+        """Parses an expression and writes its VM commands, folded when optimizing."""
 
-        self.add_sub_element_to_xml('expression')
-        self.compileTerm()
+        node = self.compileExpressionNode()
 
-        # 0+ (op term)
-        while True:
-            next_token = self.tokenizer.peek_next_token()
-            if next_token.value not in {'+', '-', '*', '/', '&', '|', '<', '>', '='}:
-                break
+        if self.fold_expressions:
+            folded_node = node.fold()
+            self.folded_command_count += node.command_count() - folded_node.command_count()
+            node = folded_node
 
-            self.tokenizer.advance()
-            op = self.get_current_token_value()
-            self.add_current_token_to_xml()
-            self.compileTerm()
-
-            self.vm_writer.WriteArithmatic(op)
+        node.write(self.vm_writer)
 
-        self.internal_etree_stack.pop()
-
-    def compileTerm(self):
-        """Parses a term."""
+    def compileExpressionNode(self):
+        """Parses an expression and returns its expression IR node."""
 
-        self.add_sub_element_to_xml('term')
+        self.add_sub_element_to_xml('expression')
+        node = None
 
-        next_token = self.tokenizer.peek_next_token()
+        # a term which fails writes its partial VM commands here, so they can
+        # be written after the terms before it
+        self.vm_writer.start_capture()
 
-        if next_token.type == TOKEN_TYPE.INTEGER_CONSTANT:
-            self.eat_token_by_type(TOKEN_TYPE.INTEGER_CONSTANT)
-            self.vm_writer.writePush('constant', self.get_current_token_value())
+        try:
+            node = self.compileTerm()
 
-        elif next_token.type == TOKEN_TYPE.STRING_CONSTANT:
-            self.eat_token_by_type(TOKEN_TYPE.STRING_CONSTANT)
-            self.vm_writer.writeStringConstant(self.get_current_token_value())
+            # 0+ (op term)
+            while True:
+                next_token = self.tokenizer.peek_next_token()
+                if next_token.value not in {'+', '-', '*', '/', '&', '|', '<', '>', '='}:
+                    break
 
-        elif next_token.value in {'true', 'false', 'null', 'this'}:
-            self.tokenizer.advance()
-            self.add_current_token_to_xml()
-            self.vm_writer.writeKeyword(self.get_current_token_value())
+                self.tokenizer.advance()
+                op = self.get_current_token_value()
+                self.add_current_token_to_xml()
+                node = BinaryNode(op, node, self.compileTerm())
 
-        elif next_token.type == TOKEN_TYPE.IDENTIFIER:
-            self.eat_symbol_token(IDENTIFER_ATTR.USED)
+        except Exception:
+            # write the VM commands parsed before the error, as without the IR
+            partial_lines = self.vm_writer.end_capture()
+            if node is not None:
+                node.write(self.vm_writer)
+            self.vm_writer.add_lines(partial_lines)
+            raise
 
-            next_token = self.tokenizer.peek_next_token()
+        self.vm_writer.end_capture()
+        self.close_sub_element_in_xml()
+        return node
 
-            # varName[expression]
-            if next_token.value == '[':
-                array_var = self.get_current_token_value()
+    def compileTerm(self):
+        """
+        Parses a term and returns its expression IR node. The VM commands of
+        terms which are not constants or operators are captured in a CodeNode.
+        """
 
-                self.eat_token_by_value('[')
-                self.complileExpression()
-                self.eat_token_by_value(']')
+        self.add_sub_element_to_xml('term')
 
-                # calculate array position by adding the array base address to the index offset value
-                self.vm_writer.writePush(self.symbol_table.KindOf(array_var), self.symbol_table.IndexOf(array_var))
-                self.vm_writer.WriteArithmatic('+')
+        next_token = self.tokenizer.peek_next_token()
+        node = None
+        self.vm_writer.start_capture()
 
-                # then select the array pointer and push the value in the array onto the stack
-                self.vm_writer.writePop('pointer', 1)
-                self.vm_writer.writePush('that', 0)
+        try:
+            if next_token.type == TOKEN_TYPE.INTEGER_CONSTANT:
+                self.eat_token_by_type(TOKEN_TYPE.INTEGER_CONSTANT)
+                node = ConstantNode(int(self.get_current_token_value()))
+
+            elif next_token.type == TOKEN_TYPE.STRING_CONSTANT:
+                self.eat_token_by_type(TOKEN_TYPE.STRING_CONSTANT)
+                if self.string_pool is not None:
+                    ready_label = f'{self.class_name}_{self.vm_writer.label_count}'
+                    self.vm_writer.increment_label_count()
+                    self.vm_writer.writePooledStringConstant(self.string_pool, self.get_current_token_value(), ready_label)
+                else:
+                    self.vm_writer.writeStringConstant(self.get_current_token_value())
+
+            elif next_token.value in {'true', 'false', 'null'}:
+                self.tokenizer.advance()
+                self.add_current_token_to_xml()
+                # true is -1 in Hack ASM b/c all bits are 1
+                node = ConstantNode(-1 if self.get_current_token_value() == 'true' else 0)
 
-            # subroutineCall
-            elif next_token.value in {'(', '.'}:
-                # determine if called class/subroutine is for a method by
-                # checking if it was declared in the symbol table
-                class_or_func_name = self.get_current_token_value()
-                is_method = self.symbol_table.varExists(class_or_func_name)
-                self.complileSubroutineCall(is_method=is_method)
+            elif next_token.value == 'this':
+                self.tokenizer.advance()
+                self.add_current_token_to_xml()
+                self.vm_writer.writeKeyword(self.get_current_token_value())
 
-            # identifier must be a variable that is being passed in to
-            # a function as an argument
-            else:
-                var_name = self.get_current_token_value()
-                self.vm_writer.writePush(self.symbol_table.KindOf(var_name), self.symbol_table.IndexOf(var_name))
+            elif next_token.type == TOKEN_TYPE.IDENTIFIER:
+                self.eat_symbol_token(IDENTIFER_ATTR.USED)
 
-        # (expression)
-        elif next_token.value == '(':
-            self.eat_token_by_value('(')
-            self.complileExpression()
-            self.eat_token_by_value(')')
+                next_token = self.tokenizer.peek_next_token()
 
-        # unaryOp
-        elif next_token.value in {'-', '~'}:
-            self.tokenizer.advance()
-            unary_op = self.get_current_token_value()
-            self.add_current_token_to_xml()
-            self.compileTerm()
-            self.vm_writer.writeUnaryOp(unary_op)
+                # varName[expression]
+                if next_token.value == '[':
+                    array_var = self.get_current_token_value()
+
+                    self.eat_token_by_value('[')
+                    self.complileExpression()
+                    self.eat_token_by_value(']')
+
+                    # calculate array position by adding the array base address to the index offset value
+                    symbol = self.symbol_table.resolve(array_var)
+                    self.vm_writer.writePush(symbol.kind_name, symbol.index)
+                    self.vm_writer.WriteArithmatic('+')
+
+                    # then select the array pointer and push the value in the array onto the stack
+                    self.vm_writer.writePop('pointer', 1)
+                    self.vm_writer.writePush('that', 0)
+
+                # subroutineCall
+                elif next_token.value in {'(', '.'}:
+                    # determine if called class/subroutine is for a method by
+                    # checking if it was declared in the symbol table
+                    class_or_func_name = self.get_current_token_value()
+                    is_method = self.symbol_table.varExists(class_or_func_name)
+                    self.complileSubroutineCall(is_method=is_method)
+
+                # identifier must be a variable that is being passed in to
+                # a function as an argument
+                else:
+                    var_name = self.get_current_token_value()
+                    symbol = self.symbol_table.resolve(var_name)
+                    self.vm_writer.writePush(symbol.kind_name, symbol.index)
+
+            # (expression)
+            elif next_token.value == '(':
+                self.eat_token_by_value('(')
+                node = self.compileExpressionNode()
+                self.eat_token_by_value(')')
+
+            # unaryOp
+            elif next_token.value in {'-', '~'}:
+                self.tokenizer.advance()
+                unary_op = self.get_current_token_value()
+                self.add_current_token_to_xml()
+                node = UnaryNode(unary_op, self.compileTerm())
 
-        else:
-          raise CompilationEngineError(self.tokenizer, f"CompilationEngine.compileTerm() cannot start with '{next_token.value}'")
+            else:
+                raise CompilationEngineError(self.tokenizer, f"CompilationEngine.compileTerm() cannot start with '{next_token.value}'")
+        except Exception:
+            # keep the VM commands written for the term before the error, as without the IR
+            self.vm_writer.add_lines(self.vm_writer.end_capture())
+            raise
 
-        self.internal_etree_stack.pop()
+        lines = self.vm_writer.end_capture()
+        self.close_sub_element_in_xml()
+        return node if node is not None else CodeNode(lines)
 
     def complileSubroutineCall(self, is_method=False):
         """
@@ -664,7 +810,8 @@ class CompilationEngine():
             # class methods require the class instance be pushed onto the stack
             # so it can be used as the first argument
             if is_method:
-                self.vm_writer.writePush(self.symbol_table.KindOf(class_or_func_name), self.symbol_table.IndexOf(class_or_func_name))
+                symbol = self.symbol_table.resolve(class_or_func_name)
+                self.vm_writer.writePush(symbol.kind_name, symbol.index)
 
             self.eat_token_by_value('.')
             self.eat_token_by_type(TOKEN_TYPE.IDENTIFIER)
@@ -678,7 +825,7 @@ class CompilationEngine():
             # (1) the vm function call uses the class name, no the variable name
             # (2) 'this' argument does not appear in the expression list count
             if is_method:
-                class_or_func_name = self.symbol_table.TypeOf(class_or_func_name)
+                class_or_func_name = symbol.type
                 n_args += 1
 
             self.vm_writer.writeCall(f'{class_or_func_name}.{func_name}', n_args)
@@ -0,0 +1,176 @@
+import hashlib
+import pickle
+import shutil
+from pathlib import Path
+
+import frontend_path
+
+def get_compiler_version():
+    """
+    Returns a digest of the compiler's own source files and of the shared
+    jack_frontend package.
+
+    Any change to the compiler invalidates all previously cached output.
+    """
+    hasher = hashlib.sha256()
+    src_dir = Path(__file__).parent
+    frontend_dir = Path(frontend_path.PROJECTS_DIR) / 'jack_frontend'
+    for source_path in [*sorted(src_dir.glob('*.py')), *sorted(frontend_dir.glob('*.py'))]:
+        if source_path.name != 'tests.py':
+            hasher.update(source_path.read_bytes())
+    return hasher.hexdigest()
+
+class CompileCache():
+    """
+    Persistent cache of the VM (and debug XML) output for each Jack file.
+
+    Entries are stored in a '.jackcache' directory next to the Jack sources and
+    are keyed on a hash of the source code plus the compiler version (and
+    whether the output is optimized, uses the string pool or the XML is in the
+    JackAnalyzer format).
+
+    The AST of each Jack file is also stored, keyed on the source code and the
+    compiler version only, so it is reused when the file is compiled with
+    other options.
+    """
+
+    CACHE_DIR_NAME = '.jackcache'
+    KEY_FILE_NAME = 'key'
+
+    compiler_version = None
+
+    def __init__(self, src_dir, optimize=False, analyzer_output=False, string_pool=False):
+        self.cache_dir = Path(src_dir) / self.CACHE_DIR_NAME
+        self.optimize = optimize
+        self.analyzer_output = analyzer_output
+        self.string_pool = string_pool
+        self.hits = 0
+        self.misses = 0
+        self.ast_hits = 0
+
+        if CompileCache.compiler_version is None:
+            CompileCache.compiler_version = get_compiler_version()
+
+    def get_key(self, jack_file_path):
+        """Returns the cache key for the current contents of a Jack file."""
+        hasher = hashlib.sha256()
+        hasher.update(self.compiler_version.encode('utf-8'))
+        if self.optimize:
+            hasher.update(b'-O')
+        if self.analyzer_output:
+            hasher.update(b'-a')
+        if self.string_pool:
+            hasher.update(b'-p')
+        hasher.update(jack_file_path.name.encode('utf-8'))
+        hasher.update(jack_file_path.read_bytes())
+        return hasher.hexdigest()
+
+    def get_ast_key(self, jack_file_path):
+        """Returns the cache key of the AST for the current contents of a Jack file."""
+        hasher = hashlib.sha256()
+        hasher.update(self.compiler_version.encode('utf-8'))
+        hasher.update(jack_file_path.name.encode('utf-8'))
+        hasher.update(jack_file_path.read_bytes())
+        return hasher.hexdigest()
+
+    @staticmethod
+    def get_output_file_names(jack_file_path, debug):
+        """Returns the names of the files written by the compiler for a Jack file."""
+        file_names = [f'{jack_file_path.stem}.vm']
+        if debug:
+            file_names.append(f'{jack_file_path.stem}T.xml')
+            file_names.append(f'{jack_file_path.stem}.xml')
+        return file_names
+
+    def get_entry_dir(self, jack_file_path):
+        """Returns the cache entry directory for a Jack file."""
+        return self.cache_dir / jack_file_path.stem
+
+    def restore(self, jack_file_path, debug=False):
+        """
+        Copies the cached output for a Jack file next to it.
+
+        Returns True on a cache hit, otherwise False and the file must be compiled.
+        """
+        entry_dir = self.get_entry_dir(jack_file_path)
+        key_path = entry_dir / self.KEY_FILE_NAME
+        file_names = self.get_output_file_names(jack_file_path, debug)
+
+        if (not key_path.is_file()
+            or key_path.read_text() != self.get_key(jack_file_path)
+            or not all((entry_dir / name).is_file() for name in file_names)
+        ):
+            self.misses += 1
+            return False
+
+        for name in file_names:
+            shutil.copyfile(entry_dir / name, jack_file_path.parent / name)
+
+        self.hits += 1
+        return True
+
+    def get_ast_path(self, jack_file_path):
+        """Returns the path of the cached AST for a Jack file, next to its entry directory."""
+        return self.cache_dir / f'{jack_file_path.stem}.ast'
+
+    def get_ast_key_path(self, jack_file_path):
+        """Returns the path of the key of the cached AST for a Jack file."""
+        return self.cache_dir / f'{jack_file_path.stem}.ast.key'
+
+    def load_ast(self, jack_file_path):
+        """
+        Returns the cached AST of a Jack file, or None if it is missing, out of
+        date or cannot be loaded.
+
+        The key is checked before the AST is unpickled, so only an AST stored
+        for the same source and compiler version is ever loaded.
+        """
+        ast_path = self.get_ast_path(jack_file_path)
+        key_path = self.get_ast_key_path(jack_file_path)
+
+        if (not key_path.is_file()
+            or not ast_path.is_file()
+            or key_path.read_text() != self.get_ast_key(jack_file_path)
+        ):
+            return None
+
+        # an AST pickled by an older compiler can fail in any way, which is a miss
+        try:
+            with open(ast_path, 'rb') as ast_file:
+                jack_class = pickle.load(ast_file)
+        except Exception:
+            return None
+
+        self.ast_hits += 1
+        return jack_class
+
+    def store_ast(self, jack_file_path, jack_class):
+        """
+        Stores the AST of a Jack file. The old key is removed first and the new
+        key is written last, so a partially written AST is never loaded.
+        """
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        ast_path = self.get_ast_path(jack_file_path)
+        key_path = self.get_ast_key_path(jack_file_path)
+        temp_path = ast_path.with_suffix('.ast.tmp')
+
+        key_path.unlink(missing_ok=True)
+        with open(temp_path, 'wb') as ast_file:
+            pickle.dump(jack_class, ast_file, protocol=pickle.HIGHEST_PROTOCOL)
+        temp_path.replace(ast_path)
+        key_path.write_text(self.get_ast_key(jack_file_path))
+
+    def store(self, jack_file_path, debug=False):
+        """Copies the freshly compiled output for a Jack file into the cache."""
+        entry_dir = self.get_entry_dir(jack_file_path)
+
+        # replace any previous entry, the key is written last so a partially
+        # written entry is never treated as a hit
+        if entry_dir.exists():
+            shutil.rmtree(entry_dir)
+        entry_dir.mkdir(parents=True)
+
+        for name in self.get_output_file_names(jack_file_path, debug):
+            shutil.copyfile(jack_file_path.parent / name, entry_dir / name)
+
+        (entry_dir / self.KEY_FILE_NAME).write_text(self.get_key(jack_file_path))
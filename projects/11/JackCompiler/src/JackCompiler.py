@@ -1,11 +1,19 @@
+import contextlib
+import io
 import sys
 import time
 import traceback
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
 
 from CompilationEngine import CompilationEngine
-from exceptions import JackCompilerError
+from CompileCache import CompileCache
+from exceptions import JackCompilerError, JackError
 from file_util import is_jack_file
+from vm_inliner import inline_vm_files
+
+USAGE = 'Usage: python JackCompiler.py [-a|b|c|d|i|p|r|t|v|O] [-j N] [-s N] <file.jack>|<path-to-jack-files-directory>'
 
 def validate_flags(flags):
     """Validates flag string."""
@@ -14,11 +22,103 @@ def validate_flags(flags):
         return False
 
     for char in flags[1:]:
-        if char not in {'d', 'v'}:
+        if char not in {'a', 'b', 'c', 'd', 'i', 'p', 'r', 't', 'v', 'O'}:
             return False
 
     return True
 
+def parse_positive_int(value):
+    """Parses the value of the -j and -s options. Returns None if it is not a positive integer."""
+    try:
+        as_int = int(value)
+    except ValueError:
+        return None
+
+    if as_int < 1:
+        return None
+
+    return as_int
+
+def compile_jack_file(file_path, debug=False, verbose=False, regex_lexer=False, buffered_lexer=False, use_cache=False, stream_buffer_size=None, optimize=False, analyzer_output=False, string_pool=False, use_ast=False):
+    """
+    Compiles a single Jack file inside of a worker process.
+
+    Returns the exit code for the file, all output printed while compiling
+    it (so the parent process can report files in a deterministic order), and
+    the worker's cache.
+    """
+    output = io.StringIO()
+    exit_code = 0
+    xml_output = debug or analyzer_output
+    cache = CompileCache(file_path.parent, optimize, analyzer_output, string_pool) if use_cache else None
+
+    with contextlib.redirect_stdout(output):
+        ce = None
+        try:
+            # symbol tables are only printed while compiling, so -v skips the cached output
+            if cache is None or verbose or not cache.restore(file_path, xml_output):
+                ce = CompilationEngine(file_path, verbose, regex_lexer, buffered_lexer, stream_buffer_size, xml_output=xml_output, optimize=optimize,
+                                       identifier_attributes=not analyzer_output, string_pool=string_pool, use_ast=use_ast, ast_cache=cache)
+                ce.compileClass()
+                ce.write_vm_file()
+                if xml_output:
+                    ce.write_xml()
+                if cache is not None:
+                    cache.store(file_path, xml_output)
+
+        except JackError as error:
+            exit_code = 1
+            print(f'{file_path.name}: {error}')
+            if ce is not None:
+                ce.write_vm_file()
+                print(f'{file_path.name}: Generated VM output with errors')
+                if xml_output:
+                    ce.write_xml()
+                    print(f'{file_path.name}: Debug - Generated XML output with errors')
+
+        except Exception:
+            exit_code = 2
+            print(f'{file_path.name}:')
+            print(traceback.format_exc())
+            if ce is not None:
+                ce.discard_vm_file()
+
+    return exit_code, output.getvalue(), cache
+
+def compile_in_parallel(jack_files, job_count, debug, verbose, regex_lexer, buffered_lexer, cache=None, stream_buffer_size=None, optimize=False, analyzer_output=False, string_pool=False, use_ast=False):
+    """
+    Compiles each Jack file in a pool of worker processes.
+
+    Output and errors are printed in the order of the sorted file names. Cache
+    hits and misses from the workers are added to the cache. Returns the highest
+    exit code of all files.
+    """
+    worker = partial(
+        compile_jack_file,
+        debug=debug,
+        verbose=verbose,
+        regex_lexer=regex_lexer,
+        buffered_lexer=buffered_lexer,
+        use_cache=cache is not None,
+        stream_buffer_size=stream_buffer_size,
+        optimize=optimize,
+        analyzer_output=analyzer_output,
+        string_pool=string_pool,
+        use_ast=use_ast
+    )
+
+    exit_code = 0
+    with ProcessPoolExecutor(max_workers=job_count) as executor:
+        for file_exit_code, output, worker_cache in executor.map(worker, sorted(jack_files)):
+            print(output, end='')
+            exit_code = max(exit_code, file_exit_code)
+            if cache is not None:
+                cache.hits += worker_cache.hits
+                cache.misses += worker_cache.misses
+                cache.ast_hits += worker_cache.ast_hits
+
+    return exit_code
+
 def main():
 
     args = sys.argv
@@ -26,77 +126,170 @@ def main():
 
     debug = False
     verbose = False
+    regex_lexer = False
+    buffered_lexer = False
+    use_cache = False
+    optimize = False
+    analyzer_output = False
+    inline = False
+    string_pool = False
+    use_ast = False
+    job_count = None
+    stream_buffer_size = None
     src_path = ''
 
-    if (arg_count < 2 or arg_count > 3):
-        print('Usage: python JackCompiler.py [-d|v] <file.jack>|<path-to-jack-files-directory>')
+    if (arg_count < 2):
+        print(USAGE)
         sys.exit(1)
 
-    if (arg_count == 2):
-        src_path = Path(args[1])
+    src_path = Path(args[-1])
+    options = args[1:-1]
+
+    while options:
+        option = options.pop(0)
 
-    elif (arg_count == 3):
+        if option == '-j':
+            job_count = parse_positive_int(options.pop(0)) if options else None
+            if job_count is None:
+                print("Error: '-j' requires a positive number of jobs")
+                sys.exit(1)
+            continue
+
+        if option == '-s':
+            stream_buffer_size = parse_positive_int(options.pop(0)) if options else None
+            if stream_buffer_size is None:
+                print("Error: '-s' requires a positive buffer size in bytes")
+                sys.exit(1)
+            continue
 
         # NOTE: flag validation could be better
-        if not validate_flags(args[1]):
-            print(f"Error: '{args[1]}' is not a valid option")
+        if not validate_flags(option):
+            print(f"Error: '{option}' is not a valid option")
             sys.exit(1)
 
-        if 'd' in args[1]:
+        if 'd' in option:
             debug = True
 
-        if 'v' in args[1]:
+        if 'v' in option:
             verbose = True
 
-        src_path = Path(args[2])
+        if 'r' in option:
+            regex_lexer = True
+
+        if 'b' in option:
+            buffered_lexer = True
+
+        if 'c' in option:
+            use_cache = True
+
+        if 'O' in option:
+            optimize = True
+
+        if 'a' in option:
+            analyzer_output = True
+
+        if 'i' in option:
+            inline = True
+
+        if 'p' in option:
+            string_pool = True
+
+        if 't' in option:
+            use_ast = True
+
+    # the analyzer output is the debug XML without the identifier attributes
+    xml_output = debug or analyzer_output
+
+    # the XML is written while parsing, which the AST parser does not do
+    if use_ast and xml_output:
+        print("Error: 't' cannot be combined with 'a' or 'd'")
+        sys.exit(1)
 
     try:
         start_time = time.perf_counter()
 
         output_path = ''
         ce = None
+        cache = None
+        jack_files = []
 
         if src_path.is_file():
             if is_jack_file(src_path):
                 output_path = src_path.parent
-                ce = CompilationEngine(src_path, verbose)
-                ce.compileClass()
-                ce.write_vm_file()
-                if debug:
-                    ce.write_xml()
+                jack_files = [src_path]
+                if use_cache:
+                    cache = CompileCache(output_path, optimize, analyzer_output, string_pool)
+                if cache is None or verbose or not cache.restore(src_path, xml_output):
+                    ce = CompilationEngine(src_path, verbose, regex_lexer, buffered_lexer, stream_buffer_size, xml_output=xml_output, optimize=optimize,
+                                           identifier_attributes=not analyzer_output, string_pool=string_pool, use_ast=use_ast, ast_cache=cache)
+                    ce.compileClass()
+                    ce.write_vm_file()
+                    if xml_output:
+                        ce.write_xml()
+                    if cache is not None:
+                        cache.store(src_path, xml_output)
             else:
                 raise JackCompilerError(f"File '{src_path.name}' does not have the extention '.jack'")
 
+        elif job_count is not None:
+            output_path = src_path
+            if use_cache:
+                cache = CompileCache(output_path, optimize, analyzer_output, string_pool)
+            jack_files = [file_path for file_path in src_path.iterdir() if is_jack_file(file_path)]
+            exit_code = compile_in_parallel(jack_files, job_count, debug, verbose, regex_lexer, buffered_lexer, cache, stream_buffer_size, optimize, analyzer_output, string_pool, use_ast)
+            if exit_code:
+                sys.exit(exit_code)
+
         else:
             output_path = src_path
-            for file_path in src_path.iterdir():
-                if is_jack_file(file_path):
-                    ce = CompilationEngine(file_path, verbose)
-                    ce.compileClass()
-                    ce.write_vm_file()
-                    if debug:
-                        ce.write_xml()
+            if use_cache:
+                cache = CompileCache(output_path, optimize, analyzer_output, string_pool)
+            jack_files = [file_path for file_path in src_path.iterdir() if is_jack_file(file_path)]
+            for file_path in jack_files:
+                if cache is not None and not verbose and cache.restore(file_path, xml_output):
+                    continue
+                ce = CompilationEngine(file_path, verbose, regex_lexer, buffered_lexer, stream_buffer_size, xml_output=xml_output, optimize=optimize,
+                                       identifier_attributes=not analyzer_output, string_pool=string_pool, use_ast=use_ast, ast_cache=cache)
+                ce.compileClass()
+                ce.write_vm_file()
+                if xml_output:
+                    ce.write_xml()
+                if cache is not None:
+                    cache.store(file_path, xml_output)
+
+        # the whole program is compiled, so calls between classes can be inlined
+        if inline:
+            call_sites, function_count, cycles_saved = inline_vm_files([file_path.with_suffix('.vm') for file_path in jack_files], optimize)
+            print(f'Inlined {call_sites} call sites of {function_count} functions (about {cycles_saved} Hack cycles saved when each call site runs once)')
 
         end_time: float = time.perf_counter()
         exec_time: float = round((end_time - start_time), 5)
 
         print(f'\nCompilation complete. VM files written to: {output_path}')
-        print(f'Execution time: {exec_time} seconds\n')
+        if cache is not None:
+            ast_report = f', {cache.ast_hits} ASTs reused' if use_ast else ''
+            print(f'Execution time: {exec_time} seconds (cache: {cache.hits} hits, {cache.misses} misses{ast_report})\n')
+        else:
+            print(f'Execution time: {exec_time} seconds\n')
 
-        if debug:
+        if analyzer_output:
+            print(f'Generated JackAnalyzer XML output\n')
+        elif debug:
             print(f'Debug - Generated debug XML output\n')
 
-    except JackCompilerError as error:
+    except JackError as error:
         print(error)
         ce.write_vm_file()
         print('Generated VM output with errors')
-        if debug:
+        if xml_output:
             ce.write_xml()
             print('Debug - Generated XML output with errors')
         sys.exit(1)
 
     except Exception:
         print(traceback.format_exc())
+        if ce is not None:
+            ce.discard_vm_file()
         sys.exit(2)
 
 if __name__ == '__main__':
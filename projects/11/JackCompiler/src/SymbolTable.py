@@ -1,110 +1,103 @@
+from constants import SYMBOL_KIND
 from exceptions import SymbolTableError
 
+# symbol kind names indexed by their SYMBOL_KIND code
+KIND_NAMES = ('static', 'field', 'argument', 'local')
+KIND_CODES = {name: code for code, name in enumerate(KIND_NAMES)}
+
+class Symbol():
+    """A symbol table entry, the kind is stored as a SYMBOL_KIND code."""
+
+    __slots__ = ('type', 'kind', 'index')
+
+    def __init__(self, type, kind, index):
+        self.type = type
+        self.kind = kind
+        self.index = index
+
+    @property
+    def kind_name(self):
+        """Returns the name of the symbol's kind."""
+        return KIND_NAMES[self.kind]
+
 class SymbolTable():
     """Class for managing class and subroutine symbol tables."""
 
     def __init__(self):
         """Initializes the class and subroutine symbol table."""
         self._class_scope = {}
-        self._static_count = 0
-        self._field_count = 0
-
         self._subroutine_scope = {}
-        self._argument_count = 0
-        self._local_count = 0
+
+        # every visible symbol, class symbols take precedence over
+        # subroutine symbols of the same name
+        self._symbols = {}
+
+        # symbol counts indexed by SYMBOL_KIND code
+        self._var_counts = [0, 0, 0, 0]
 
     def startSubroutine(self):
         """Resets the subroutine symbol table."""
         self._subroutine_scope = {}
-        self._argument_count = 0
-        self._local_count = 0
+        self._symbols = dict(self._class_scope)
+        self._var_counts[SYMBOL_KIND.ARGUMENT] = 0
+        self._var_counts[SYMBOL_KIND.LOCAL] = 0
 
     def define(self, name, type, kind):
         """Inserts a new entry into the correct symbol table."""
 
-        if kind == 'static':
-            self._class_scope[name] = {
-                'type': type,
-                'kind': kind,
-                'index': self._static_count
-            }
-            self._static_count += 1
-
-        elif kind == 'field':
-            self._class_scope[name] = {
-                'type': type,
-                'kind': kind,
-                'index': self._field_count
-            }
-            self._field_count += 1
-
-        elif kind == 'argument':
-            self._subroutine_scope[name] = {
-                'type': type,
-                'kind': kind,
-                'index': self._argument_count
-            }
-            self._argument_count += 1
-
-        elif kind == 'local':
-            self._subroutine_scope[name] = {
-                'type': type,
-                'kind': kind,
-                'index': self._local_count
-            }
-            self._local_count += 1
+        kind_code = KIND_CODES.get(kind)
+        if kind_code is None:
+            raise SymbolTableError(f"SymbolTable.define() - Invalid symbol kind: '{kind}'")
 
+        symbol = Symbol(type, kind_code, self._var_counts[kind_code])
+        self._var_counts[kind_code] += 1
+
+        if kind_code <= SYMBOL_KIND.FIELD:
+            self._class_scope[name] = symbol
+            self._symbols[name] = symbol
         else:
-            raise SymbolTableError(f"SymbolTable.define() - Invalid symbol kind: '{kind}'")
+            self._subroutine_scope[name] = symbol
+            if name not in self._class_scope:
+                self._symbols[name] = symbol
+
+    def resolve(self, name):
+        """Returns the Symbol with the kind, type and index of the named symbol."""
+        symbol = self._symbols.get(name)
+        if symbol is None:
+            raise SymbolTableError(f"SymbolTable.resolve() - Symbol with name '{name}' does not exist")
+        return symbol
 
     def varExists(self, name):
         """Checks if a variable of the given name exists."""
-        if self._class_scope.get(name):
-            return True
-        elif self._subroutine_scope.get(name):
-            return True
-        else:
-            return False
+        return name in self._symbols
 
     def VarCount(self, kind):
         """For the current scope, returns the count of the kinds of symbols."""
-        if kind == 'static':
-            return self._static_count
-        elif kind == 'field':
-            return self._field_count
-        elif kind == 'argument':
-            return self._argument_count
-        elif kind == 'local':
-            return self._local_count
-        else:
+        kind_code = KIND_CODES.get(kind)
+        if kind_code is None:
             raise SymbolTableError(f"SymbolTable.VarCount() - '{kind}' is not a valid symbol kind")
+        return self._var_counts[kind_code]
 
     def KindOf(self, name):
         """Returns the kind of the named symbol."""
-        if self._class_scope.get(name):
-            return self._class_scope[name]['kind']
-        elif self._subroutine_scope.get(name):
-            return self._subroutine_scope[name]['kind']
-        else:
+        symbol = self._symbols.get(name)
+        if symbol is None:
             raise SymbolTableError(f"SymbolTable.KindOf() - Symbol with name '{name}' does not exist")
+        return KIND_NAMES[symbol.kind]
 
     def TypeOf(self, name):
         """Returns the type of the named symbol."""
-        if self._class_scope.get(name):
-            return self._class_scope[name]['type']
-        elif self._subroutine_scope.get(name):
-            return self._subroutine_scope[name]['type']
-        else:
+        symbol = self._symbols.get(name)
+        if symbol is None:
             raise SymbolTableError(f"SymbolTable.TypeOf() - Symbol with name '{name}' does not exist")
+        return symbol.type
 
     def IndexOf(self, name):
         """Returns the index of the named symbol."""
-        if self._class_scope.get(name):
-            return self._class_scope[name]['index']
-        elif self._subroutine_scope.get(name):
-            return self._subroutine_scope[name]['index']
-        else:
+        symbol = self._symbols.get(name)
+        if symbol is None:
             raise SymbolTableError(f"SymbolTable.IndexOf() - Symbol with name '{name}' does not exist")
+        return symbol.index
 
     def print_class_table(self, class_name):
         """Prints out the class-level symbol table for debugging."""
@@ -131,11 +124,11 @@ class SymbolTable():
 
         for k, v in table.items():
             maxVarLen = len(k) if (len(k) > maxVarLen) else maxVarLen
-            maxTypeLen = len(v['type']) if (len(v['type']) > maxTypeLen) else maxTypeLen
-            maxKindLen = len(v['kind']) if (len(v['kind']) > maxKindLen) else maxKindLen
+            maxTypeLen = len(v.type) if (len(v.type) > maxTypeLen) else maxTypeLen
+            maxKindLen = len(v.kind_name) if (len(v.kind_name) > maxKindLen) else maxKindLen
 
         for k, v in table.items():
             varName = k + (' ' * (maxVarLen - len(k)))
-            typeVal = v['type'] + (' ' * (maxTypeLen - len(v['type'])))
-            kind = v['kind'] + (' ' * (maxKindLen - len(v['kind'])))
-            print(f"|{varName}|{typeVal}|{kind}|{v['index']}|")
+            typeVal = v.type + (' ' * (maxTypeLen - len(v.type)))
+            kind = v.kind_name + (' ' * (maxKindLen - len(v.kind_name)))
+            print(f"|{varName}|{typeVal}|{kind}|{v.index}|")
@@ -1,4 +1,7 @@
+from pathlib import Path
+
 from exceptions import VMWriterError
+from vm_optimizer import count_vm_commands, optimize_vm_lines
 
 class VMWriter():
     """Manages the VM commands."""
@@ -13,11 +16,32 @@ class VMWriter():
         '|': 'or'
     }
 
-    def __init__(self, output_path):
+    def __init__(self, output_path, stream_buffer_size=None, optimize=False):
+        """
+        By default all lines are kept in memory until close(). When a stream
+        buffer size is set, lines are written as they are added through a file
+        handle buffered with that many bytes.
+
+        When optimize is set, the lines are rewritten by the peephole optimizer
+        before they are written. While streaming, each function is written once
+        the next function starts.
+        """
         self.output_path = output_path
         self._lines = []
         self.label_count = 0
 
+        self.optimize = optimize
+        self._optimized_lines = []
+        self.command_count = 0
+        self.optimized_command_count = 0
+
+        # lines captured for the expression IR, innermost capture last
+        self._captures = []
+
+        self._vm_file = None
+        if stream_buffer_size is not None:
+            self._vm_file = open(f'{self.output_path}.vm', 'w', newline='', buffering=stream_buffer_size)
+
     def increment_label_count(self):
         """Increments the label count by 1."""
         self.label_count += 1
@@ -29,16 +53,75 @@ class VMWriter():
         return segment
 
     def add_line(self, line, indent=True):
-        """Adds the line to the internal lines list and adds a newline char."""
+        """Adds the line to the internal lines list (or the stream) and adds a newline char."""
         if indent:
-            self._lines.append(f'    {line}\n')
+            line = f'    {line}\n'
+        else:
+            line = f'{line}\n'
+
+        self.add_formatted_line(line)
+
+    def add_formatted_line(self, line):
+        """Adds a line which already has its indent and newline char."""
+        if self._captures:
+            self._captures[-1].append(line)
+        elif self._vm_file is not None and not self.optimize:
+            self._vm_file.write(line)
+        else:
+            self._lines.append(line)
+
+    def add_lines(self, lines):
+        """Adds lines which already have their indent and newline char, such as captured lines."""
+        for line in lines:
+            self.add_formatted_line(line)
+
+    def start_capture(self):
+        """Lines added until the matching end_capture() are captured instead of written."""
+        self._captures.append([])
+
+    def end_capture(self):
+        """Returns the lines captured since the matching start_capture()."""
+        return self._captures.pop()
+
+    def flush_optimized_lines(self):
+        """Optimizes the lines held in memory and moves them to the stream (or the optimized lines)."""
+        if not self._lines:
+            return
+
+        optimized_lines = optimize_vm_lines(self._lines)
+        self.command_count += count_vm_commands(self._lines)
+        self.optimized_command_count += count_vm_commands(optimized_lines)
+        self._lines = []
+
+        if self._vm_file is not None:
+            self._vm_file.writelines(optimized_lines)
         else:
-            self._lines.append(f'{line}\n')
+            self._optimized_lines.extend(optimized_lines)
 
     def close(self):
         """Write the current VM file to the output path."""
+        if self.optimize:
+            self.flush_optimized_lines()
+
+        if self._vm_file is not None:
+            # flushes any buffered lines, safe to call more than once
+            self._vm_file.close()
+            return
+
         with open(f'{self.output_path}.vm', 'w', newline='') as vm_file:
-            vm_file.writelines(self._lines)
+            vm_file.writelines(self._optimized_lines if self.optimize else self._lines)
+
+    def discard(self):
+        """
+        Closes the stream without writing the remaining lines and removes the
+        partially streamed VM file. Does nothing when the lines are kept in
+        memory or the stream is already closed.
+        """
+        if self._vm_file is None or self._vm_file.closed:
+            return
+
+        self._vm_file.close()
+        Path(f'{self.output_path}.vm').unlink(missing_ok=True)
 
     def writePush(self, segment, index):
         """Writes a VM push command to the buffer."""
@@ -90,6 +173,9 @@ class VMWriter():
 
     def writeFunction(self, func_name, n_locals):
         """Writes a VM function command to the buffer."""
+        # peephole rewrites never cross a function, so the previous one can be streamed
+        if self.optimize and self._vm_file is not None:
+            self.flush_optimized_lines()
         cmd = f'function {func_name} {n_locals}'
         self.add_line(cmd, indent=False)
 
@@ -145,3 +231,40 @@ class VMWriter():
             # the max length is **probably** to the first arg
             # and the ASCII representation of the char is the second arg
             self.writeCall('String.appendChar', 2)
+
+    def writePooledStringConstant(self, string_pool, string, ready_label):
+        """
+        Writes the VM commands which push a string constant of the string pool,
+        calling the pool function first when the string is not built yet.
+        """
+        static_index = string_pool.get_static_index(string)
+
+        self.start_capture()
+        self.writePush('static', static_index)
+        # the static is 0 until the pool function has run
+        self.add_line(f'if-goto {ready_label}')
+        self.writeCall(string_pool.get_function_name(), 0)
+        self.writePop('temp', 0)
+        self.WriteLabel(ready_label)
+        self.writePush('static', static_index)
+        lines = self.end_capture()
+
+        string_pool.count_pooled_commands(lines)
+        self.add_lines(lines)
+
+    def writeStringPool(self, string_pool):
+        """Writes the pool function, which builds each string constant of the pool once."""
+        if not string_pool.static_indexes:
+            return
+
+        self.start_capture()
+        self.writeFunction(string_pool.get_function_name(), 0)
+        for string, static_index in string_pool.static_indexes.items():
+            self.writeStringConstant(string)
+            self.writePop('static', static_index)
+        self.writePush('constant', 0)
+        self.writeReturn()
+        lines = self.end_capture()
+
+        string_pool.count_pooled_commands(lines)
+        self.add_lines(lines)
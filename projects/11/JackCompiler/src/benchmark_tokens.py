@@ -0,0 +1,55 @@
+import sys
+import tracemalloc
+from pathlib import Path
+
+import frontend_path # adds the shared jack_frontend package to the import path
+from file_util import is_jack_file
+from jack_frontend.JackTokenizer import JackBufferedTokenizer
+
+def measure_tokens(jack_files):
+    """
+    Lexes each Jack file into a token buffer and measures the token objects.
+
+    Returns the number of tokens, the number of distinct token objects, and the
+    bytes allocated while lexing (excluding the source code).
+    """
+    token_count = 0
+    token_ids = set()
+    tokenizers = []
+
+    tracemalloc.start()
+    for file_path in jack_files:
+        tokenizer = JackBufferedTokenizer(file_path)
+        tokenizers.append(tokenizer)
+        token_count += len(tokenizer.tokens)
+        token_ids.update(id(token) for token in tokenizer.tokens)
+
+    # the raw source code is not part of the token representation
+    source_bytes = sum(sys.getsizeof(tokenizer.raw_source_code) for tokenizer in tokenizers)
+    allocated_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # token_ids is allocated while tracing, remove it from the total
+    allocated_bytes -= sys.getsizeof(token_ids)
+
+    return token_count, len(token_ids), allocated_bytes - source_bytes
+
+def main():
+
+    args = sys.argv
+
+    if (len(args) < 2):
+        print('Usage: python benchmark_tokens.py <path-to-jack-files-directory> ...')
+        sys.exit(1)
+
+    for src_path in args[1:]:
+        jack_files = sorted(file_path for file_path in Path(src_path).iterdir() if is_jack_file(file_path))
+        token_count, object_count, allocated_bytes = measure_tokens(jack_files)
+
+        print(f'\n{src_path}')
+        print(f'Tokens: {token_count}')
+        print(f'Token objects: {object_count}')
+        print(f'Allocated: {allocated_bytes} bytes ({round(allocated_bytes / token_count, 1)} bytes per token)')
+
+if __name__ == '__main__':
+    main()
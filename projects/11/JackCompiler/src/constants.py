@@ -2,9 +2,9 @@ class IDENTIFER_ATTR():
     DEFINED = 'defined'
     USED = 'used'
 
-class TOKEN_TYPE():
-    IDENTIFIER = 'identifier'
-    INTEGER_CONSTANT = 'integerConstant'
-    KEYWORD = 'keyword'
-    STRING_CONSTANT = 'stringConstant'
-    SYMBOL = 'symbol'
+class SYMBOL_KIND():
+    STATIC = 0
+    FIELD = 1
+    ARGUMENT = 2
+    LOCAL = 3
+
@@ -1,7 +1,8 @@
-class JackCompilerError(Exception):
+import frontend_path # adds the shared jack_frontend package to the import path
+from jack_frontend.exceptions import JackError, JackTokenizerError
+
+class JackCompilerError(JackError):
     """Base exception for errors handled by the JackCompiler."""
-    def __str__(self):
-        return f'Error - {self.args[0]}'
 
 class CompilationEngineError(JackCompilerError):
     """Exception for errors handled by the CompilationEngine."""
@@ -13,8 +14,8 @@ class CompilationEngineError(JackCompilerError):
     def __str__(self):
         return f'Error - line {self.tokenizer.line_num} - {self.args[0]}'
 
-class JackTokenizerError(JackCompilerError):
-    """Exception for errors handled by the JackTokenizer."""
+class AstParserError(CompilationEngineError):
+    """Exception for errors handled by the AstParser."""
     pass
 
 class SymbolTableError(JackCompilerError):
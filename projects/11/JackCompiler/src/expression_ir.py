@@ -0,0 +1,297 @@
+WORD_MASK = 0xFFFF
+MAX_CONSTANT = 32_767
+
+# operators whose operands can be swapped
+COMMUTATIVE_OPS = {'+', '*', '&', '|', '='}
+
+# temp slot of a doubling, temp 0 is left to do statements and array lets so
+# the inliner can tell a discarded return value from one which is read back
+DOUBLE_TEMP_INDEX = 1
+
+def to_word(value):
+    """Wraps an int to a signed 16-bit Hack word."""
+    value &= WORD_MASK
+    return value - (WORD_MASK + 1) if value & 0x8000 else value
+
+def fold_constants(op, x, y):
+    """
+    Returns the value of a binary operator on two constants, or None when it
+    cannot be known at compile time.
+
+    Division is only folded for a positive dividend and divisor, so the
+    result does not depend on the rounding of the OS. Comparisons test the
+    sign of the 16-bit difference, like the lt and gt of the VM translator,
+    so they give the same result when the difference overflows.
+    """
+    if op == '+':
+        return to_word(x + y)
+    if op == '-':
+        return to_word(x - y)
+    if op == '*':
+        return to_word(x * y)
+    if op == '/':
+        return x // y if x >= 0 and y > 0 else None
+    if op == '&':
+        return to_word(x & y)
+    if op == '|':
+        return to_word(x | y)
+    if op == '<':
+        return -1 if to_word(x - y) < 0 else 0
+    if op == '>':
+        return -1 if to_word(x - y) > 0 else 0
+    if op == '=':
+        return -1 if x == y else 0
+    return None
+
+def get_power_of_two(value):
+    """Returns k when the value is 2^k with k > 0, otherwise None."""
+    if value > 1 and value & (value - 1) == 0:
+        return value.bit_length() - 1
+    return None
+
+class ExpressionNode():
+    """Base class for the nodes of the expression IR."""
+
+    __slots__ = ()
+
+    def fold(self):
+        """Returns an equivalent node with the constant parts evaluated."""
+        return self
+
+    def is_constant(self, value=None):
+        """Returns True if the node is a constant, and has the value when one is given."""
+        return False
+
+    def is_pure(self):
+        """Returns True if the VM of the node has no side effects and can be removed."""
+        return True
+
+    def command_count(self):
+        """Returns the number of VM commands written by the node."""
+        raise NotImplementedError
+
+    def write(self, vm_writer):
+        """Writes the VM commands which push the value of the node."""
+        raise NotImplementedError
+
+class ConstantNode(ExpressionNode):
+    """An integer constant, or true, false and null."""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = to_word(value)
+
+    def is_constant(self, value=None):
+        return value is None or self.value == value
+
+    def command_count(self):
+        return 1 if self.value >= 0 else 2
+
+    def write(self, vm_writer):
+        if self.value >= 0:
+            vm_writer.writePush('constant', self.value)
+        elif self.value == -MAX_CONSTANT - 1:
+            # 32768 is not a valid constant
+            vm_writer.writePush('constant', MAX_CONSTANT)
+            vm_writer.writeUnaryOp('~')
+        else:
+            vm_writer.writePush('constant', -self.value)
+            vm_writer.writeUnaryOp('-')
+
+class CodeNode(ExpressionNode):
+    """
+    A term which is not folded, such as a variable, an array element or a
+    subroutine call. It holds the VM lines captured while it was compiled.
+    """
+
+    __slots__ = ('lines',)
+
+    def __init__(self, lines):
+        self.lines = lines
+
+    def is_pure(self):
+        return not any(line.split()[0] == 'call' for line in self.lines)
+
+    def is_simple(self):
+        """Returns True if the node is a single command without side effects, which is cheap to repeat."""
+        return len(self.lines) == 1 and self.is_pure()
+
+    def command_count(self):
+        return len(self.lines)
+
+    def write(self, vm_writer):
+        vm_writer.add_lines(self.lines)
+
+class UnaryNode(ExpressionNode):
+    """A unary operator, '-' or '~', on a node."""
+
+    __slots__ = ('op', 'operand')
+
+    def __init__(self, op, operand):
+        self.op = op
+        self.operand = operand
+
+    def is_pure(self):
+        return self.operand.is_pure()
+
+    def fold(self):
+        operand = self.operand.fold()
+
+        if operand.is_constant():
+            return ConstantNode(-operand.value if self.op == '-' else ~operand.value)
+
+        # double negation
+        if isinstance(operand, UnaryNode) and operand.op == self.op:
+            return operand.operand
+
+        return UnaryNode(self.op, operand)
+
+    def command_count(self):
+        return self.operand.command_count() + 1
+
+    def write(self, vm_writer):
+        self.operand.write(vm_writer)
+        vm_writer.writeUnaryOp(self.op)
+
+class DoubleNode(ExpressionNode):
+    """
+    A node doubled a number of times, which is how a multiply by a power of
+    two is written without calling Math.multiply.
+
+    Each doubling keeps the value in temp 1, which is only read by the two
+    pushes right after it is popped.
+    """
+
+    __slots__ = ('operand', 'count')
+
+    def __init__(self, operand, count):
+        self.operand = operand
+        self.count = count
+
+    def is_pure(self):
+        return self.operand.is_pure()
+
+    def command_count(self):
+        # a simple operand is pushed twice for the first doubling
+        if isinstance(self.operand, CodeNode) and self.operand.is_simple():
+            return 3 + 4 * (self.count - 1)
+        return self.operand.command_count() + 4 * self.count
+
+    def write(self, vm_writer):
+        self.operand.write(vm_writer)
+        count = self.count
+
+        if isinstance(self.operand, CodeNode) and self.operand.is_simple():
+            self.operand.write(vm_writer)
+            vm_writer.WriteArithmatic('+')
+            count -= 1
+
+        for _ in range(count):
+            vm_writer.writePop('temp', DOUBLE_TEMP_INDEX)
+            vm_writer.writePush('temp', DOUBLE_TEMP_INDEX)
+            vm_writer.writePush('temp', DOUBLE_TEMP_INDEX)
+            vm_writer.WriteArithmatic('+')
+
+class BinaryNode(ExpressionNode):
+    """A binary operator on two nodes, Jack has no operator precedence."""
+
+    __slots__ = ('op', 'left', 'right')
+
+    def __init__(self, op, left, right):
+        self.op = op
+        self.left = left
+        self.right = right
+
+    def is_pure(self):
+        return self.left.is_pure() and self.right.is_pure()
+
+    def fold(self):
+        left = self.left.fold()
+        right = self.right.fold()
+        op = self.op
+
+        if left.is_constant() and right.is_constant():
+            value = fold_constants(op, left.value, right.value)
+            if value is not None:
+                return ConstantNode(value)
+            return BinaryNode(op, left, right)
+
+        if left.is_constant(0) and op == '-':
+            return UnaryNode('-', right)
+
+        # the constant of a commutative operator is moved to the right
+        if left.is_constant() and op in COMMUTATIVE_OPS:
+            folded = fold_constant_operand(op, right, left)
+            # the operands keep their order when nothing was simplified
+            if isinstance(folded, BinaryNode) and folded.op == op and folded.left is right and folded.right.is_constant(left.value):
+                return BinaryNode(op, left, right)
+            return folded
+
+        if right.is_constant():
+            return fold_constant_operand(op, left, right)
+
+        return BinaryNode(op, left, right)
+
+    def command_count(self):
+        return self.left.command_count() + self.right.command_count() + 1
+
+    def write(self, vm_writer):
+        self.left.write(vm_writer)
+        self.right.write(vm_writer)
+        vm_writer.WriteArithmatic(self.op)
+
+def fold_constant_operand(op, node, constant):
+    """
+    Simplifies an operator with a constant right operand, after a constant
+    of a commutative operator is moved to the right.
+
+    A node is only removed when it has no side effects.
+    """
+    value = constant.value
+
+    if op in {'+', '-'}:
+        if op == '-':
+            value = to_word(-value)
+
+        # (x + c1) + c2 is x + (c1 + c2)
+        if isinstance(node, BinaryNode) and node.op in {'+', '-'} and node.right.is_constant():
+            inner_value = node.right.value if node.op == '+' else -node.right.value
+            value = to_word(inner_value + value)
+            node = node.left
+
+        if value == 0:
+            return node
+        if value < 0 and value != -MAX_CONSTANT - 1:
+            return BinaryNode('-', node, ConstantNode(-value))
+        return BinaryNode('+', node, ConstantNode(value))
+
+    if op == '*':
+        if value == 1:
+            return node
+        if value == 0 and node.is_pure():
+            return ConstantNode(0)
+        if value == -1:
+            return UnaryNode('-', node)
+        power = get_power_of_two(value)
+        if power is not None:
+            if isinstance(node, DoubleNode):
+                return DoubleNode(node.operand, node.count + power)
+            return DoubleNode(node, power)
+
+    if op == '/' and value == 1:
+        return node
+
+    if op == '&':
+        if value == -1:
+            return node
+        if value == 0 and node.is_pure():
+            return ConstantNode(0)
+
+    if op == '|':
+        if value == 0:
+            return node
+        if value == -1 and node.is_pure():
+            return ConstantNode(-1)
+
+    return BinaryNode(op, node, constant)
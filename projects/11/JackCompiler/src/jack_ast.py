@@ -0,0 +1,204 @@
+class AstNode():
+    """
+    Base class for the nodes of the Jack AST.
+
+    Each node only stores the fields named in its slots, so the AST of a
+    class is small and can be pickled by the CompileCache.
+    """
+
+    __slots__ = ()
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        fields = ', '.join(repr(getattr(self, name)) for name in self.__slots__)
+        return f'{type(self).__name__}({fields})'
+
+    def children(self):
+        """Returns the nodes held by the fields of this node, in source order."""
+        nodes = []
+        for name in self.__slots__:
+            value = getattr(self, name)
+            if isinstance(value, AstNode):
+                nodes.append(value)
+            elif isinstance(value, list):
+                nodes.extend(item for item in value if isinstance(item, AstNode))
+        return nodes
+
+def walk(node):
+    """Yields the node and every node below it, parents before their children."""
+    pending = [node]
+    while pending:
+        node = pending.pop()
+        yield node
+        pending.extend(reversed(node.children()))
+
+# program structure
+
+class JackClass(AstNode):
+    """A class, its class variable declarations and its subroutines."""
+
+    __slots__ = ('name', 'var_decs', 'subroutines')
+
+    def __init__(self, name, var_decs, subroutines):
+        self.name = name
+        self.var_decs = var_decs
+        self.subroutines = subroutines
+
+class ClassVarDec(AstNode):
+    """A static or field declaration of one or more variables."""
+
+    __slots__ = ('kind', 'type', 'names')
+
+    def __init__(self, kind, type, names):
+        self.kind = kind
+        self.type = type
+        self.names = names
+
+class SubroutineDec(AstNode):
+    """
+    A constructor, function or method. The parameters are a list of
+    (type, name) tuples.
+    """
+
+    __slots__ = ('kind', 'return_type', 'name', 'parameters', 'var_decs', 'statements')
+
+    def __init__(self, kind, return_type, name, parameters, var_decs, statements):
+        self.kind = kind
+        self.return_type = return_type
+        self.name = name
+        self.parameters = parameters
+        self.var_decs = var_decs
+        self.statements = statements
+
+class VarDec(AstNode):
+    """A local variable declaration of one or more variables."""
+
+    __slots__ = ('type', 'names')
+
+    def __init__(self, type, names):
+        self.type = type
+        self.names = names
+
+# statements
+
+class LetStatement(AstNode):
+    """Sets a variable, or an array element when index is not None."""
+
+    __slots__ = ('name', 'index', 'value')
+
+    def __init__(self, name, index, value):
+        self.name = name
+        self.index = index
+        self.value = value
+
+class IfStatement(AstNode):
+    """An if statement, else_statements is None when there is no else."""
+
+    __slots__ = ('condition', 'statements', 'else_statements')
+
+    def __init__(self, condition, statements, else_statements):
+        self.condition = condition
+        self.statements = statements
+        self.else_statements = else_statements
+
+class WhileStatement(AstNode):
+    """A while statement."""
+
+    __slots__ = ('condition', 'statements')
+
+    def __init__(self, condition, statements):
+        self.condition = condition
+        self.statements = statements
+
+class DoStatement(AstNode):
+    """A subroutine call whose return value is discarded."""
+
+    __slots__ = ('call',)
+
+    def __init__(self, call):
+        self.call = call
+
+class ReturnStatement(AstNode):
+    """A return statement, value is None when nothing is returned."""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+# expressions, Jack has no operator precedence so parentheses only shape the tree
+
+class BinaryExpression(AstNode):
+    """A binary operator on two expressions."""
+
+    __slots__ = ('op', 'left', 'right')
+
+    def __init__(self, op, left, right):
+        self.op = op
+        self.left = left
+        self.right = right
+
+class UnaryExpression(AstNode):
+    """A unary operator, '-' or '~', on a term."""
+
+    __slots__ = ('op', 'term')
+
+    def __init__(self, op, term):
+        self.op = op
+        self.term = term
+
+class IntegerConstant(AstNode):
+    """An integer from 0 to 32767."""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+class StringConstant(AstNode):
+    """A string constant."""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+class KeywordConstant(AstNode):
+    """true, false, null or this."""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+class VarTerm(AstNode):
+    """A variable."""
+
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+class ArrayTerm(AstNode):
+    """An element of an array variable."""
+
+    __slots__ = ('name', 'index')
+
+    def __init__(self, name, index):
+        self.name = name
+        self.index = index
+
+class SubroutineCall(AstNode):
+    """
+    A call of a subroutine. target is the class or variable name before the
+    '.', or None for a method of the current class.
+    """
+
+    __slots__ = ('target', 'name', 'arguments')
+
+    def __init__(self, target, name, arguments):
+        self.target = target
+        self.name = name
+        self.arguments = arguments
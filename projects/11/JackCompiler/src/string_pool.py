@@ -0,0 +1,51 @@
+from vm_optimizer import count_vm_commands
+
+# the String.new of project 12 allocates the object and its character array
+STRING_NEW_ALLOCATIONS = 2
+
+# name of the function which builds the pool, $ cannot start a Jack identifier
+POOL_FUNCTION_NAME = '$stringPool'
+
+def count_string_constant_commands(string):
+    """Returns the number of VM commands which build a string constant without the pool."""
+    return 2 + 2 * len(string)
+
+class StringPool():
+    """
+    The string constants of a class, each kept in a static variable after the
+    statics declared by the class.
+
+    The first use of any of them calls the pool function, which builds every
+    string of the class once. Later uses push the static, so the strings are
+    shared and must not be changed or disposed by the program.
+    """
+
+    def __init__(self, class_name, static_count):
+        self.class_name = class_name
+        self.static_count = static_count
+        self.static_indexes = {}
+        self.use_count = 0
+        self.use_command_count = 0
+        self.pooled_command_count = 0
+
+    def get_function_name(self):
+        """Returns the name of the pool function in the 'Class.function' format."""
+        return f'{self.class_name}.{POOL_FUNCTION_NAME}'
+
+    def get_static_index(self, string):
+        """Returns the static index of a string constant, adding it to the pool the first time it is used."""
+        self.use_count += 1
+        self.use_command_count += count_string_constant_commands(string)
+
+        if string not in self.static_indexes:
+            self.static_indexes[string] = self.static_count + len(self.static_indexes)
+
+        return self.static_indexes[string]
+
+    def count_pooled_commands(self, lines):
+        """Adds the VM commands written for the pool to its count."""
+        self.pooled_command_count += count_vm_commands(lines)
+
+    def get_allocations_saved(self):
+        """Returns the number of heap allocations saved when each string constant is used once."""
+        return STRING_NEW_ALLOCATIONS * (self.use_count - len(self.static_indexes))
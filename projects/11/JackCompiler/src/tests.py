@@ -1,12 +1,31 @@
+import pickle
+import shutil
+import tempfile
 import unittest
 from pathlib import Path
+from unittest import mock
 
-import tokens as T
-from exceptions import SymbolTableError
+import frontend_path # adds the shared jack_frontend package to the import path
+from AstParser import AstParser
+from CompilationEngine import CompilationEngine
+from CompileCache import CompileCache
+from constants import SYMBOL_KIND
+from exceptions import AstParserError, JackTokenizerError, SymbolTableError
+from expression_ir import BinaryNode, CodeNode, ConstantNode, UnaryNode
 from file_util import is_jack_file
-from JackCompiler import validate_flags
-from lexical_elements import get_token
+from jack_ast import (BinaryExpression, ClassVarDec, DoStatement, IntegerConstant, JackClass, KeywordConstant, LetStatement, ReturnStatement,
+                      StringConstant, SubroutineCall, SubroutineDec, UnaryExpression, VarDec, VarTerm, WhileStatement, walk)
+from jack_frontend import tokens as T
+from jack_frontend.JackTokenizer import JackBufferedTokenizer, JackRegexTokenizer, JackTokenizer
+from jack_frontend.lexical_elements import get_token
+from jack_frontend.xml_formatter import XmlStreamWriter
+from jack_frontend.xml_sinks import NullSink, XmlFileSink
+from JackCompiler import compile_jack_file, parse_positive_int, validate_flags
+from string_pool import StringPool
 from SymbolTable import SymbolTable
+from vm_inliner import collect_inline_functions, inline_vm_files, inline_vm_lines
+from vm_optimizer import optimize_vm_lines
+from VMWriter import VMWriter
 
 class TestJackCompiler(unittest.TestCase):
 
@@ -20,6 +39,14 @@ class TestJackCompiler(unittest.TestCase):
         self.assertTrue(output)
         output = validate_flags('-v')
         self.assertTrue(output)
+        output = validate_flags('-ac')
+        self.assertTrue(output)
+        output = validate_flags('-iO')
+        self.assertTrue(output)
+        output = validate_flags('-pO')
+        self.assertTrue(output)
+        output = validate_flags('-ctO')
+        self.assertTrue(output)
 
     def test_validate_flags_failure(self):
         """Tests validate_flags fail conditions."""
@@ -28,6 +55,146 @@ class TestJackCompiler(unittest.TestCase):
         output = validate_flags('x')
         self.assertFalse(output)
 
+    def test_parse_positive_int_success(self):
+        """Returns the value of a positive integer option."""
+        output = parse_positive_int('4')
+        self.assertEqual(output, 4)
+
+    def test_parse_positive_int_failure(self):
+        """Returns None for values that are not positive integers."""
+        self.assertIsNone(parse_positive_int('0'))
+        self.assertIsNone(parse_positive_int('-2'))
+        self.assertIsNone(parse_positive_int('four'))
+
+    def test_compile_jack_file_unexpected_error(self):
+        """An unexpected error while streaming leaves no partial VM file."""
+        def compile_class(ce):
+            ce.vm_writer.writeFunction('Main.main', 0)
+            raise RuntimeError('unexpected')
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = Path(temp_dir) / 'Main.jack'
+            file_path.write_text('class Main {}')
+            with mock.patch.object(CompilationEngine, 'compileClass', compile_class):
+                exit_code, output, _ = compile_jack_file(file_path, stream_buffer_size=16)
+            self.assertEqual(exit_code, 2)
+            self.assertIn('RuntimeError: unexpected', output)
+            self.assertFalse(file_path.with_suffix('.vm').exists())
+
+class TestCompileCache(unittest.TestCase):
+
+    def test_compile_cache_miss_then_hit(self):
+        """Output is restored from the cache until the Jack source changes."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = Path(temp_dir) / 'Main.jack'
+            vm_path = Path(temp_dir) / 'Main.vm'
+            file_path.write_text('class Main {}')
+            vm_path.write_text('// Compiled Main.jack:\n')
+
+            cache = CompileCache(temp_dir)
+            self.assertFalse(cache.restore(file_path))
+            cache.store(file_path)
+
+            vm_path.unlink()
+            self.assertTrue(cache.restore(file_path))
+            self.assertEqual(vm_path.read_text(), '// Compiled Main.jack:\n')
+
+            file_path.write_text('class Main { }')
+            self.assertFalse(cache.restore(file_path))
+            self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_compile_cache_debug_requires_xml(self):
+        """An entry stored without debug XML is a miss when debug XML is requested."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = Path(temp_dir) / 'Main.jack'
+            file_path.write_text('class Main {}')
+            (Path(temp_dir) / 'Main.vm').write_text('')
+
+            cache = CompileCache(temp_dir)
+            cache.store(file_path)
+            self.assertFalse(cache.restore(file_path, debug=True))
+            self.assertTrue(cache.restore(file_path))
+
+    def test_compile_cache_optimize(self):
+        """An entry stored without optimization is a miss when the output is optimized."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = Path(temp_dir) / 'Main.jack'
+            file_path.write_text('class Main {}')
+            (Path(temp_dir) / 'Main.vm').write_text('')
+
+            CompileCache(temp_dir).store(file_path)
+            self.assertFalse(CompileCache(temp_dir, optimize=True).restore(file_path))
+            self.assertTrue(CompileCache(temp_dir).restore(file_path))
+
+    def test_compile_cache_analyzer_output(self):
+        """An entry stored with debug XML is a miss when the XML is in the JackAnalyzer format."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = Path(temp_dir) / 'Main.jack'
+            file_path.write_text('class Main {}')
+            for name in ['Main.vm', 'Main.xml', 'MainT.xml']:
+                (Path(temp_dir) / name).write_text('')
+
+            CompileCache(temp_dir).store(file_path, debug=True)
+            self.assertFalse(CompileCache(temp_dir, analyzer_output=True).restore(file_path, debug=True))
+            self.assertTrue(CompileCache(temp_dir).restore(file_path, debug=True))
+
+    def test_compile_cache_verbose(self):
+        """With verbose output, cached files are compiled again so their symbol tables are printed."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = Path(temp_dir) / 'Main.jack'
+            file_path.write_text('class Main { static int x; }')
+
+            _, _, cache = compile_jack_file(file_path, use_cache=True)
+            self.assertEqual(cache.misses, 1)
+
+            exit_code, output, cache = compile_jack_file(file_path, verbose=True, use_cache=True)
+            self.assertEqual((exit_code, cache.hits), (0, 0))
+            self.assertIn("Debug - Symbol Tables for 'Main'", output)
+
+    def test_compile_cache_ast(self):
+        """An AST is reused with other options until the Jack source changes."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = Path(temp_dir) / 'Main.jack'
+            file_path.write_text('class Main {}')
+            jack_class = JackClass('Main', [], [])
+
+            cache = CompileCache(temp_dir)
+            self.assertIsNone(cache.load_ast(file_path))
+            cache.store_ast(file_path, jack_class)
+
+            # storing the output does not remove the AST
+            (Path(temp_dir) / 'Main.vm').write_text('')
+            cache.store(file_path)
+
+            optimized_cache = CompileCache(temp_dir, optimize=True)
+            self.assertEqual(optimized_cache.load_ast(file_path), jack_class)
+            self.assertEqual(optimized_cache.ast_hits, 1)
+
+            file_path.write_text('class Main { }')
+            self.assertIsNone(optimized_cache.load_ast(file_path))
+
+    def test_compile_cache_ast_not_loaded(self):
+        """An AST is not unpickled without a matching key, and one which cannot be unpickled is a miss."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = Path(temp_dir) / 'Main.jack'
+            file_path.write_text('class Main {}')
+
+            cache = CompileCache(temp_dir)
+            cache.store_ast(file_path, JackClass('Main', [], []))
+            ast_path = cache.get_ast_path(file_path)
+
+            # a class which no longer exists fails when it is unpickled
+            ast_path.write_bytes(pickle.dumps(JackClass('Main', [], []), protocol=2).replace(b'JackClass', b'OldJackClass'))
+            self.assertIsNone(cache.load_ast(file_path))
+            ast_path.write_bytes(b'not a pickle')
+            self.assertIsNone(cache.load_ast(file_path))
+
+            # without its key the AST is never read
+            cache.get_ast_key_path(file_path).unlink()
+            ast_path.write_bytes(pickle.dumps(JackClass('Main', [], [])))
+            self.assertIsNone(cache.load_ast(file_path))
+            self.assertEqual(cache.ast_hits, 0)
+
 class TestFileUtil(unittest.TestCase):
 
     def test_is_jack_file_success(self):
@@ -64,6 +231,84 @@ class TestLexer(unittest.TestCase):
         output = get_token('MyClass')
         self.assertIsInstance(output, T.IdentifierToken)
 
+    def test_get_token_shared_keywords_and_symbols(self):
+        """Keyword and symbol tokens are shared singletons."""
+        self.assertIs(get_token('class'), get_token('class'))
+        self.assertIs(get_token('('), get_token('('))
+
+    def test_get_token_identifier_interned(self):
+        """Identifier values are interned strings."""
+        output = get_token(''.join(['My', 'Class']))
+        self.assertIs(output.value, get_token('MyClass').value)
+
+    def test_tokens_are_slotted(self):
+        """Tokens do not have an instance dictionary."""
+        output = get_token('MyClass')
+        self.assertFalse(hasattr(output, '__dict__'))
+        self.assertEqual(output.type, 'identifier')
+
+def get_token_stream(tokenizer):
+    """Advances through all tokens and returns their values and line numbers."""
+    stream = []
+    while tokenizer.hasMoreTokens():
+        next_token = tokenizer.peek_next_token()
+        tokenizer.advance()
+        stream.append((next_token.value, tokenizer.current_token.type, tokenizer.current_token.value, tokenizer.line_num))
+    return stream
+
+class TestJackRegexTokenizer(unittest.TestCase):
+
+    def test_regex_tokenizer_matches_tokenizer(self):
+        """Tokens and line numbers are the same as the JackTokenizer for Pong."""
+        for file_path in Path('../../test_files/Pong').glob('*.jack'):
+            expected = get_token_stream(JackTokenizer(file_path))
+            actual = get_token_stream(JackRegexTokenizer(file_path))
+            self.assertEqual(actual, expected)
+
+    def test_regex_tokenizer_comments(self):
+        """Comments, strings, and line numbers match the JackTokenizer."""
+        source = 'class A {\n/** a\n * b */ field int x;\n/*/ c */ // d\nlet x = "e // f" /\n2\n;\n}\n'
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = Path(temp_dir) / 'A.jack'
+            file_path.write_text(source)
+            expected = get_token_stream(JackTokenizer(file_path))
+            actual = get_token_stream(JackRegexTokenizer(file_path))
+        self.assertEqual(actual, expected)
+        self.assertIn(('e // f', 'stringConstant', 'e // f', 4), actual)
+
+class TestJackBufferedTokenizer(unittest.TestCase):
+
+    def test_buffered_tokenizer_matches_tokenizer(self):
+        """Tokens and line numbers are the same as the JackTokenizer for Pong."""
+        for file_path in Path('../../test_files/Pong').glob('*.jack'):
+            expected = get_token_stream(JackTokenizer(file_path))
+            actual = get_token_stream(JackBufferedTokenizer(file_path))
+            self.assertEqual(actual, expected)
+
+    def test_buffered_tokenizer_peek_k(self):
+        """Peeks k tokens ahead without advancing."""
+        tokenizer = JackBufferedTokenizer(Path('../../test_files/Seven/Main.jack'))
+        self.assertEqual(tokenizer.peek_next_token(1).value, 'class')
+        self.assertEqual(tokenizer.peek_next_token(2).value, 'Main')
+        self.assertEqual(tokenizer.peek_next_token(3).value, '{')
+        self.assertIsNone(tokenizer.current_token)
+        tokenizer.advance()
+        self.assertEqual(tokenizer.current_token.value, 'class')
+        self.assertEqual(tokenizer.peek_next_token(2).value, '{')
+
+    def test_buffered_tokenizer_lex_error(self):
+        """Lexing errors are raised when the tokenizer reaches them."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = Path(temp_dir) / 'A.jack'
+            file_path.write_text('class A { field int 1x; }')
+            tokenizer = JackBufferedTokenizer(file_path)
+        for _ in range(5):
+            tokenizer.advance()
+        with self.assertRaises(JackTokenizerError):
+            tokenizer.peek_next_token()
+        with self.assertRaises(JackTokenizerError):
+            tokenizer.advance()
+
 class TestTokens(unittest.TestCase):
 
     def test_is_integer_token_success(self):
@@ -94,8 +339,8 @@ class TestSymbolTable(unittest.TestCase):
         """Tests a symbol's index does not change as the counter does."""
         st = SymbolTable()
         st.define('test', 'int', 'static')
-        self.assertEqual(st._class_scope['test']['index'], 0)
-        self.assertEqual(st._static_count, 1)
+        self.assertEqual(st._class_scope['test'].index, 0)
+        self.assertEqual(st.VarCount('static'), 1)
 
     def test_symbol_table_VarCount_success(self):
         """Tests a valid case of VarCount."""
@@ -169,3 +414,565 @@ class TestSymbolTable(unittest.TestCase):
         st.define('test', 'int', 'static')
         with self.assertRaises(SymbolTableError):
             st.IndexOf('none')
+
+    def test_symbol_table_resolve_success(self):
+        """Tests a valid use case of resolve."""
+        st = SymbolTable()
+        st.define('test', 'int', 'static')
+        st.define('other', 'Point', 'field')
+        actual = st.resolve('other')
+        self.assertEqual((actual.kind, actual.type, actual.index), (SYMBOL_KIND.FIELD, 'Point', 0))
+        self.assertEqual(actual.kind_name, 'field')
+
+    def test_symbol_table_resolve_fail(self):
+        """Tests an error use case of resolve."""
+        st = SymbolTable()
+        st.define('test', 'int', 'static')
+        with self.assertRaises(SymbolTableError):
+            st.resolve('none')
+
+    def test_symbol_table_resolve_class_scope_first(self):
+        """Class symbols are found before subroutine symbols of the same name."""
+        st = SymbolTable()
+        st.define('test', 'int', 'field')
+        st.startSubroutine()
+        st.define('test', 'char', 'local')
+        st.define('other', 'char', 'local')
+        self.assertEqual(st.KindOf('test'), 'field')
+        self.assertEqual(st.KindOf('other'), 'local')
+        st.startSubroutine()
+        self.assertFalse(st.varExists('other'))
+        self.assertEqual(st.VarCount('local'), 0)
+
+
+class TestVMWriter(unittest.TestCase):
+
+    @staticmethod
+    def write_commands(vm_writer):
+        """Writes a small function using each kind of VM command."""
+        vm_writer.writeComment('Compiled Main.jack:')
+        vm_writer.writeFunction('Main.main', 1)
+        vm_writer.WriteLabel('Main_0')
+        vm_writer.writeKeyword('true')
+        vm_writer.WriteIf('Main_1')
+        vm_writer.writeStringConstant('hi')
+        vm_writer.writeCall('Output.printString', 1)
+        vm_writer.writePop('temp', 0)
+        vm_writer.WriteGoto('Main_0')
+        vm_writer.WriteLabel('Main_1')
+        vm_writer.writeReturn()
+
+    def test_vm_writer_stream_matches_buffered(self):
+        """Streaming output is byte-identical to the buffered output."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            buffered = VMWriter(f'{temp_dir}/Buffered')
+            self.write_commands(buffered)
+            buffered.close()
+
+            streamed = VMWriter(f'{temp_dir}/Streamed', stream_buffer_size=16)
+            self.write_commands(streamed)
+            streamed.close()
+            streamed.close()
+
+            expected = Path(f'{temp_dir}/Buffered.vm').read_bytes()
+            actual = Path(f'{temp_dir}/Streamed.vm').read_bytes()
+        self.assertEqual(actual, expected)
+
+    def test_vm_writer_discard(self):
+        """Discarding removes a partially streamed file, but not one which was closed."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            streamed = VMWriter(f'{temp_dir}/Streamed', stream_buffer_size=16)
+            self.write_commands(streamed)
+            streamed.discard()
+            self.assertFalse(Path(f'{temp_dir}/Streamed.vm').exists())
+
+            closed = VMWriter(f'{temp_dir}/Closed', stream_buffer_size=16)
+            self.write_commands(closed)
+            closed.close()
+            closed.discard()
+            self.assertTrue(Path(f'{temp_dir}/Closed.vm').exists())
+
+    def test_vm_writer_optimize(self):
+        """Optimized output is the same when streamed and the command counts are kept."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            buffered = VMWriter(f'{temp_dir}/Buffered', optimize=True)
+            self.write_commands(buffered)
+            self.write_commands(buffered)
+            buffered.close()
+
+            streamed = VMWriter(f'{temp_dir}/Streamed', stream_buffer_size=16, optimize=True)
+            self.write_commands(streamed)
+            self.write_commands(streamed)
+            streamed.close()
+            streamed.close()
+
+            expected = Path(f'{temp_dir}/Buffered.vm').read_bytes()
+            actual = Path(f'{temp_dir}/Streamed.vm').read_bytes()
+        self.assertEqual(actual, expected)
+        self.assertEqual((buffered.command_count, buffered.optimized_command_count), (34, 26))
+        self.assertEqual((streamed.command_count, streamed.optimized_command_count), (34, 26))
+
+
+class TestStringPool(unittest.TestCase):
+
+    JACK_SOURCE = '''class Main {
+    static int count;
+
+    function void main() {
+        while (count < 3) {
+            do Output.printString("hi");
+            let count = count + 1;
+        }
+        do Output.printString("hi");
+        do Output.printString("");
+        return;
+    }
+}
+'''
+
+    def compile_main(self, string_pool):
+        """Compiles the Jack source and returns its VM commands and the string pool."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            jack_path = Path(temp_dir) / 'Main.jack'
+            jack_path.write_text(self.JACK_SOURCE)
+            ce = CompilationEngine(jack_path, xml_output=False, string_pool=string_pool)
+            ce.compileClass()
+            ce.vm_writer.close()
+            lines = jack_path.with_suffix('.vm').read_text().splitlines()
+        return [line.strip() for line in lines if not line.startswith('//')], ce.string_pool
+
+    def test_string_pool_static_indexes(self):
+        """Each distinct string gets a static after the statics of the class."""
+        string_pool = StringPool('Main', 2)
+        self.assertEqual(string_pool.get_static_index('a'), 2)
+        self.assertEqual(string_pool.get_static_index('b'), 3)
+        self.assertEqual(string_pool.get_static_index('a'), 2)
+        self.assertEqual(string_pool.use_count, 3)
+        self.assertEqual(string_pool.get_allocations_saved(), 2)
+
+    def test_pooled_string_constant(self):
+        """A string constant pushes its static, and calls the pool function until it is set."""
+        actual, _ = self.compile_main(string_pool=True)
+        first_use = actual.index('call Main.$stringPool 0') - 2
+        self.assertEqual(actual[first_use:first_use + 7], [
+            'push static 1', 'if-goto Main_2', 'call Main.$stringPool 0', 'pop temp 0', 'label Main_2', 'push static 1', 'call Output.printString 1'
+        ])
+
+    def test_pool_function(self):
+        """The pool function builds each distinct string once."""
+        actual, string_pool = self.compile_main(string_pool=True)
+        pool_function = actual[actual.index('function Main.$stringPool 0'):]
+        self.assertEqual(pool_function, [
+            'function Main.$stringPool 0',
+            'push constant 2', 'call String.new 1', 'push constant 104', 'call String.appendChar 2', 'push constant 105', 'call String.appendChar 2', 'pop static 1',
+            'push constant 0', 'call String.new 1', 'pop static 2',
+            'push constant 0', 'return'
+        ])
+        self.assertEqual(actual.count('call String.new 1'), 2)
+        self.assertEqual((string_pool.use_count, string_pool.use_command_count, string_pool.pooled_command_count), (3, 14, 31))
+
+    def test_string_pool_off(self):
+        """Without the pool each string constant is built where it is used."""
+        actual, string_pool = self.compile_main(string_pool=False)
+        self.assertIsNone(string_pool)
+        self.assertEqual(actual.count('call String.new 1'), 3)
+        self.assertNotIn('static 1', ' '.join(actual))
+
+
+class TestJackAst(unittest.TestCase):
+
+    JACK_SOURCE = '''class Main {
+    field int x, y;
+
+    method int sum(Array a, int n) {
+        var int i;
+        while (i < n) {
+            let a[i] = -(x + (y * 2));
+            do Output.printString("hi");
+        }
+        return a.get(i) | count();
+    }
+}
+'''
+
+    def parse(self, source):
+        """Parses the Jack source into its AST."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            jack_path = Path(temp_dir) / 'Main.jack'
+            jack_path.write_text(source)
+            return AstParser(JackTokenizer(jack_path)).parseClass()
+
+    def test_parse_class(self):
+        """Declarations, statements and expressions are parsed into their nodes."""
+        expected = JackClass('Main', [ClassVarDec('field', 'int', ['x', 'y'])], [
+            SubroutineDec('method', 'int', 'sum', [('Array', 'a'), ('int', 'n')], [VarDec('int', ['i'])], [
+                WhileStatement(BinaryExpression('<', VarTerm('i'), VarTerm('n')), [
+                    LetStatement('a', VarTerm('i'), UnaryExpression('-', BinaryExpression('+', VarTerm('x'), BinaryExpression('*', VarTerm('y'), IntegerConstant(2))))),
+                    DoStatement(SubroutineCall('Output', 'printString', [StringConstant('hi')]))
+                ]),
+                ReturnStatement(BinaryExpression('|', SubroutineCall('a', 'get', [VarTerm('i')]), SubroutineCall(None, 'count', [])))
+            ])
+        ])
+        self.assertEqual(self.parse(self.JACK_SOURCE), expected)
+
+    def test_parse_operators_left_to_right(self):
+        """Jack has no operator precedence, so operators apply from left to right."""
+        jack_class = self.parse('class Main { function int f() { return 1 + 2 * 3 = true; } }')
+        expected = BinaryExpression('=', BinaryExpression('*', BinaryExpression('+', IntegerConstant(1), IntegerConstant(2)), IntegerConstant(3)), KeywordConstant('true'))
+        self.assertEqual(jack_class.subroutines[0].statements[0].value, expected)
+
+    def test_parse_error(self):
+        """Parse errors include the line of the token."""
+        with self.assertRaises(AstParserError) as context:
+            self.parse('class Main {\n function void f() {\n let x[1 = 2; } }')
+        self.assertIn('line 3', str(context.exception))
+
+    def test_walk(self):
+        """Nodes are walked in source order, parents first."""
+        jack_class = self.parse(self.JACK_SOURCE)
+        calls = [node.name for node in walk(jack_class) if isinstance(node, SubroutineCall)]
+        self.assertEqual(calls, ['printString', 'get', 'count'])
+
+    def test_pickle(self):
+        """The AST can be stored by the CompileCache."""
+        jack_class = self.parse(self.JACK_SOURCE)
+        self.assertEqual(pickle.loads(pickle.dumps(jack_class)), jack_class)
+
+    def test_code_generator_matches_compilation_engine(self):
+        """The VM written from the AST is the same as the VM written while parsing."""
+        for test_dir in ['Pong', 'ComplexArrays', 'ConvertToBin']:
+            for file_path in Path('../../test_files', test_dir).glob('*.jack'):
+                for options in [{}, {'optimize': True}, {'string_pool': True}]:
+                    with self.subTest(file=file_path.name, options=options), tempfile.TemporaryDirectory() as temp_dir:
+                        jack_path = Path(temp_dir) / file_path.name
+                        shutil.copyfile(file_path, jack_path)
+
+                        ce = CompilationEngine(jack_path, xml_output=False, **options)
+                        ce.compileClass()
+                        ce.vm_writer.close()
+                        expected = jack_path.with_suffix('.vm').read_bytes()
+
+                        ce = CompilationEngine(jack_path, xml_output=False, use_ast=True, **options)
+                        ce.compileClass()
+                        ce.vm_writer.close()
+                        actual = jack_path.with_suffix('.vm').read_bytes()
+
+                    self.assertEqual(actual, expected)
+
+    def test_compilation_engine_cached_ast(self):
+        """A cached AST is compiled without lexing the source."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            jack_path = Path(temp_dir) / 'Main.jack'
+            shutil.copyfile('../../test_files/Seven/Main.jack', jack_path)
+            cache = CompileCache(temp_dir)
+
+            ce = CompilationEngine(jack_path, xml_output=False, use_ast=True, ast_cache=cache)
+            ce.compileClass()
+            ce.vm_writer.close()
+            expected = jack_path.with_suffix('.vm').read_bytes()
+
+            ce = CompilationEngine(jack_path, xml_output=False, use_ast=True, ast_cache=cache)
+            self.assertIsNone(ce.tokenizer)
+            ce.compileClass()
+            ce.vm_writer.close()
+            actual = jack_path.with_suffix('.vm').read_bytes()
+
+        self.assertEqual(actual, expected)
+        self.assertEqual(cache.ast_hits, 1)
+
+
+class TestVMOptimizer(unittest.TestCase):
+
+    @staticmethod
+    def optimize(commands):
+        """Optimizes VM commands formatted the same way as the VMWriter."""
+        lines = [f'{cmd}\n' if cmd.split()[0] in {'label', 'function'} else f'    {cmd}\n' for cmd in commands]
+        return [line.strip() for line in optimize_vm_lines(lines)]
+
+    def test_double_not(self):
+        """Double negation is removed."""
+        actual = self.optimize(['push local 0', 'not', 'not', 'if-goto A'])
+        self.assertEqual(actual, ['push local 0', 'if-goto A'])
+
+    def test_eq_not_if_goto(self):
+        """Jumping on inequality subtracts instead of comparing."""
+        actual = self.optimize(['push local 0', 'push constant 3', 'eq', 'not', 'if-goto A'])
+        self.assertEqual(actual, ['push local 0', 'push constant 3', 'sub', 'if-goto A'])
+
+    def test_while_true(self):
+        """A while (true) condition is removed."""
+        actual = self.optimize(['label A', 'push constant 1', 'neg', 'not', 'if-goto B', 'call Main.f 0', 'pop temp 0', 'goto A', 'label B'])
+        self.assertEqual(actual, ['label A', 'call Main.f 0', 'pop temp 0', 'goto A', 'label B'])
+
+    def test_goto_next_label(self):
+        """A goto to the following label and unreachable commands are removed."""
+        actual = self.optimize(['if-goto A', 'push constant 0', 'return', 'goto B', 'label A', 'label B', 'push constant 1', 'return'])
+        self.assertEqual(actual, ['if-goto A', 'push constant 0', 'return', 'label A', 'label B', 'push constant 1', 'return'])
+
+    def test_push_pop_same_variable(self):
+        """A variable popped into itself is removed."""
+        actual = self.optimize(['push local 1', 'pop local 1', 'push local 1', 'pop local 2'])
+        self.assertEqual(actual, ['push local 1', 'pop local 2'])
+
+    def test_comments_are_kept(self):
+        """Comments are kept and nothing is rewritten across them."""
+        actual = optimize_vm_lines(['    not\n', '// comment\n', '    not\n'])
+        self.assertEqual(actual, ['    not\n', '// comment\n', '    not\n'])
+
+
+class TestVMInliner(unittest.TestCase):
+
+    BAT_LINES = [
+        'function Bat.getLeft 0\n', '    push argument 0\n', '    pop pointer 0\n', '    push this 0\n', '    return\n',
+        'function Bat.setDirection 0\n', '    push argument 0\n', '    pop pointer 0\n', '    push argument 1\n', '    pop this 4\n', '    push constant 0\n', '    return\n',
+        'function Bat.add 1\n', '    push argument 0\n', '    push argument 1\n', '    add\n', '    pop local 0\n', '    push local 0\n', '    return\n',
+        'function Bat.count 0\n', '    push static 0\n', '    return\n',
+        'function Bat.move 0\n', '    push argument 0\n', '    call Bat.getLeft 1\n', '    return\n'
+    ]
+
+    @classmethod
+    def inline(cls, commands, class_name='Main'):
+        """Inlines the Bat functions into VM commands formatted the same way as the VMWriter."""
+        inline_functions = collect_inline_functions({'Bat.vm': cls.BAT_LINES})
+        lines, inlined_names, _ = inline_vm_lines([f'    {cmd}\n' for cmd in commands], class_name, inline_functions)
+        return [line.strip() for line in lines], inlined_names
+
+    def test_collect_inline_functions(self):
+        """Only short leaf functions are inlined."""
+        inline_functions = collect_inline_functions({'Bat.vm': self.BAT_LINES})
+        self.assertEqual(sorted(inline_functions), ['Bat.add', 'Bat.count', 'Bat.getLeft', 'Bat.setDirection'])
+
+    def test_inline_getter(self):
+        """A method uses the that segment and the argument is not copied."""
+        actual, inlined_names = self.inline(['push local 0', 'call Bat.getLeft 1', 'pop local 1'])
+        self.assertEqual(actual, ['push local 0', 'pop pointer 1', 'push that 0', 'pop local 1'])
+        self.assertEqual(inlined_names, ['Bat.getLeft'])
+
+    def test_inline_setter_discards_return_value(self):
+        """The constant returned by a void method is not pushed when the caller discards it."""
+        actual, _ = self.inline(['push local 0', 'push constant 1', 'call Bat.setDirection 2', 'pop temp 0'])
+        self.assertEqual(actual, ['push local 0', 'push constant 1', 'pop temp 1', 'pop pointer 1', 'push temp 1', 'pop that 4'])
+
+    def test_inline_return_value_set_in_array(self):
+        """The return value is kept when the caller sets it in an array."""
+        actual, _ = self.inline(['call Bat.setDirection 2', 'pop temp 0', 'pop pointer 1', 'push temp 0', 'pop that 0'])
+        self.assertEqual(actual[-6:], ['pop that 4', 'push constant 0', 'pop temp 0', 'pop pointer 1', 'push temp 0', 'pop that 0'])
+
+    def test_inline_return_value_read_back(self):
+        """The return value is kept when the caller pushes temp 0 back after popping it."""
+        actual, _ = self.inline(['call Bat.setDirection 2', 'pop temp 0', 'push temp 0', 'push temp 0', 'add', 'pop local 0'])
+        self.assertEqual(actual[-6:], ['push constant 0', 'pop temp 0', 'push temp 0', 'push temp 0', 'add', 'pop local 0'])
+        actual, _ = self.inline(['call Bat.setDirection 2', 'pop temp 0', 'push local 0', 'push temp 0', 'add'])
+        self.assertIn('push constant 0', actual)
+
+    def test_inline_locals(self):
+        """Arguments and locals which are popped and directly pushed back are not copied."""
+        actual, _ = self.inline(['push constant 1', 'push constant 2', 'call Bat.add 2'])
+        self.assertEqual(actual, ['push constant 1', 'push constant 2', 'add'])
+
+    def test_inline_static_only_in_own_class(self):
+        """A function using the static segment is only inlined in its own class."""
+        actual, inlined_names = self.inline(['call Bat.count 0'])
+        self.assertEqual((actual, inlined_names), (['call Bat.count 0'], []))
+        actual, inlined_names = self.inline(['call Bat.count 0'], class_name='Bat')
+        self.assertEqual((actual, inlined_names), (['push static 0'], ['Bat.count']))
+
+
+class TestExpressionIR(unittest.TestCase):
+
+    @staticmethod
+    def write(node):
+        """Returns the VM commands written for a folded node."""
+        vm_writer = VMWriter('Main')
+        vm_writer.start_capture()
+        node.fold().write(vm_writer)
+        return [line.strip() for line in vm_writer.end_capture()]
+
+    def test_fold_constants(self):
+        """Constant operators are evaluated as 16-bit words."""
+        self.assertEqual(self.write(BinaryNode('+', ConstantNode(1), BinaryNode('*', ConstantNode(2), ConstantNode(3)))), ['push constant 7'])
+        self.assertEqual(self.write(BinaryNode('*', ConstantNode(16), ConstantNode(32))), ['push constant 512'])
+        self.assertEqual(self.write(BinaryNode('-', ConstantNode(3), ConstantNode(5))), ['push constant 2', 'neg'])
+        self.assertEqual(self.write(BinaryNode('<', ConstantNode(3), ConstantNode(5))), ['push constant 1', 'neg'])
+        self.assertEqual(self.write(BinaryNode('<', ConstantNode(20000), UnaryNode('-', ConstantNode(20000)))), ['push constant 1', 'neg'])
+        self.assertEqual(self.write(BinaryNode('>', ConstantNode(20000), UnaryNode('-', ConstantNode(20000)))), ['push constant 0'])
+        self.assertEqual(self.write(UnaryNode('~', ConstantNode(32767))), ['push constant 32767', 'not'])
+        self.assertEqual(self.write(BinaryNode('*', ConstantNode(256), ConstantNode(256))), ['push constant 0'])
+
+    def test_fold_division(self):
+        """Division is only folded for positive operands."""
+        self.assertEqual(self.write(BinaryNode('/', ConstantNode(7), ConstantNode(2))), ['push constant 3'])
+        self.assertEqual(self.write(BinaryNode('/', ConstantNode(7), ConstantNode(0))), ['push constant 7', 'push constant 0', 'call Math.divide 2'])
+
+    def test_identity_ops(self):
+        """Identity operators are removed and constants are combined."""
+        x = CodeNode(['    push local 0\n'])
+        self.assertEqual(self.write(BinaryNode('+', ConstantNode(0), x)), ['push local 0'])
+        self.assertEqual(self.write(BinaryNode('*', x, ConstantNode(1))), ['push local 0'])
+        self.assertEqual(self.write(BinaryNode('/', x, ConstantNode(1))), ['push local 0'])
+        self.assertEqual(self.write(BinaryNode('|', x, ConstantNode(0))), ['push local 0'])
+        self.assertEqual(self.write(BinaryNode('-', ConstantNode(0), x)), ['push local 0', 'neg'])
+        self.assertEqual(self.write(BinaryNode('+', BinaryNode('+', x, ConstantNode(2)), ConstantNode(3))), ['push local 0', 'push constant 5', 'add'])
+        self.assertEqual(self.write(BinaryNode('-', BinaryNode('+', x, ConstantNode(2)), ConstantNode(5))), ['push local 0', 'push constant 3', 'sub'])
+
+    def test_side_effects_are_kept(self):
+        """A term is only removed by x * 0 when it has no side effects."""
+        x = CodeNode(['    push local 0\n'])
+        call = CodeNode(['    call Main.f 0\n'])
+        self.assertEqual(self.write(BinaryNode('*', x, ConstantNode(0))), ['push constant 0'])
+        self.assertEqual(self.write(BinaryNode('*', call, ConstantNode(0))), ['call Main.f 0', 'push constant 0', 'call Math.multiply 2'])
+
+    def test_multiply_by_power_of_two(self):
+        """A multiply by a power of two is written as doublings."""
+        x = CodeNode(['    push local 0\n'])
+        call = CodeNode(['    call Main.f 0\n'])
+        self.assertEqual(self.write(BinaryNode('*', ConstantNode(2), x)), ['push local 0', 'push local 0', 'add'])
+        self.assertEqual(self.write(BinaryNode('*', x, ConstantNode(4))), ['push local 0', 'push local 0', 'add', 'pop temp 1', 'push temp 1', 'push temp 1', 'add'])
+        self.assertEqual(self.write(BinaryNode('*', call, ConstantNode(2))), ['call Main.f 0', 'pop temp 1', 'push temp 1', 'push temp 1', 'add'])
+
+    def test_multiply_inlined_call(self):
+        """The doubled return value of an inlined function is kept."""
+        jack_source = '''class Main {
+    function int size() {
+        return 16;
+    }
+
+    function void main() {
+        var int x;
+        let x = Main.size() * 4;
+        return;
+    }
+}
+'''
+        with tempfile.TemporaryDirectory() as temp_dir:
+            jack_path = Path(temp_dir) / 'Main.jack'
+            jack_path.write_text(jack_source)
+            ce = CompilationEngine(jack_path, xml_output=False, optimize=True)
+            ce.compileClass()
+            ce.vm_writer.close()
+            self.assertEqual(inline_vm_files([jack_path.with_suffix('.vm')], optimize=True)[0], 1)
+            lines = jack_path.with_suffix('.vm').read_text().splitlines()
+
+        actual = [line.strip() for line in lines if not line.startswith('//')]
+        main = actual[actual.index('function Main.main 1'):]
+        self.assertEqual(main[:6], ['function Main.main 1', 'push constant 16', 'pop temp 1', 'push temp 1', 'push temp 1', 'add'])
+
+    def test_output_with_errors(self):
+        """The VM commands of the terms before an error are written, as they were before the expression IR."""
+        jack_source = '''class Main {
+    function void main() {
+        var int a;
+        do Output.printInt(1 + (a * 3) + y);
+        return;
+    }
+}
+'''
+        with tempfile.TemporaryDirectory() as temp_dir:
+            jack_path = Path(temp_dir) / 'Main.jack'
+            jack_path.write_text(jack_source)
+            for use_ast in [False, True]:
+                ce = CompilationEngine(jack_path, xml_output=False, optimize=True, use_ast=use_ast)
+                with self.assertRaises(SymbolTableError):
+                    ce.compileClass()
+                ce.vm_writer.close()
+                lines = jack_path.with_suffix('.vm').read_text().splitlines()
+                self.assertEqual([line.strip() for line in lines[1:]], [
+                    'function Main.main 1', 'push constant 1', 'push local 0', 'push constant 3', 'call Math.multiply 2', 'add'
+                ])
+
+    def test_operand_order_is_kept(self):
+        """The operands of a commutative operator keep their order when nothing is folded."""
+        x = CodeNode(['    push local 0\n'])
+        self.assertEqual(self.write(BinaryNode('+', ConstantNode(8000), x)), ['push constant 8000', 'push local 0', 'add'])
+
+
+class TestXmlSinks(unittest.TestCase):
+
+    def test_xml_file_sink(self):
+        """Tokens are nested in the open element."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output_path = Path(temp_dir) / 'Main.xml'
+            sink = XmlFileSink(output_path, 'class', indent=2)
+            sink.open_element('statements')
+            sink.add_token(get_token('let'), {'index': 0})
+            sink.close_element()
+            sink.open_element('parameterList')
+            sink.mark_empty()
+            sink.close_element()
+            sink.open_element('term')
+            sink.close_element()
+            sink.close()
+            actual = output_path.read_text()
+        expected = '<class>\n  <statements>\n    <keyword index="0"> let </keyword>\n  </statements>\n  <parameterList>\n</parameterList>\n  <term/>\n</class>\n'
+        self.assertEqual(actual, expected)
+
+    def test_xml_stream_writer_close(self):
+        """Text is escaped and open elements are closed."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output_path = Path(temp_dir) / 'MainT.xml'
+            writer = XmlStreamWriter(output_path, indent=0)
+            writer.open_element('tokens')
+            writer.add_element('symbol', ' < ')
+            writer.open_element('term')
+            writer.add_element('symbol', ' & ')
+            writer.close()
+            writer.close()
+            actual = output_path.read_text()
+        expected = '<tokens>\n<symbol> &lt; </symbol>\n<term>\n<symbol> &amp; </symbol>\n</term>\n</tokens>\n'
+        self.assertEqual(actual, expected)
+
+    def test_null_sink(self):
+        """Nothing is captured by the null sink."""
+        sink = NullSink()
+        sink.open_element('class')
+        sink.add_token(get_token('class'))
+        sink.close()
+        self.assertFalse(sink.enabled)
+
+    def test_compilation_engine_without_xml(self):
+        """The VM output does not depend on capturing the XML."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = Path(temp_dir) / 'Main.jack'
+            shutil.copyfile('../../test_files/Seven/Main.jack', file_path)
+
+            ce = CompilationEngine(file_path)
+            ce.compileClass()
+            ce.write_vm_file()
+            ce.write_xml()
+            expected = Path(temp_dir, 'Main.vm').read_bytes()
+            self.assertTrue(Path(temp_dir, 'Main.xml').exists())
+            self.assertTrue(Path(temp_dir, 'MainT.xml').exists())
+
+            ce = CompilationEngine(file_path, xml_output=False)
+            self.assertIsInstance(ce.xml_sink, NullSink)
+            ce.compileClass()
+            ce.write_vm_file()
+            actual = Path(temp_dir, 'Main.vm').read_bytes()
+
+        self.assertEqual(actual, expected)
+
+    def test_compilation_engine_analyzer_xml(self):
+        """Without identifier attributes, one parse writes the JackAnalyzer XML and the same VM output."""
+        def read_lines(file_path):
+            return [line.strip() for line in Path(file_path).read_text().splitlines()]
+
+        analyzer_files = Path('../../../10/test_files/Square')
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for jack_path in analyzer_files.glob('*.jack'):
+                file_path = Path(temp_dir) / jack_path.name
+                shutil.copyfile(jack_path, file_path)
+
+                ce = CompilationEngine(file_path, xml_output=False)
+                ce.compileClass()
+                ce.write_vm_file()
+                expected_vm = Path(temp_dir, f'{file_path.stem}.vm').read_bytes()
+
+                ce = CompilationEngine(file_path, identifier_attributes=False)
+                ce.compileClass()
+                ce.write_vm_file()
+                ce.write_xml()
+
+                self.assertEqual(Path(temp_dir, f'{file_path.stem}.vm').read_bytes(), expected_vm)
+                for name in [f'{file_path.stem}.xml', f'{file_path.stem}T.xml']:
+                    self.assertEqual(read_lines(Path(temp_dir, name)), read_lines(analyzer_files / name))
@@ -0,0 +1,260 @@
+from pathlib import Path
+
+from vm_optimizer import format_command, optimize_vm_lines
+
+# the project 8 VMTranslator spends about 94 Hack cycles on a call, the
+# function command and the return, and about 10 on most other VM commands
+CALL_OVERHEAD_CYCLES = 94
+AVERAGE_COMMAND_CYCLES = 10
+
+# the largest function body, without its return, which is inlined
+INLINE_MAX_COMMANDS = 10
+
+# inlined arguments, locals and temps are all kept in the temp segment
+TEMP_SEGMENT_SIZE = 8
+
+# commands which make a function body more than a straight line of code
+CONTROL_COMMANDS = {'call', 'label', 'goto', 'if-goto', 'function'}
+
+# a do statement discards the return value in temp 0, other code which pops
+# to temp 0 (such as a let of an array element) pushes it back later
+DISCARD_RETURN_VALUE = ['pop', 'temp', '0']
+READ_RETURN_VALUE = ['push', 'temp', '0']
+
+def read_vm_functions(vm_lines):
+    """
+    Splits the lines of a VM file into its functions.
+
+    Returns a list of (name, locals count, commands) for each function, the
+    commands are the parts of each line after the function command. Comments
+    are skipped.
+    """
+    functions = []
+
+    for line in vm_lines:
+        if line.startswith('//'):
+            continue
+
+        parts = line.split()
+        if not parts:
+            continue
+        if parts[0] == 'function':
+            functions.append((parts[1], int(parts[2]), []))
+        elif functions:
+            functions[-1][2].append(parts)
+
+    return functions
+
+def get_segment_indexes(commands, segment):
+    """Returns the set of indexes of a segment which are pushed or popped by the commands."""
+    return {int(parts[2]) for parts in commands if parts[0] in {'push', 'pop'} and parts[1] == segment}
+
+def uses_this(commands):
+    """Returns True if the commands use the this segment or set it."""
+    return bool(get_segment_indexes(commands, 'this')) or 0 in get_segment_indexes(commands, 'pointer')
+
+def uses_that(commands):
+    """Returns True if the commands use the that segment or set it."""
+    return bool(get_segment_indexes(commands, 'that')) or 1 in get_segment_indexes(commands, 'pointer')
+
+def is_inline_candidate(commands):
+    """
+    Returns True if a function body can be inlined: a short leaf function
+    which runs straight through to its only return.
+
+    Methods are inlined by using the that segment in place of this, which
+    the compiler never keeps across a call, so a body may not use both.
+    """
+    if not commands or commands[-1] != ['return'] or len(commands) - 1 > INLINE_MAX_COMMANDS:
+        return False
+
+    for parts in commands[:-1]:
+        if parts[0] in CONTROL_COMMANDS or parts[0] == 'return':
+            return False
+
+    return not (uses_this(commands) and uses_that(commands))
+
+def collect_inline_functions(vm_files):
+    """
+    Returns a dict of each function name which can be inlined to its
+    (class name, locals count, commands without the return).
+
+    vm_files is a dict of each VM file path to its lines.
+    """
+    inline_functions = {}
+
+    for vm_path, vm_lines in vm_files.items():
+        for name, local_count, commands in read_vm_functions(vm_lines):
+            if is_inline_candidate(commands):
+                inline_functions[name] = (Path(vm_path).stem, local_count, commands[:-1])
+
+    return inline_functions
+
+def remove_temp_round_trips(commands):
+    """
+    Removes a pop to a temp which is directly pushed back when the temp is
+    not used anywhere else. Removing one round trip can make the next one
+    adjacent, so arguments used in the order they were pushed cancel out.
+    """
+    result = []
+
+    for parts in commands:
+        if (parts[:2] == ['push', 'temp'] and result and result[-1] == ['pop', 'temp', parts[2]]
+            and sum(1 for other in commands if other[1:] == parts[1:]) == 2
+        ):
+            result.pop()
+            continue
+        result.append(parts)
+
+    return result
+
+def inline_call(function, arg_count):
+    """
+    Returns the commands which replace a call to an inline function, or None
+    if its arguments, locals and temps do not fit in the temp segment.
+    """
+    _, local_count, commands = function
+
+    arg_indexes = get_segment_indexes(commands, 'argument')
+    temp_indexes = get_segment_indexes(commands, 'temp')
+    temp_offset = arg_count + local_count
+    temp_count = max(temp_indexes) + 1 if temp_indexes else 0
+
+    if (arg_indexes and max(arg_indexes) >= arg_count) or temp_offset + temp_count > TEMP_SEGMENT_SIZE:
+        return None
+
+    # the arguments are popped from the stack, the last one is on top
+    inlined = [['pop', 'temp', str(i)] for i in reversed(range(arg_count))]
+
+    # locals start at 0, unless they are set before they are used
+    for i in range(local_count):
+        first_use = next((parts for parts in commands if parts[1:] == ['local', str(i)]), None)
+        if first_use is not None and first_use[0] == 'push':
+            inlined.extend([['push', 'constant', '0'], ['pop', 'temp', str(arg_count + i)]])
+
+    segment_offsets = {'argument': 0, 'local': arg_count, 'temp': temp_offset}
+    rename_this = uses_this(commands)
+
+    for parts in commands:
+        if parts[0] not in {'push', 'pop'}:
+            inlined.append(parts)
+        elif parts[1] in segment_offsets:
+            inlined.append([parts[0], 'temp', str(int(parts[2]) + segment_offsets[parts[1]])])
+        elif rename_this and parts[1] == 'this':
+            inlined.append([parts[0], 'that', parts[2]])
+        elif rename_this and parts[1:] == ['pointer', '0']:
+            inlined.append([parts[0], 'pointer', '1'])
+        else:
+            inlined.append(parts)
+
+    return remove_temp_round_trips(inlined)
+
+def estimate_cycles_saved(function, inlined, discarded):
+    """Returns the estimated Hack cycles saved each time an inlined call site runs."""
+    _, _, commands = function
+    command_count = len(commands) + (1 if discarded else 0)
+    return CALL_OVERHEAD_CYCLES + AVERAGE_COMMAND_CYCLES * (command_count - len(inlined))
+
+def is_value_discarded(vm_lines, i):
+    """
+    Returns True when the line at i pops a value to temp 0 which is never read.
+
+    The compiler always writes temp 0 before it reads it in the same straight
+    line of code, so the value is discarded when temp 0 is written again, or
+    the function ends, before any push of temp 0.
+    """
+    if i >= len(vm_lines) or vm_lines[i].split() != DISCARD_RETURN_VALUE:
+        return False
+
+    for line in vm_lines[i + 1:]:
+        parts = line.split()
+        if parts == READ_RETURN_VALUE:
+            return False
+        if parts == DISCARD_RETURN_VALUE or parts[:1] == ['function']:
+            return True
+
+    return True
+
+def inline_vm_lines(vm_lines, class_name, inline_functions):
+    """
+    Replaces the calls to inline functions in the lines of a VM file.
+
+    Functions which use the static segment are only inlined in their own
+    class. When a function returns a constant which the caller discards, both
+    are removed.
+
+    Returns the new lines, the name of the function inlined at each call site
+    and the estimated cycles saved.
+    """
+    new_lines = []
+    inlined_names = []
+    cycles_saved = 0
+    i = 0
+
+    while i < len(vm_lines):
+        line = vm_lines[i]
+        i += 1
+        parts = line.split()
+
+        if len(parts) != 3 or parts[0] != 'call' or parts[1] not in inline_functions:
+            new_lines.append(line)
+            continue
+
+        function = inline_functions[parts[1]]
+        if function[0] != class_name and get_segment_indexes(function[2], 'static'):
+            new_lines.append(line)
+            continue
+
+        inlined = inline_call(function, int(parts[2]))
+        if inlined is None:
+            new_lines.append(line)
+            continue
+
+        discarded = False
+        if inlined and inlined[-1][:2] == ['push', 'constant'] and is_value_discarded(vm_lines, i):
+            inlined.pop()
+            i += 1
+            discarded = True
+
+        new_lines.extend(format_command(command) for command in inlined)
+        inlined_names.append(parts[1])
+        cycles_saved += estimate_cycles_saved(function, inlined, discarded)
+
+    return new_lines, inlined_names, cycles_saved
+
+def inline_vm_files(vm_paths, optimize=False):
+    """
+    Whole program inliner for the VM files of a compiled directory.
+
+    Calls to short leaf functions of any of the files are replaced by their
+    body, with the arguments, locals and temps of the function moved to the
+    temp segment. The changed files are written again, and rewritten by the
+    peephole optimizer when optimize is set.
+
+    Returns the number of call sites inlined, the number of functions which
+    were inlined and the estimated cycles saved when each call site runs once.
+    """
+    vm_files = {}
+    for vm_path in sorted(vm_paths):
+        with open(vm_path, 'r') as vm_file:
+            vm_files[vm_path] = vm_file.readlines()
+
+    inline_functions = collect_inline_functions(vm_files)
+    inlined_names = []
+    total_cycles_saved = 0
+
+    for vm_path, vm_lines in vm_files.items():
+        new_lines, file_inlined_names, cycles_saved = inline_vm_lines(vm_lines, Path(vm_path).stem, inline_functions)
+        if not file_inlined_names:
+            continue
+
+        if optimize:
+            new_lines = optimize_vm_lines(new_lines)
+
+        with open(vm_path, 'w', newline='') as vm_file:
+            vm_file.writelines(new_lines)
+
+        inlined_names.extend(file_inlined_names)
+        total_cycles_saved += cycles_saved
+
+    return len(inlined_names), len(set(inlined_names)), total_cycles_saved
@@ -0,0 +1,124 @@
+PUSH_FALSE = ['push', 'constant', '0']
+PUSH_ONE = ['push', 'constant', '1']
+
+def format_command(parts):
+    """Formats a new VM command line the same way as the VMWriter."""
+    return f"    {' '.join(parts)}\n"
+
+def count_vm_commands(lines):
+    """Returns the number of VM commands in the lines, comments are not counted."""
+    return sum(1 for line in lines if not line.startswith('//'))
+
+def get_tail(commands, n):
+    """
+    Returns the last n commands, or None if there are fewer or a comment
+    separates them.
+    """
+    if len(commands) < n:
+        return None
+    tail = [parts for _, parts in commands[-n:]]
+    if None in tail:
+        return None
+    return tail
+
+def replace_tail(commands, n, new_commands):
+    """Replaces the last n commands with new commands."""
+    del commands[-n:]
+    for parts in new_commands:
+        commands.append((format_command(parts), parts))
+
+def reduce_tail(commands):
+    """
+    Rewrites the last commands into a shorter equivalent sequence.
+
+    Returns True if a rewrite was made.
+    """
+    tail = get_tail(commands, 2)
+    if tail is None:
+        return False
+    a, b = tail
+
+    # double negation
+    if a == b and a[0] in {'not', 'neg'}:
+        replace_tail(commands, 2, [])
+        return True
+
+    # a variable popped into itself
+    if a[0] == 'push' and b[0] == 'pop' and a[1:] == b[1:]:
+        replace_tail(commands, 2, [])
+        return True
+
+    # x + 0, x - 0 and x | 0
+    if a == PUSH_FALSE and b[0] in {'add', 'sub', 'or'}:
+        replace_tail(commands, 2, [])
+        return True
+
+    # a constant condition either always or never jumps
+    if a[:2] == ['push', 'constant'] and b[0] == 'if-goto':
+        replace_tail(commands, 2, [['goto', b[1]]] if a[2] != '0' else [])
+        return True
+
+    tail = get_tail(commands, 3)
+    if tail is None:
+        return False
+    a, b, c = tail
+
+    # true is pushed as -1
+    if (a == PUSH_ONE and b == ['neg']) or (a == PUSH_FALSE and b == ['not']):
+        if c == ['not']:
+            replace_tail(commands, 3, [PUSH_FALSE])
+            return True
+        if c == ['and']:
+            replace_tail(commands, 3, [])
+            return True
+        if c[0] == 'if-goto':
+            replace_tail(commands, 3, [['goto', c[1]]])
+            return True
+
+    # jumping when two values are not equal only needs their difference
+    if a == ['eq'] and b == ['not'] and c[0] == 'if-goto':
+        replace_tail(commands, 3, [['sub'], c])
+        return True
+
+    return False
+
+def remove_goto_before_label(commands, label_name):
+    """Removes a goto which is only followed by labels up to its own label."""
+    i = len(commands) - 1
+    while i >= 0 and commands[i][1] is not None and commands[i][1][0] == 'label':
+        i -= 1
+    if i >= 0 and commands[i][1] == ['goto', label_name]:
+        del commands[i]
+
+def optimize_vm_lines(lines):
+    """
+    Peephole optimizer for the VM lines of a class.
+
+    Rewrites are made at the end of the optimized commands as each line is
+    added, so the result of one rewrite can be rewritten again by the next.
+    Comments are kept and no rewrite is made across them.
+    """
+    # (line, parts) for each line, parts is None for comments
+    commands = []
+
+    for line in lines:
+        if line.startswith('//'):
+            commands.append((line, None))
+            continue
+
+        parts = line.split()
+
+        # commands after a goto or return are unreachable until the next label
+        if parts[0] not in {'label', 'function'} and commands:
+            previous = commands[-1][1]
+            if previous is not None and previous[0] in {'goto', 'return'}:
+                continue
+
+        if parts[0] == 'label':
+            remove_goto_before_label(commands, parts[1])
+
+        commands.append((line, parts))
+        while reduce_tail(commands):
+            pass
+
+    return [line for line, _ in commands]
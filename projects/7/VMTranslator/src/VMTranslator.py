@@ -1,20 +1,52 @@
 import sys
 import traceback
+from collections import Counter
 
 from exceptions import VMTranslatorError
-from translator import translate
+from translator import count_asm_lines, count_comparison_lines_saved, translate
 from utils import get_vm_file_name
 
+USAGE = 'Usage: python VMTranslator.py [-c] <file.vm>'
+
+def validate_flags(flags):
+    """Validates flag string."""
+
+    if flags[0] != '-':
+        return False
+
+    for char in flags[1:]:
+        if char not in {'c'}:
+            return False
+
+    return True
+
+def print_comparison_savings(asm_lines, comparison_counts):
+    """Prints how many ASM lines the shared comparison routines saved."""
+    shared_count = count_asm_lines(asm_lines)
+    saved = count_comparison_lines_saved(comparison_counts)
+    print(f'Shared comparisons: {shared_count + saved} -> {shared_count} ASM lines ({saved} saved)')
+
 def main():
 
     args = sys.argv
 
-    if (len(args) != 2):
-        print('Usage: python VMTranslator.py')
+    if (len(args) < 2):
+        print(USAGE)
         sys.exit(1)
 
+    shared_comparisons = False
+
+    for option in args[1:-1]:
+
+        if not validate_flags(option):
+            print(f"Error: '{option}' is not a valid option")
+            sys.exit(1)
+
+        if 'c' in option:
+            shared_comparisons = True
+
     try:
-        input_file_path = args[1]
+        input_file_path = args[-1]
 
         parent_dirs, file_name = get_vm_file_name(input_file_path)
 
@@ -22,11 +54,15 @@ def main():
         with open(input_file_path, 'r') as vm_file:
             input_lines = vm_file.readlines()
 
-        asm_lines = translate(input_lines)
+        comparison_counts = Counter()
+        asm_lines = translate(input_lines, shared_comparisons, comparison_counts)
 
         with open(f'{parent_dirs}/{file_name}.asm', 'w') as asm_file:
             asm_file.writelines(asm_lines)
 
+        if shared_comparisons:
+            print_comparison_savings(asm_lines, comparison_counts)
+
     except VMTranslatorError as error:
         print(f'Error: {error}')
         sys.exit(1)
@@ -12,6 +12,13 @@ ARITHMETIC_LOGICAL_INS_MAP = {
     'not': ins.NotInstruction
 }
 
+# comparison instructions which jump to a shared routine
+SHARED_COMPARISON_INS_MAP = {
+    'eq': ins.SharedComparisonInstruction,
+    'gt': ins.SharedComparisonInstruction,
+    'lt': ins.SharedComparisonInstruction
+}
+
 MEMORY_INS_MAP = {
     'push': ins.PushInstruction,
     'pop': ins.PopInstruction
@@ -169,6 +169,69 @@ class NotInstruction(BaseInstruction):
             'M=M+1'
         ]
 
+# shared comparison instructions
+
+class SharedComparisonInstruction(BaseInstruction):
+    """
+    Generates the Hack ASM for an 'eq', 'gt' or 'lt' instruction which
+    jumps to the shared routine for the comparison.
+
+    The return address is passed to the routine in D.
+    """
+    def __init__(self, line_num, parts):
+        self.command = parts[0]
+        self._asm = [
+            f'// {self.command}',
+            f'@END.{line_num}', # pass the return address in D
+            'D=A',
+            f'@{SharedComparisonRoutine.LABELS[self.command]}',
+            '0;JMP',
+            f'(END.{line_num})'
+        ]
+
+class SharedComparisonRoutine():
+    """Shared routine for an 'eq', 'gt' or 'lt' comparison, which returns to the address stored in R13."""
+
+    LABELS = {
+        'eq': '$$EQ',
+        'gt': '$$GT',
+        'lt': '$$LT'
+    }
+
+    JUMPS = {
+        'eq': 'JEQ',
+        'gt': 'JGT',
+        'lt': 'JLT'
+    }
+
+    def __init__(self, command):
+        self.command = command
+
+    def to_asm(self):
+        label = self.LABELS[self.command]
+        asm = [
+            f'// shared {self.command} routine',
+            f'({label})',
+            '@R13', # backup the return address
+            'M=D',
+            '@SP', # deincrement stack-pointer & select new stack location
+            'AM=M-1',
+            'D=M', # copy value at stack-pointer
+            'A=A-1', # select position below stack-pointer
+            'D=M-D', # diff selected values
+            'M=-1', # set to true
+            f'@{label}.TRUE', # if the comparison holds, keep true
+            f'D;{self.JUMPS[self.command]}',
+            '@SP', # else, set to false
+            'A=M-1',
+            'M=0',
+            f'({label}.TRUE)',
+            '@R13', # jump to the return address
+            'A=M',
+            '0;JMP'
+        ]
+        return '\n'.join(asm) + '\n'
+
 # memory instructions
 
 class MemoryInstruction(BaseInstruction):
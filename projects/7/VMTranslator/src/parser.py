@@ -1,16 +1,23 @@
 import instructions as ins
-from constants import ARITHMETIC_LOGICAL_INS_MAP, MEMORY_INS_MAP, MEMORY_SEGMENTS
+from constants import ARITHMETIC_LOGICAL_INS_MAP, MEMORY_INS_MAP, MEMORY_SEGMENTS, SHARED_COMPARISON_INS_MAP
 from exceptions import ParseError
 
-def parse_instruction(line_num, line):
-    """Parses the line and returns the associated instruction object."""
+def parse_instruction(line_num, line, shared_comparisons=False):
+    """
+    Parses the line and returns the associated instruction object.
+
+    With shared_comparisons, eq, gt and lt instructions jump to a shared
+    routine for the comparison.
+    """
 
     parts = line.split(' ')
 
     count = len(parts)
 
     if count == 1:
-        if parts[0] in ARITHMETIC_LOGICAL_INS_MAP:
+        if shared_comparisons and parts[0] in SHARED_COMPARISON_INS_MAP:
+            return SHARED_COMPARISON_INS_MAP[parts[0]](line_num, parts)
+        elif parts[0] in ARITHMETIC_LOGICAL_INS_MAP:
             return ARITHMETIC_LOGICAL_INS_MAP[parts[0]](line_num, parts)
         else:
             raise ParseError(f'Invalid vm instruction "{line}" at line {line_num}. "{parts[0]}" is not a valid arithmetic/logical command.')
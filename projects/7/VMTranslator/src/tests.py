@@ -1,9 +1,10 @@
 import unittest
+from collections import Counter
 
 import instructions as ins
 from exceptions import ParseError, TranslationError, VMTranslatorError
 from parser import parse_instruction
-from translator import skip_line
+from translator import count_asm_lines, count_comparison_lines_saved, skip_line, translate
 from utils import get_vm_file_name
 
 class TestInstructions(unittest.TestCase):
@@ -73,6 +74,13 @@ class TestParser(unittest.TestCase):
         output = parse_instruction(1, 'lt')
         self.assertIsInstance(output, ins.LtInstruction)
 
+    def test_parse_instruction_shared_comparison(self):
+        """Test comparison commands with shared comparisons"""
+        for command in ['eq', 'gt', 'lt']:
+            output = parse_instruction(1, command, shared_comparisons=True)
+            self.assertIsInstance(output, ins.SharedComparisonInstruction)
+            self.assertEqual(output.command, command)
+
     def test_parse_instruction_and(self):
         """Test and command"""
         output = parse_instruction(1, 'and')
@@ -143,6 +151,26 @@ class TestTranslator(unittest.TestCase):
         output = skip_line(input)
         self.assertTrue(output)
 
+    def test_translate_shared_comparisons(self):
+        """Each routine used is written once and the ASM gets smaller."""
+        lines = ['push constant 1', 'push constant 2', 'eq', 'push constant 1', 'push constant 2', 'eq', 'push constant 1', 'push constant 2', 'lt']
+        inline_asm = translate(lines)
+        shared_asm = translate(lines, shared_comparisons=True)
+
+        output = ''.join(shared_asm)
+        self.assertEqual(output.count('($$EQ)'), 1)
+        self.assertEqual(output.count('($$LT)'), 1)
+        self.assertNotIn('($$GT)', output)
+        self.assertLess(count_asm_lines(shared_asm), count_asm_lines(inline_asm))
+
+    def test_count_comparison_lines_saved(self):
+        """The lines saved are counted from the shared translation alone."""
+        lines = ['push constant 1', 'push constant 2', 'eq', 'push constant 1', 'push constant 2', 'gt', 'eq', 'push constant 2', 'lt']
+        comparison_counts = Counter()
+        shared_asm = translate(lines, shared_comparisons=True, comparison_counts=comparison_counts)
+        self.assertEqual(comparison_counts, Counter({'eq': 2, 'gt': 1, 'lt': 1}))
+        self.assertEqual(count_comparison_lines_saved(comparison_counts), count_asm_lines(translate(lines)) - count_asm_lines(shared_asm))
+
 class TestUtils(unittest.TestCase):
 
     def test_iget_vm_file_name_success(self):
@@ -1,3 +1,4 @@
+from instructions import SharedComparisonInstruction, SharedComparisonRoutine
 from parser import parse_instruction
 
 def skip_line(line):
@@ -6,8 +7,14 @@ def skip_line(line):
         return True
     return False
 
-def translate(lines):
-    """Parses and converts Jack VM commands into Hack ASM."""
+def translate(lines, shared_comparisons=False, comparison_counts=None):
+    """
+    Parses and converts Jack VM commands into Hack ASM.
+
+    With shared_comparisons, the routine for each kind of comparison used
+    is written once after the end of the program. With comparison_counts,
+    the number of each shared comparison translated is added to the Counter.
+    """
 
     instructions = []
 
@@ -17,7 +24,7 @@ def translate(lines):
         if skip_line(clean_line):
             continue
 
-        ins = parse_instruction(line_num, clean_line)
+        ins = parse_instruction(line_num, clean_line, shared_comparisons)
         instructions.append(ins)
 
     asm = []
@@ -27,4 +34,32 @@ def translate(lines):
     # add infinite loop at end of program
     asm.append('// end of program\n(END)\n@END\n0;JMP')
 
+    # only write the routines which are jumped to
+    commands = [ins.command for ins in instructions if isinstance(ins, SharedComparisonInstruction)]
+    for command in SharedComparisonRoutine.LABELS:
+        if command in commands:
+            asm.append('\n\n' + SharedComparisonRoutine(command).to_asm())
+
+    if comparison_counts is not None:
+        comparison_counts.update(commands)
+
     return asm
+
+def count_comparison_lines_saved(comparison_counts):
+    """
+    Returns the number of ASM lines the shared comparison routines saved,
+    from the number of each shared comparison translated. Each comparison
+    saves the inline ASM less its jump to the routine, and each routine used
+    is written once.
+    """
+    saved = 0
+    for command, count in comparison_counts.items():
+        inline_count = count_asm_lines([parse_instruction(0, command).to_asm()])
+        shared_count = count_asm_lines([parse_instruction(0, command, shared_comparisons=True).to_asm()])
+        saved += count * (inline_count - shared_count)
+        saved -= count_asm_lines([SharedComparisonRoutine(command).to_asm()])
+    return saved
+
+def count_asm_lines(asm):
+    """Returns the number of lines in the ASM, blank lines are not counted."""
+    return sum(1 for block in asm for line in block.split('\n') if line.strip())
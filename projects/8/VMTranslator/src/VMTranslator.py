@@ -2,35 +2,141 @@ import sys
 import time
 import traceback
 
+from call_graph import build_call_graph, find_live_functions
 from exceptions import VMTranslatorError
-from file_util import get_input_lines, get_vm_files
-from translator import translate
+from file_util import AsmFileWriter, get_vm_files, read_input_lines
+from translator import count_comparison_lines_saved, count_dead_function_rom, RoutineUsage, translate_files_in_parallel, translate_lines
+
+USAGE = 'Usage: python VMTranslator.py [-c|d|s|t] [-j N] <file.vm>|<path-to-vm-files>'
+
+def validate_flags(flags):
+    """Validates flag string."""
+
+    if flags[0] != '-':
+        return False
+
+    for char in flags[1:]:
+        if char not in {'c', 'd', 's', 't'}:
+            return False
+
+    return True
+
+def parse_positive_int(value):
+    """Parses the value of the -j option. Returns None if it is not a positive integer."""
+    try:
+        as_int = int(value)
+    except ValueError:
+        return None
+
+    if as_int < 1:
+        return None
+
+    return as_int
+
+def print_comparison_savings(routine_usage, cache_stack_top, shared_count):
+    """Prints how many ASM lines the shared comparison routines saved."""
+    saved = count_comparison_lines_saved(routine_usage, cache_stack_top)
+    print(f'Shared comparisons: {shared_count + saved} -> {shared_count} ASM lines ({saved} saved)')
+
+def print_dead_function_savings(vm_files, shared_calls, shared_comparisons, cache_stack_top, call_graph, live_functions, routine_usage, rom_size):
+    """Prints how many functions and ROM words the dead function elimination removed."""
+    if live_functions is None:
+        print('Dead functions: no bootstrap call to Sys.init, no functions removed')
+        return
+
+    # calls made outside of a function are stored under None
+    function_count = len(call_graph) - 1
+    removed_count = function_count - len(live_functions)
+
+    # only the dead functions are translated to count the ROM words they took
+    full_rom_size = rom_size + count_dead_function_rom(read_input_lines(vm_files), live_functions, routine_usage, shared_calls, shared_comparisons,
+                                                       cache_stack_top)
+    print(f'Dead functions: {removed_count} of {function_count} functions removed, {full_rom_size} -> {rom_size} ROM words ({full_rom_size - rom_size} saved)')
 
 def main():
 
     args = sys.argv
     print('DEBUG - argv:', sys.argv)
 
-    if (len(args) != 2):
-        print('Usage: python VMTranslator.py <file.vm>|<path-to-vm-files>')
+    if (len(args) < 2):
+        print(USAGE)
         sys.exit(1)
 
+    shared_calls = False
+    shared_comparisons = False
+    dead_functions = False
+    cache_stack_top = False
+    job_count = None
+
+    options = args[1:-1]
+
+    while options:
+        option = options.pop(0)
+
+        if option == '-j':
+            job_count = parse_positive_int(options.pop(0)) if options else None
+            if job_count is None:
+                print("Error: '-j' requires a positive number of jobs")
+                sys.exit(1)
+            continue
+
+        if not validate_flags(option):
+            print(f"Error: '{option}' is not a valid option")
+            sys.exit(1)
+
+        if 'c' in option:
+            shared_comparisons = True
+
+        if 's' in option:
+            shared_calls = True
+
+        if 'd' in option:
+            dead_functions = True
+
+        if 't' in option:
+            cache_stack_top = True
+
     try:
         start_time = time.perf_counter()
 
-        input_path = args[1]
+        input_path = args[-1]
 
         vm_files, output_file_path = get_vm_files(input_path)
-        input_lines, file_count = get_input_lines(vm_files)
-        asm_lines = translate(input_lines, file_count)
 
-        with open(output_file_path, 'w') as asm_file:
-            asm_file.writelines(asm_lines)
+        call_graph = None
+        live_functions = None
+        if dead_functions and len(vm_files) > 1:
+            # only the functions reached from the bootstrap's call to Sys.init are translated
+            call_graph = build_call_graph(read_input_lines(vm_files))
+            live_functions = find_live_functions(call_graph)
+
+        # records the routines and comparisons of the translation for the reports
+        routine_usage = RoutineUsage()
+
+        if job_count is not None:
+            # each file is translated in a worker process
+            asm_lines = translate_files_in_parallel(vm_files, job_count, shared_calls, shared_comparisons, live_functions, cache_stack_top,
+                                                    routine_usage)
+        else:
+            # the files are read, translated and written a chunk at a time
+            input_lines = read_input_lines(vm_files)
+            asm_lines = translate_lines(input_lines, len(vm_files), shared_calls, shared_comparisons, live_functions, cache_stack_top,
+                                        routine_usage)
+
+        asm_writer = AsmFileWriter(output_file_path)
+        asm_writer.write_all(asm_lines)
 
         end_time: float = time.perf_counter()
         exec_time: float = round((end_time - start_time), 5)
 
         print(f'\nTranslation complete. Output asm exported to: {output_file_path}')
+        print(f'ROM size: {asm_writer.rom_size} instructions')
+
+        if shared_comparisons:
+            print_comparison_savings(routine_usage, cache_stack_top, asm_writer.line_count)
+        if dead_functions:
+            print_dead_function_savings(vm_files, shared_calls, shared_comparisons, cache_stack_top, call_graph, live_functions, routine_usage,
+                                        asm_writer.rom_size)
         print(f'Execution time: {exec_time} seconds\n')
 
     except VMTranslatorError as error:
@@ -0,0 +1,292 @@
+import sys
+import time
+import traceback
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from emulator import (ADDRESS_MASK, DEST_A, DEST_D, DEST_M, HALT_FUNCTION, JUMP_EQ, JUMP_GT, JUMP_LT, MEMORY_SIZE, OP_D, OP_D_AND_Y, OP_D_MINUS_ONE,
+                      OP_D_MINUS_Y, OP_D_OR_Y, OP_D_PLUS_ONE, OP_D_PLUS_Y, OP_MINUS_ONE, OP_NEG_D, OP_NEG_Y, OP_NOT_D, OP_NOT_Y, OP_ONE, OP_Y,
+                      OP_Y_MINUS_D, OP_Y_MINUS_ONE, OP_Y_PLUS_ONE, OP_ZERO, WORD_MASK, assemble, decode, parse_positive_int)
+from exceptions import VMTranslatorError
+
+USAGE = 'Usage: python batch_emulator.py [-n N] [-m N] [-r START:END] [-s SEED] <file.asm>'
+
+# number of machines run by default
+DEFAULT_MACHINE_COUNT = 256
+
+# ALU operations on the D and y values of the machines which run an instruction
+ALU_FUNCTIONS = {
+    OP_ZERO: lambda d, y: d & 0,
+    OP_ONE: lambda d, y: (d & 0) + 1,
+    OP_MINUS_ONE: lambda d, y: (d & 0) + WORD_MASK,
+    OP_D: lambda d, y: d,
+    OP_Y: lambda d, y: y,
+    OP_NOT_D: lambda d, y: d ^ WORD_MASK,
+    OP_NOT_Y: lambda d, y: y ^ WORD_MASK,
+    OP_NEG_D: lambda d, y: -d & WORD_MASK,
+    OP_NEG_Y: lambda d, y: -y & WORD_MASK,
+    OP_D_PLUS_ONE: lambda d, y: (d + 1) & WORD_MASK,
+    OP_Y_PLUS_ONE: lambda d, y: (y + 1) & WORD_MASK,
+    OP_D_MINUS_ONE: lambda d, y: (d - 1) & WORD_MASK,
+    OP_Y_MINUS_ONE: lambda d, y: (y - 1) & WORD_MASK,
+    OP_D_PLUS_Y: lambda d, y: (d + y) & WORD_MASK,
+    OP_D_MINUS_Y: lambda d, y: (d - y) & WORD_MASK,
+    OP_Y_MINUS_D: lambda d, y: (y - d) & WORD_MASK,
+    OP_D_AND_Y: lambda d, y: d & y,
+    OP_D_OR_Y: lambda d, y: d | y
+}
+
+class BatchHackEmulator():
+    """
+    Runs the same Hack machine code on many machines in lock-step.
+
+    The RAM of all machines is a 2-D NumPy array with one row per machine, and
+    the A, D and PC registers are arrays with one value per machine. Each step
+    runs the instruction at the lowest PC of the running machines, on only the
+    machines at that PC. Machines which took a different branch wait until
+    the others catch up, so they run together again after loops and ifs.
+
+    Machines halt like the single HackEmulator. A machine which never halts
+    keeps the others from running past its PC, so max_cycles should be set
+    for programs which may not halt.
+    """
+
+    def __init__(self, rom, machine_count=DEFAULT_MACHINE_COUNT, halt_address=None):
+        if np is None:
+            raise VMTranslatorError('the batch emulator requires NumPy, install it with "pip install numpy"')
+
+        self.rom = rom
+        self.program = decode(rom)
+        self.halt_address = halt_address
+        self.machine_count = machine_count
+
+        self.ram = np.zeros((machine_count, MEMORY_SIZE), dtype=np.uint16)
+        # registers are wider than a word so the ALU can work on them before masking
+        self.a = np.zeros(machine_count, dtype=np.int32)
+        self.d = np.zeros(machine_count, dtype=np.int32)
+        self.pc = np.zeros(machine_count, dtype=np.int32)
+        self.cycles = np.zeros(machine_count, dtype=np.int64)
+        self.halted = np.zeros(machine_count, dtype=bool)
+        self.steps = 0
+
+        # instructions which jump to the A-instruction right before them
+        self.halt_loops = {
+            address for address, ins in enumerate(self.program)
+            if isinstance(ins, tuple) and ins[3] == 0b111 and address > 0 and self.program[address - 1] == address - 1
+        }
+
+    @classmethod
+    def from_asm(cls, asm_text, machine_count=DEFAULT_MACHINE_COUNT):
+        """
+        Creates a batch emulator from Hack ASM, such as the output of
+        translate(). The machines halt when they call Sys.halt.
+        """
+        rom, symbols = assemble(asm_text)
+        return cls(rom, machine_count, symbols.get(HALT_FUNCTION))
+
+    def randomize_ram(self, start, end, seed=None):
+        """Fills RAM[start:end] of each machine with random words."""
+        generator = np.random.default_rng(seed)
+        self.ram[:, start:end] = generator.integers(0, WORD_MASK + 1, size=(self.machine_count, end - start), dtype=np.uint16)
+
+    def get_running(self, max_cycles, machines=slice(None)):
+        """Returns the mask of the machines which have not halted, left the ROM or run max_cycles."""
+        running = ~self.halted[machines] & (self.pc[machines] < len(self.program))
+        if max_cycles is not None:
+            running &= self.cycles[machines] < max_cycles
+        return running
+
+    def step(self, pc, machines):
+        """
+        Runs the instruction at pc on the machines, an array of row indexes.
+        The cycles are counted by run().
+
+        Returns the next PC if all of the machines went to the same one and
+        none of them halted, otherwise None.
+        """
+        ins = self.program[pc]
+
+        # A-instruction
+        if isinstance(ins, int):
+            self.a[machines] = ins
+            self.pc[machines] = pc + 1
+            return pc + 1
+
+        op, reads_m, dest, jump = ins
+        address = self.a[machines]
+        y = self.ram[machines, address & ADDRESS_MASK].astype(np.int32) if reads_m else address
+        out = ALU_FUNCTIONS[op](self.d[machines], y)
+
+        # M and the jump use the address in A from before the instruction
+        if dest & DEST_M:
+            self.ram[machines, address & ADDRESS_MASK] = out
+        if dest & DEST_D:
+            self.d[machines] = out
+        if dest & DEST_A:
+            self.a[machines] = out
+
+        if not jump:
+            self.pc[machines] = pc + 1
+            return pc + 1
+
+        negative = out >= 0x8000
+        zero = out == 0
+        taken = np.zeros(len(machines), dtype=bool)
+        if jump & JUMP_LT:
+            taken |= negative
+        if jump & JUMP_EQ:
+            taken |= zero
+        if jump & JUMP_GT:
+            taken |= ~negative & ~zero
+
+        new_pc = np.where(taken, address, pc + 1)
+        halting = np.zeros(len(machines), dtype=bool)
+
+        if pc in self.halt_loops:
+            # machines stay on the loop, like the single emulator
+            looping = taken & (address == pc - 1)
+            new_pc[looping] = pc
+            halting |= looping
+
+        if self.halt_address is not None:
+            halting |= taken & (address == self.halt_address)
+
+        self.pc[machines] = new_pc
+
+        if halting.any():
+            self.halted[machines[halting]] = True
+            return None
+
+        first_pc = new_pc[0]
+        if (new_pc == first_pc).all():
+            return int(first_pc)
+        return None
+
+    def run(self, max_cycles=None):
+        """
+        Runs the machines until each one halts, leaves the ROM or has run
+        max_cycles cycles in total. Returns the number of steps run.
+        """
+        steps = 0
+        running = self.get_running(max_cycles)
+
+        while running.any():
+            pc = int(self.pc[running].min())
+            at_pc = self.pc == pc
+            machines = np.flatnonzero(running & at_pc)
+
+            # the other machines wait at a higher PC until the group reaches it
+            waiting_pcs = self.pc[running & ~at_pc]
+            next_waiting_pc = int(waiting_pcs.min()) if waiting_pcs.size else len(self.program)
+
+            budget = None
+            if max_cycles is not None:
+                budget = int((max_cycles - self.cycles[machines]).min())
+
+            # run the group without looking at the other machines until it
+            # splits up, catches up with them or runs out of cycles
+            group_steps = 0
+            while True:
+                next_pc = self.step(pc, machines)
+                group_steps += 1
+                if next_pc is None or next_pc >= next_waiting_pc or group_steps == budget:
+                    break
+                pc = next_pc
+
+            self.cycles[machines] += group_steps
+            steps += group_steps
+            running[machines] = self.get_running(max_cycles, machines)
+
+        self.steps += steps
+        return steps
+
+def parse_ram_range(value):
+    """Parses the START:END value of the -r option. Returns None if it is not a valid range."""
+    try:
+        start, end = (int(part) for part in value.split(':'))
+    except ValueError:
+        return None
+
+    if start < 0 or end > MEMORY_SIZE or start >= end:
+        return None
+
+    return start, end
+
+def main():
+
+    args = sys.argv
+
+    if (len(args) < 2):
+        print(USAGE)
+        sys.exit(1)
+
+    machine_count = DEFAULT_MACHINE_COUNT
+    max_cycles = None
+    ram_range = None
+    seed = None
+    options = args[1:-1]
+
+    while options:
+        option = options.pop(0)
+        value = options.pop(0) if options else ''
+
+        if option == '-n':
+            machine_count = parse_positive_int(value)
+            if machine_count is None:
+                print("Error: '-n' requires a positive number of machines")
+                sys.exit(1)
+
+        elif option == '-m':
+            max_cycles = parse_positive_int(value)
+            if max_cycles is None:
+                print("Error: '-m' requires a positive number of cycles")
+                sys.exit(1)
+
+        elif option == '-r':
+            ram_range = parse_ram_range(value)
+            if ram_range is None:
+                print(f"Error: '-r' requires a RAM range START:END within 0:{MEMORY_SIZE}")
+                sys.exit(1)
+
+        elif option == '-s':
+            seed = parse_positive_int(value)
+            if seed is None:
+                print("Error: '-s' requires a positive seed")
+                sys.exit(1)
+
+        else:
+            print(f"Error: '{option}' is not a valid option")
+            sys.exit(1)
+
+    try:
+        with open(args[-1], 'r') as asm_file:
+            emulator = BatchHackEmulator.from_asm(asm_file.read(), machine_count)
+
+        if ram_range is not None:
+            emulator.randomize_ram(*ram_range, seed)
+
+        start_time = time.perf_counter()
+        steps = emulator.run(max_cycles)
+        end_time = time.perf_counter()
+        exec_time = round((end_time - start_time), 5)
+
+        total_cycles = int(emulator.cycles.sum())
+        print(f'\nROM size: {len(emulator.rom)} instructions')
+        print(f'Machines: {machine_count} ({int(emulator.halted.sum())} halted)')
+        print(f'Cycles: {int(emulator.cycles.min())} to {int(emulator.cycles.max())} per machine, {total_cycles} in total')
+        print(f'Steps: {steps} ({round(total_cycles / max(steps * machine_count, 1) * 100, 1)}% of the machines run in each step)')
+        print(f'Execution time: {exec_time} seconds ({round(total_cycles / max(exec_time, 1e-9))} cycles per second)\n')
+
+    except VMTranslatorError as error:
+        print(f'Error: {error}')
+        sys.exit(1)
+
+    except Exception:
+        print(traceback.format_exc())
+        sys.exit(2)
+
+if __name__ == '__main__':
+    main()
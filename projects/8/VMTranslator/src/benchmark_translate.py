@@ -0,0 +1,56 @@
+import sys
+import time
+
+from file_util import Line, get_vm_files
+from translator import translate
+
+def load_raw_lines(vm_files):
+    """Reads the vm files into memory so that only translation is measured."""
+    raw_lines = []
+    for path in vm_files:
+        with open(path, 'r') as vm_file:
+            for line in vm_file:
+                raw_lines.append((path.stem, line))
+    return raw_lines
+
+def measure_translation(raw_lines, file_count, repeat):
+    """
+    Translates the lines repeat times and returns the number of VM
+    instructions and the fastest translation time in seconds.
+    """
+    best_time = None
+    instruction_count = 0
+
+    for _ in range(repeat):
+        # lines are updated by the translator so each run needs new ones
+        input_lines = [Line(file_name, line) for file_name, line in raw_lines]
+        instruction_count = sum(1 for line in input_lines if not (line.is_empty() or line.is_comment()))
+
+        start_time = time.perf_counter()
+        translate(input_lines, file_count)
+        run_time = time.perf_counter() - start_time
+
+        if best_time is None or run_time < best_time:
+            best_time = run_time
+
+    return instruction_count, best_time
+
+def main():
+
+    args = sys.argv
+
+    if (len(args) < 2):
+        print('Usage: python benchmark_translate.py <file.vm>|<path-to-vm-files> ...')
+        sys.exit(1)
+
+    for input_path in args[1:]:
+        vm_files, _ = get_vm_files(input_path)
+        raw_lines = load_raw_lines(vm_files)
+        instruction_count, best_time = measure_translation(raw_lines, len(vm_files), repeat=5)
+
+        print(f'\n{input_path}')
+        print(f'VM instructions: {instruction_count}')
+        print(f'Translation time: {round(best_time, 5)} seconds ({round(instruction_count / best_time)} instructions per second)')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+from parser import tokenize
+
+# the bootstrap code calls Sys.init, so every function which runs is reached from it
+ENTRY_FUNCTION = 'Sys.init'
+
+def get_declared_function(tokens):
+    """Returns the name of the function declared by the tokens of a line, or None if it is not a declaration."""
+    if len(tokens) == 3 and tokens[0].lower() == 'function':
+        return tokens[1]
+    return None
+
+def get_called_function(tokens):
+    """Returns the name of the function called by the tokens of a line, or None if it is not a call."""
+    if len(tokens) == 3 and tokens[0].lower() == 'call':
+        return tokens[1]
+    return None
+
+def build_call_graph(input_lines):
+    """
+    Returns a dict of each declared function name to the set of function
+    names it calls.
+
+    Calls made outside of a function, before the first declaration of a file,
+    are stored under None.
+    """
+    call_graph = {None: set()}
+    current_function = None
+    file_name = None
+
+    for line in input_lines:
+
+        # a function body ends at the end of its file
+        if line.file_name != file_name:
+            file_name = line.file_name
+            current_function = None
+
+        if line.is_empty() or line.is_comment():
+            continue
+
+        tokens = tokenize(line.raw_line)
+
+        declared_function = get_declared_function(tokens)
+        if declared_function is not None:
+            current_function = declared_function
+            call_graph.setdefault(current_function, set())
+            continue
+
+        called_function = get_called_function(tokens)
+        if called_function is not None:
+            call_graph[current_function].add(called_function)
+
+    return call_graph
+
+def find_live_functions(call_graph, entry_function=ENTRY_FUNCTION):
+    """
+    Returns the set of functions which can be reached from the entry function,
+    or None if the entry function is not declared and every function is kept.
+
+    Calls made outside of a function are always followed.
+    """
+    if entry_function not in call_graph:
+        return None
+
+    live_functions = set()
+    pending = [entry_function, *call_graph[None]]
+
+    while pending:
+        function_name = pending.pop()
+        if function_name in live_functions or function_name not in call_graph:
+            continue
+
+        live_functions.add(function_name)
+        pending.extend(call_graph[function_name])
+
+    return live_functions
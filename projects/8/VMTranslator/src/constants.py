@@ -12,6 +12,13 @@ ARITHMETIC_LOGICAL_INS_MAP = {
     'not': ins.NotInstruction
 }
 
+# comparison instructions which jump to a shared routine
+SHARED_COMPARISON_INS_MAP = {
+    'eq': ins.SharedComparisonInstruction,
+    'gt': ins.SharedComparisonInstruction,
+    'lt': ins.SharedComparisonInstruction
+}
+
 BRANCH_INS_MAP = {
     'goto': ins.GotoInstruction,
     'if-goto': ins.IfGotoInstruction,
@@ -29,6 +36,13 @@ FUNCTION_INS_MAP = {
     'return': ins.ReturnInstruction
 }
 
+# function instructions which jump to the shared call and return routines
+SHARED_FUNCTION_INS_MAP = {
+    'call': ins.SharedCallInstruction,
+    'function': ins.FunctionInstruction,
+    'return': ins.SharedReturnInstruction
+}
+
 MEMORY_SEGMENTS = {
     'local',
     'argument',
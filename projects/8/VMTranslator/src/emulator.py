@@ -0,0 +1,400 @@
+import sys
+import time
+import traceback
+from array import array
+
+from exceptions import AssemblyError, VMTranslatorError
+
+USAGE = 'Usage: python emulator.py [-m N] <file.asm>'
+
+# the Hack computer has 32K words of ROM and RAM
+MEMORY_SIZE = 32_768
+ADDRESS_MASK = 0x7FFF
+WORD_MASK = 0xFFFF
+
+# Hack ASM specification states variable addresses start at 16
+VARIABLE_START_ADDRESS = 16
+
+# programs which use the OS end by calling Sys.halt, which never returns
+HALT_FUNCTION = 'Sys.halt'
+
+# predefined symbols from the Hack ASM specification
+PREDEFINED_SYMBOLS = {
+    **{f'R{i}': i for i in range(16)},
+    'SP': 0,
+    'LCL': 1,
+    'ARG': 2,
+    'THIS': 3,
+    'THAT': 4,
+    'SCREEN': 16_384,
+    'KBD': 24_576
+}
+
+# 1 1 1 a c c c c c c d d d j j j
+COMP_CODES = {
+    '0': 0b0101010,
+    '1': 0b0111111,
+    '-1': 0b0111010,
+    'D': 0b0001100,
+    'A': 0b0110000,
+    'M': 0b1110000,
+    '!D': 0b0001101,
+    '!A': 0b0110001,
+    '!M': 0b1110001,
+    '-D': 0b0001111,
+    '-A': 0b0110011,
+    '-M': 0b1110011,
+    'D+1': 0b0011111,
+    'A+1': 0b0110111,
+    'M+1': 0b1110111,
+    'D-1': 0b0001110,
+    'A-1': 0b0110010,
+    'M-1': 0b1110010,
+    'D+A': 0b0000010,
+    'D+M': 0b1000010,
+    'D-A': 0b0010011,
+    'D-M': 0b1010011,
+    'A-D': 0b0000111,
+    'M-D': 0b1000111,
+    'D&A': 0b0000000,
+    'D&M': 0b1000000,
+    'D|A': 0b0010101,
+    'D|M': 0b1010101
+}
+
+DEST_CODES = {'M': 0b001, 'D': 0b010, 'MD': 0b011, 'A': 0b100, 'AM': 0b101, 'AD': 0b110, 'AMD': 0b111}
+
+JUMP_CODES = {'JGT': 0b001, 'JEQ': 0b010, 'JGE': 0b011, 'JLT': 0b100, 'JNE': 0b101, 'JLE': 0b110, 'JMP': 0b111}
+
+# ALU operations, y is A or M depending on the a-bit of the instruction
+(OP_ZERO, OP_ONE, OP_MINUS_ONE, OP_D, OP_Y, OP_NOT_D, OP_NOT_Y, OP_NEG_D, OP_NEG_Y, OP_D_PLUS_ONE,
+ OP_Y_PLUS_ONE, OP_D_MINUS_ONE, OP_Y_MINUS_ONE, OP_D_PLUS_Y, OP_D_MINUS_Y, OP_Y_MINUS_D, OP_D_AND_Y, OP_D_OR_Y) = range(18)
+
+# c-bits of each ALU operation
+ALU_OPS = {
+    0b101010: OP_ZERO,
+    0b111111: OP_ONE,
+    0b111010: OP_MINUS_ONE,
+    0b001100: OP_D,
+    0b110000: OP_Y,
+    0b001101: OP_NOT_D,
+    0b110001: OP_NOT_Y,
+    0b001111: OP_NEG_D,
+    0b110011: OP_NEG_Y,
+    0b011111: OP_D_PLUS_ONE,
+    0b110111: OP_Y_PLUS_ONE,
+    0b001110: OP_D_MINUS_ONE,
+    0b110010: OP_Y_MINUS_ONE,
+    0b000010: OP_D_PLUS_Y,
+    0b010011: OP_D_MINUS_Y,
+    0b000111: OP_Y_MINUS_D,
+    0b000000: OP_D_AND_Y,
+    0b010101: OP_D_OR_Y
+}
+
+DEST_A = 0b100
+DEST_D = 0b010
+DEST_M = 0b001
+
+JUMP_LT = 0b100
+JUMP_EQ = 0b010
+JUMP_GT = 0b001
+
+def clean_asm_line(raw_line):
+    """Removes comments and whitespace from a line of ASM."""
+    comment_index = raw_line.find('//')
+    if comment_index != -1:
+        raw_line = raw_line[:comment_index]
+    return raw_line.replace(' ', '').replace('\t', '')
+
+def assemble_c_instruction(asm, line_num):
+    """Returns the machine word of a C-instruction."""
+    dest = ''
+    jump = ''
+    comp = asm
+
+    if '=' in comp:
+        dest, comp = comp.split('=', 1)
+    if ';' in comp:
+        comp, jump = comp.split(';', 1)
+
+    if comp not in COMP_CODES:
+        raise AssemblyError(f'at line {line_num}. "{comp}" is not a valid computation')
+    if dest and dest not in DEST_CODES:
+        raise AssemblyError(f'at line {line_num}. "{dest}" is not a valid destination')
+    if jump and jump not in JUMP_CODES:
+        raise AssemblyError(f'at line {line_num}. "{jump}" is not a valid jump')
+
+    return 0b111 << 13 | COMP_CODES[comp] << 6 | DEST_CODES.get(dest, 0) << 3 | JUMP_CODES.get(jump, 0)
+
+def assemble(asm_text):
+    """
+    Assembles Hack ASM into machine words.
+
+    Returns the ROM and the symbol table, which maps each label and variable
+    to its address.
+    """
+    symbols = dict(PREDEFINED_SYMBOLS)
+    instructions = []
+
+    # first pass: labels point to the next instruction
+    for line_num, raw_line in enumerate(asm_text.splitlines(), 1):
+        asm = clean_asm_line(raw_line)
+        if not asm:
+            continue
+
+        if asm[0] == '(':
+            if asm[-1] != ')':
+                raise AssemblyError(f'at line {line_num}. Label "{asm}" is missing ")"')
+            symbols[asm[1:-1]] = len(instructions)
+        else:
+            instructions.append((line_num, asm))
+
+    if len(instructions) > MEMORY_SIZE:
+        raise AssemblyError(f'the program has {len(instructions)} instructions, the ROM only fits {MEMORY_SIZE}')
+
+    # second pass: new symbols are variables
+    rom = array('H')
+    next_variable_address = VARIABLE_START_ADDRESS
+
+    for line_num, asm in instructions:
+
+        if asm[0] != '@':
+            rom.append(assemble_c_instruction(asm, line_num))
+            continue
+
+        value = asm[1:]
+        if value.isdigit():
+            address = int(value)
+            if address > ADDRESS_MASK:
+                raise AssemblyError(f'at line {line_num}. Address value cannot exceed {ADDRESS_MASK}')
+        elif value in symbols:
+            address = symbols[value]
+        else:
+            address = next_variable_address
+            symbols[value] = address
+            next_variable_address += 1
+
+        rom.append(address)
+
+    return rom, symbols
+
+def decode(rom):
+    """
+    Decodes each machine word once so the CPU loop does not have to.
+
+    A-instructions are kept as their int value, C-instructions become a tuple
+    of (ALU operation, reads M, destination bits, jump bits).
+    """
+    program = []
+
+    for address, word in enumerate(rom):
+
+        # A-instruction
+        if not word & 0x8000:
+            program.append(word)
+            continue
+
+        c_bits = word >> 6 & 0b111111
+        if c_bits not in ALU_OPS:
+            raise AssemblyError(f'at ROM address {address}. {word:016b} is not a valid computation')
+
+        program.append((ALU_OPS[c_bits], bool(word & 0x1000), word >> 3 & 0b111, word & 0b111))
+
+    return program
+
+class HackEmulator():
+    """
+    Runs Hack machine code and counts the CPU cycles.
+
+    The program halts when it reaches a jump to the A-instruction right
+    before it, which is how the (EOF) loop waits forever, or when it jumps
+    to the halt address.
+    """
+
+    def __init__(self, rom, halt_address=None):
+        self.rom = rom
+        self.program = decode(rom)
+        self.halt_address = halt_address
+        self.ram = array('H', bytes(2 * MEMORY_SIZE))
+        self.a = 0
+        self.d = 0
+        self.pc = 0
+        self.cycles = 0
+        self.halted = False
+
+    @classmethod
+    def from_asm(cls, asm_text):
+        """
+        Creates an emulator from Hack ASM, such as the output of translate().
+        The program halts when it calls Sys.halt.
+        """
+        rom, symbols = assemble(asm_text)
+        return cls(rom, symbols.get(HALT_FUNCTION))
+
+    def run(self, max_cycles=None):
+        """
+        Runs the program until it halts, leaves the ROM or runs max_cycles
+        more cycles. Returns the number of cycles run.
+        """
+        program = self.program
+        ram = self.ram
+        program_size = len(program)
+        a = self.a
+        d = self.d
+        pc = self.pc
+        halt_address = self.halt_address
+        cycles = 0
+        limit = max_cycles if max_cycles is not None else float('inf')
+
+        while cycles < limit and pc < program_size:
+            ins = program[pc]
+            cycles += 1
+
+            # A-instruction
+            if ins.__class__ is int:
+                a = ins
+                pc += 1
+                continue
+
+            op, reads_m, dest, jump = ins
+            y = ram[a & ADDRESS_MASK] if reads_m else a
+
+            # the most common operations are checked first
+            if op == OP_Y:
+                out = y
+            elif op == OP_D:
+                out = d
+            elif op == OP_Y_PLUS_ONE:
+                out = (y + 1) & WORD_MASK
+            elif op == OP_Y_MINUS_ONE:
+                out = (y - 1) & WORD_MASK
+            elif op == OP_D_PLUS_Y:
+                out = (d + y) & WORD_MASK
+            elif op == OP_Y_MINUS_D:
+                out = (y - d) & WORD_MASK
+            elif op == OP_ZERO:
+                out = 0
+            elif op == OP_D_MINUS_Y:
+                out = (d - y) & WORD_MASK
+            elif op == OP_NOT_Y:
+                out = y ^ WORD_MASK
+            elif op == OP_MINUS_ONE:
+                out = WORD_MASK
+            elif op == OP_ONE:
+                out = 1
+            elif op == OP_D_PLUS_ONE:
+                out = (d + 1) & WORD_MASK
+            elif op == OP_D_MINUS_ONE:
+                out = (d - 1) & WORD_MASK
+            elif op == OP_NEG_Y:
+                out = -y & WORD_MASK
+            elif op == OP_D_AND_Y:
+                out = d & y
+            elif op == OP_D_OR_Y:
+                out = d | y
+            elif op == OP_NOT_D:
+                out = d ^ WORD_MASK
+            else:
+                out = -d & WORD_MASK
+
+            # M and the jump use the address in A from before the instruction
+            address = a
+            if dest:
+                if dest & DEST_M:
+                    ram[address & ADDRESS_MASK] = out
+                if dest & DEST_D:
+                    d = out
+                if dest & DEST_A:
+                    a = out
+
+            if jump:
+                if out & 0x8000:
+                    taken = jump & JUMP_LT
+                elif out:
+                    taken = jump & JUMP_GT
+                else:
+                    taken = jump & JUMP_EQ
+
+                if taken:
+                    if address == pc - 1 and jump == 0b111 and program[address] == address:
+                        self.halted = True
+                        break
+                    pc = address
+                    # functions are always entered with a jump
+                    if pc == halt_address:
+                        self.halted = True
+                        break
+                    continue
+
+            pc += 1
+
+        self.a = a
+        self.d = d
+        self.pc = pc
+        self.cycles += cycles
+        return cycles
+
+def parse_positive_int(value):
+    """Parses the value of the -m option. Returns None if it is not a positive integer."""
+    try:
+        as_int = int(value)
+    except ValueError:
+        return None
+
+    if as_int < 1:
+        return None
+
+    return as_int
+
+def main():
+
+    args = sys.argv
+
+    if (len(args) < 2):
+        print(USAGE)
+        sys.exit(1)
+
+    max_cycles = None
+    options = args[1:-1]
+
+    while options:
+        option = options.pop(0)
+
+        if option == '-m':
+            max_cycles = parse_positive_int(options.pop(0)) if options else None
+            if max_cycles is None:
+                print("Error: '-m' requires a positive number of cycles")
+                sys.exit(1)
+            continue
+
+        print(f"Error: '{option}' is not a valid option")
+        sys.exit(1)
+
+    try:
+        with open(args[-1], 'r') as asm_file:
+            emulator = HackEmulator.from_asm(asm_file.read())
+
+        start_time = time.perf_counter()
+        cycles = emulator.run(max_cycles)
+        end_time = time.perf_counter()
+        exec_time = round((end_time - start_time), 5)
+
+        print(f'\nROM size: {len(emulator.rom)} instructions')
+        print(f'Cycles: {cycles}')
+        if emulator.halted:
+            print(f'Halted at ROM address {emulator.pc}')
+        else:
+            print(f'Stopped at ROM address {emulator.pc}')
+        print(f'Execution time: {exec_time} seconds ({round(cycles / max(exec_time, 1e-9))} cycles per second)\n')
+
+    except VMTranslatorError as error:
+        print(f'Error: {error}')
+        sys.exit(1)
+
+    except Exception:
+        print(traceback.format_exc())
+        sys.exit(2)
+
+if __name__ == '__main__':
+    main()
@@ -9,3 +9,7 @@ class ParseError(VMTranslatorError):
 class TranslationError(VMTranslatorError):
     """Errors thrown by the translator"""
     pass
+
+class AssemblyError(VMTranslatorError):
+    """Errors thrown by the emulator's assembler"""
+    pass
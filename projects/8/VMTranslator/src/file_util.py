@@ -2,6 +2,9 @@ from pathlib import Path
 
 from exceptions import VMTranslatorError
 
+# number of translated instructions written to the asm file at a time
+ASM_CHUNK_SIZE = 1024
+
 class Line():
     """Class for containing a line and its meta-data."""
 
@@ -22,18 +25,99 @@ class Line():
     def __str__(self):
         return self.raw_line
 
+class AsmFileWriter():
+    """
+    Writes translated ASM to a file in chunks and counts the lines and Hack
+    instructions written.
+
+    The chunks are written to a temporary file next to the output, which
+    only replaces the output when it is closed, so a translation error never
+    leaves a partial ASM file.
+    """
+
+    def __init__(self, output_file_path, chunk_size=ASM_CHUNK_SIZE):
+        self.output_file_path = Path(output_file_path)
+        self.temp_file_path = self.output_file_path.with_name(f'{self.output_file_path.name}.tmp')
+        self.asm_file = open(self.temp_file_path, 'w')
+        self.chunk_size = chunk_size
+        self.chunk = []
+        self.line_count = 0
+        self.rom_size = 0
+
+    def write(self, asm):
+        """Adds the ASM of an instruction to the current chunk."""
+        self.chunk.append(asm)
+        if len(self.chunk) >= self.chunk_size:
+            self.flush()
+
+    def write_all(self, asm_blocks):
+        """
+        Writes each block of ASM from an iterable, then closes the file. If
+        the iterable raises an error the file is discarded.
+        """
+        try:
+            for asm in asm_blocks:
+                self.write(asm)
+        except BaseException:
+            self.discard()
+            raise
+        self.close()
+
+    def flush(self):
+        """Writes the current chunk to the file."""
+        if self.chunk:
+            text = ''.join(self.chunk)
+            self.line_count += count_asm_lines([text])
+            self.rom_size += count_rom_instructions([text])
+            self.asm_file.write(text)
+            self.chunk = []
+
+    def close(self):
+        """Writes the remaining chunk, closes the file and moves it to the output path."""
+        if self.asm_file.closed:
+            return
+        self.flush()
+        self.asm_file.close()
+        self.temp_file_path.replace(self.output_file_path)
+
+    def discard(self):
+        """Closes and removes the file without writing the remaining chunk."""
+        if self.asm_file.closed:
+            return
+        self.asm_file.close()
+        self.chunk = []
+        self.temp_file_path.unlink(missing_ok=True)
+
+def count_asm_lines(asm):
+    """Returns the number of lines in the ASM, blank lines are not counted."""
+    return sum(1 for block in asm for line in block.split('\n') if line.strip())
+
+def count_rom_instructions(asm):
+    """Returns the number of Hack instructions in the ASM, labels and comments are not counted."""
+    count = 0
+    for block in asm:
+        for line in block.split('\n'):
+            line = line.strip()
+            if line and not line.startswith('//') and not line.startswith('('):
+                count += 1
+    return count
+
+def read_input_lines(paths):
+    """
+    Lazily reads the files specified in a list one line at a time and
+    yields a Line object for each line.
+    """
+    for path in paths:
+        with open(path, 'r') as vm_file:
+            for line in vm_file:
+                yield Line(path.stem, line)
+
 def get_input_lines(paths):
     """
     Opens all files specified in a list and loads
     their contents into a list of Line objects
     """
-    file_count = len(paths)
-    input_lines = []
-    for path in paths:
-        with open(path, 'r') as vm_file:
-            for line in vm_file.readlines():
-                input_lines.append(Line(path.stem, line))
-    return input_lines, file_count
+    return list(read_input_lines(paths)), len(paths)
 
 def get_vm_files(path):
     """
@@ -1,12 +1,82 @@
+import re
+
 from exceptions import TranslationError
 from file_util import Line
 
+class AsmTemplate():
+    """
+    Pre-joined ASM split around its {name} placeholders, so only the values
+    which vary between instructions are joined in.
+    """
+
+    PLACEHOLDER = re.compile(r'\{(\w+)\}')
+
+    def __init__(self, asm_lines):
+        parts = self.PLACEHOLDER.split('\n'.join(asm_lines) + '\n')
+        self.head = parts[0]
+        # (placeholder name, text up to the next placeholder)
+        self.fields = list(zip(parts[1::2], parts[2::2]))
+
+    def substitute(self, values):
+        """Returns the ASM with the placeholders replaced by the values."""
+        asm = [self.head]
+        for name, text in self.fields:
+            asm.append(values[name])
+            asm.append(text)
+        return ''.join(asm)
+
+class TranslationContext():
+    """
+    State of a single translation which is read and updated as its
+    instructions are created, so translations in other threads or in the
+    same process do not affect each other.
+    """
+
+    def __init__(self, calling_function=''):
+        # name of the function being translated, used to scope labels
+        self.calling_function = calling_function
+
+# ASM which writes the top of the stack from D back to the stack in RAM
+WRITE_BACK_STACK_TOP_ASM = [
+    '// write back the top of the stack',
+    '@SP', # select top of stack
+    'A=M',
+    'M=D', # set the value in D to top of stack
+    '@SP', # increment the stack-pointer
+    'M=M+1'
+]
+
+# ASM which moves the top of the stack from RAM into D
+LOAD_STACK_TOP_ASM = [
+    '@SP', # deincrement stack-pointer & select the top of the stack
+    'AM=M-1',
+    'D=M' # move it into D
+]
+
+def make_cached_operation_asm(comment, top_in_d, operation):
+    """
+    Generates the ASM lines of an arithmetic or logical instruction which
+    works on the top of the stack in D and leaves its result in D.
+    """
+    asm = [comment]
+    if not top_in_d:
+        asm += LOAD_STACK_TOP_ASM
+    return asm + operation, True
+
 class BaseInstruction():
     """Abstract class for all instructions."""
 
-    def __init__(self, line):
+    # ASM templates shared by all instructions with the same template key,
+    # a template only depends on its key so it can be shared by translations
+    asm_templates = {}
+
+    # (template, top of the stack is in D after it) for the mode which keeps
+    # the top of the stack in D, by whether it is in D before the instruction
+    cached_asm_templates = {}
+
+    def __init__(self, line, context=None):
         self._line = line
-        self._asm = []
+        self.context = context if context is not None else TranslationContext()
 
     def get_file_name(self):
         return self._line.file_name
@@ -24,16 +94,74 @@ class BaseInstruction():
         """Generates a comment line of the original VM instruction."""
         return '// ' + ' '.join(self.get_tokens())
 
+    def get_template_key(self):
+        """
+        Key for the ASM template of the instruction. Instructions with the
+        same key only differ by the values substituted into the template.
+        """
+        return (type(self),)
+
+    def make_asm_template(self):
+        """Generates the ASM lines, with {name} placeholders for the values which vary between instructions."""
+        raise NotImplementedError
+
+    def get_template_values(self):
+        """String values substituted into the ASM template."""
+        return None
+
     def to_asm(self):
-        return '\n'.join(self._asm) + '\n'
+        key = self.get_template_key()
+        template = self.asm_templates.get(key)
+        if template is None:
+            template = AsmTemplate(self.make_asm_template())
+            self.asm_templates[key] = template
+
+        if not template.fields:
+            return template.head
+        return template.substitute(self.get_template_values())
+
+    def get_cached_template_key(self, top_in_d):
+        """Key for the ASM template of the instruction when the top of the stack may be in D."""
+        return (top_in_d,) + self.get_template_key()
+
+    def make_cached_asm_template(self, top_in_d):
+        """
+        Generates the ASM lines for when the top of the stack may be kept in
+        D between instructions, and whether the top of the stack is in D
+        after them. While it is in D the stack-pointer points to where it
+        is written back.
+
+        By default the top of the stack is written back first, so the ASM
+        of the instruction runs on the stack in RAM.
+        """
+        asm = self.make_asm_template()
+        if top_in_d:
+            asm = WRITE_BACK_STACK_TOP_ASM + asm
+        return asm, False
+
+    def to_cached_asm(self, top_in_d):
+        """
+        Returns the ASM for when the top of the stack may be kept in D, and
+        whether the top of the stack is in D after it.
+        """
+        key = self.get_cached_template_key(top_in_d)
+        cached_template = self.cached_asm_templates.get(key)
+        if cached_template is None:
+            asm_lines, top_in_d_after = self.make_cached_asm_template(top_in_d)
+            cached_template = (AsmTemplate(asm_lines), top_in_d_after)
+            self.cached_asm_templates[key] = cached_template
+
+        template, top_in_d_after = cached_template
+        if not template.fields:
+            return template.head, top_in_d_after
+        return template.substitute(self.get_template_values()), top_in_d_after
 
 # ARITHMATIC INSTRUCTIONS
 
 class AddInstruction(BaseInstruction):
     """Generates the Hack ASM for the 'add' instruction."""
-    def __init__(self, line):
-        super().__init__(line)
-        self._asm = [
+    def make_asm_template(self):
+        return [
             '// add',
             '@SP', # deincrement stack-pointer & select new stack location
             'AM=M-1',
@@ -42,11 +170,17 @@ class AddInstruction(BaseInstruction):
             'M=D+M' # update stack with sum of both values
         ]
 
+    def make_cached_asm_template(self, top_in_d):
+        return make_cached_operation_asm('// add', top_in_d, [
+            '@SP', # deincrement stack-pointer & select the value below the top
+            'AM=M-1',
+            'D=D+M' # keep the sum in D
+        ])
+
 class SubInstruction(BaseInstruction):
     """Generates the Hack ASM for the 'sub' instruction."""
-    def __init__(self, line):
-        super().__init__(line)
-        self._asm = [
+    def make_asm_template(self):
+        return [
             '// sub',
             '@SP', # deincrement stack-pointer & select new stack location
             'AM=M-1',
@@ -55,11 +189,17 @@ class SubInstruction(BaseInstruction):
             'M=M-D' # update stack with difference of both values
         ]
 
+    def make_cached_asm_template(self, top_in_d):
+        return make_cached_operation_asm('// sub', top_in_d, [
+            '@SP', # deincrement stack-pointer & select the value below the top
+            'AM=M-1',
+            'D=M-D' # keep the difference in D
+        ])
+
 class NegInstruction(BaseInstruction):
     """Generates the Hack ASM for the 'neg' instruction."""
-    def __init__(self, line):
-        super().__init__(line)
-        self._asm = [
+    def make_asm_template(self):
+        return [
             '// neg',
             '@SP', # deincrement stack-pointer & select new stack location
             'AM=M-1',
@@ -68,14 +208,37 @@ class NegInstruction(BaseInstruction):
             'M=M+1'
         ]
 
+    def make_cached_asm_template(self, top_in_d):
+        return make_cached_operation_asm('// neg', top_in_d, ['D=-D'])
+
 # LOGICAL INSTRUCTIONS
 # NOTE: Hack ASM uses -1 as true and 0 as false
 
-class EqInstruction(BaseInstruction):
+class ComparisonBaseInstruction(BaseInstruction):
+    """Base instruction for comparison instructions, which use labels made from the line number."""
+    def get_template_values(self):
+        return {'line_num': str(self.get_line_num())}
+
+    def make_cached_comparison_asm(self, command, jump, top_in_d):
+        """Generates the ASM lines of the comparison when the top of the stack may be in D."""
+        return make_cached_operation_asm(f'// {command}', top_in_d, [
+            '@SP', # deincrement stack-pointer & select the value below the top
+            'AM=M-1',
+            'D=M-D', # diff selected values
+            '@TRUE.{line_num}', # if the comparison holds, jump to true
+            f'D;{jump}',
+            'D=0', # else, set to false and jump to end
+            '@END.{line_num}',
+            '0;JMP',
+            '(TRUE.{line_num})', # set to true
+            'D=-1',
+            '(END.{line_num})'
+        ])
+
+class EqInstruction(ComparisonBaseInstruction):
     """Generates the Hack ASM for the 'eq' instruction."""
-    def __init__(self, line):
-        super().__init__(line)
-        self._asm = [
+    def make_asm_template(self):
+        return [
             '// eq',
             '@SP', # deincrement stack-pointer & select new stack location
             'AM=M-1',
@@ -83,27 +246,29 @@ class EqInstruction(BaseInstruction):
             '@SP', # deincrement stack-pointer again & select new stack location
             'AM=M-1',
             'D=M-D', # diff selected values
-            f'@TRUE.{self.get_line_num()}', # if diff is 0, jump to true
+            '@TRUE.{line_num}', # if diff is 0, jump to true
             'D;JEQ',
             '@SP', # else, set to false and jump to end
             'A=M',
             'M=0',
-            f'@END.{self.get_line_num()}',
+            '@END.{line_num}',
             '0;JMP',
-            f'(TRUE.{self.get_line_num()})', # set to true
+            '(TRUE.{line_num})', # set to true
             '@SP',
             'A=M',
             'M=-1',
-            f'(END.{self.get_line_num()})', # increment the stack-pointer
+            '(END.{line_num})', # increment the stack-pointer
             '@SP',
             'M=M+1'
         ]
 
-class GtInstruction(BaseInstruction):
+    def make_cached_asm_template(self, top_in_d):
+        return self.make_cached_comparison_asm('eq', 'JEQ', top_in_d)
+
+class GtInstruction(ComparisonBaseInstruction):
     """Generates the Hack ASM for the 'gt' instruction."""
-    def __init__(self, line):
-        super().__init__(line)
-        self._asm = [
+    def make_asm_template(self):
+        return [
             '// gt',
             '@SP', # deincrement stack-pointer & select new stack location
             'AM=M-1',
@@ -111,27 +276,29 @@ class GtInstruction(BaseInstruction):
             '@SP', # deincrement stack-pointer again & select new stack location
             'AM=M-1',
             'D=M-D', # diff selected values
-            f'@TRUE.{self.get_line_num()}', # if D is greater-than 0, jump to true
+            '@TRUE.{line_num}', # if D is greater-than 0, jump to true
             'D;JGT',
             '@SP', # else, set to false and jump to end
             'A=M',
             'M=0',
-            f'@END.{self.get_line_num()}',
+            '@END.{line_num}',
             '0;JMP',
-            f'(TRUE.{self.get_line_num()})', # set to true
+            '(TRUE.{line_num})', # set to true
             '@SP',
             'A=M',
             'M=-1',
-            f'(END.{self.get_line_num()})', # increment the stack-pointer
+            '(END.{line_num})', # increment the stack-pointer
             '@SP',
             'M=M+1'
         ]
 
-class LtInstruction(BaseInstruction):
+    def make_cached_asm_template(self, top_in_d):
+        return self.make_cached_comparison_asm('gt', 'JGT', top_in_d)
+
+class LtInstruction(ComparisonBaseInstruction):
     """Generates the Hack ASM for the 'lt' instruction."""
-    def __init__(self, line):
-        super().__init__(line)
-        self._asm = [
+    def make_asm_template(self):
+        return [
             '// lt',
             '@SP', # deincrement stack-pointer & select new stack location
             'AM=M-1',
@@ -139,27 +306,29 @@ class LtInstruction(BaseInstruction):
             '@SP', # deincrement stack-pointer again & select new stack location
             'AM=M-1',
             'D=M-D', # diff selected values
-            f'@TRUE.{self.get_line_num()}', # if D is less-than 0, jump to true
+            '@TRUE.{line_num}', # if D is less-than 0, jump to true
             'D;JLT',
             '@SP', # else, set to false and jump to end
             'A=M',
             'M=0',
-            f'@END.{self.get_line_num()}',
+            '@END.{line_num}',
             '0;JMP',
-            f'(TRUE.{self.get_line_num()})', # set to true
+            '(TRUE.{line_num})', # set to true
             '@SP',
             'A=M',
             'M=-1',
-            f'(END.{self.get_line_num()})', # increment the stack-pointer
+            '(END.{line_num})', # increment the stack-pointer
             '@SP',
             'M=M+1'
         ]
 
+    def make_cached_asm_template(self, top_in_d):
+        return self.make_cached_comparison_asm('lt', 'JLT', top_in_d)
+
 class AndInstruction(BaseInstruction):
     """Generates the Hack ASM for the 'and' instruction."""
-    def __init__(self, line):
-        super().__init__(line)
-        self._asm = [
+    def make_asm_template(self):
+        return [
             '// and',
             '@SP', # deincrement stack-pointer & select new stack location
             'AM=M-1',
@@ -168,11 +337,17 @@ class AndInstruction(BaseInstruction):
             'M=D&M' # update stack with the result of &
         ]
 
+    def make_cached_asm_template(self, top_in_d):
+        return make_cached_operation_asm('// and', top_in_d, [
+            '@SP', # deincrement stack-pointer & select the value below the top
+            'AM=M-1',
+            'D=D&M' # keep the result of & in D
+        ])
+
 class OrInstruction(BaseInstruction):
     """Generates the Hack ASM for the 'or' instruction."""
-    def __init__(self, line):
-        super().__init__(line)
-        self._asm = [
+    def make_asm_template(self):
+        return [
             '// or',
             '@SP', # deincrement stack-pointer & select new stack location
             'AM=M-1',
@@ -181,11 +356,17 @@ class OrInstruction(BaseInstruction):
             'M=D|M' # update stack with the result of |
         ]
 
+    def make_cached_asm_template(self, top_in_d):
+        return make_cached_operation_asm('// or', top_in_d, [
+            '@SP', # deincrement stack-pointer & select the value below the top
+            'AM=M-1',
+            'D=D|M' # keep the result of | in D
+        ])
+
 class NotInstruction(BaseInstruction):
     """Generates the Hack ASM for the 'not' instruction."""
-    def __init__(self, line):
-        super().__init__(line)
-        self._asm = [
+    def make_asm_template(self):
+        return [
             '// not',
             '@SP', # deincrement stack-pointer & select new stack location
             'AM=M-1',
@@ -194,26 +375,79 @@ class NotInstruction(BaseInstruction):
             'M=M+1'
         ]
 
+    def make_cached_asm_template(self, top_in_d):
+        return make_cached_operation_asm('// not', top_in_d, ['D=!D'])
+
+# SHARED COMPARISON INSTRUCTIONS
+
+class SharedComparisonInstruction(ComparisonBaseInstruction):
+    """
+    Generates the Hack ASM for an 'eq', 'gt' or 'lt' instruction which
+    jumps to the shared routine for the comparison.
+
+    The return address is passed to the routine in D. When the top of the
+    stack is kept in D, it is passed in R14 to a variant of the routine which
+    leaves the result in D.
+    """
+    def __init__(self, line, context=None):
+        super().__init__(line, context)
+        self.command = self.get_tokens()[0].lower()
+
+    def get_template_key(self):
+        return (type(self), self.command)
+
+    def make_asm_template(self):
+        return [
+            f'// {self.command}',
+            '@END.{line_num}', # pass the return address in D
+            'D=A',
+            f'@{SharedComparisonRoutine.get_label(self.command)}',
+            '0;JMP',
+            '(END.{line_num})'
+        ]
+
+    def make_cached_asm_template(self, top_in_d):
+        asm = [f'// {self.command}']
+        if not top_in_d:
+            asm += LOAD_STACK_TOP_ASM
+
+        return asm + [
+            '@R14', # pass the top of the stack in R14
+            'M=D',
+            '@END.{line_num}', # pass the return address in D
+            'D=A',
+            f'@{SharedComparisonRoutine.get_label(self.command, top_in_d=True)}',
+            '0;JMP',
+            '(END.{line_num})'
+        ], True
+
 # BRANCHING INSTRUCTIONS
 
 class BranchingBaseInstruction(BaseInstruction):
     """Base instruction for Branching instructions."""
+    def __init__(self, line, context=None):
+        super().__init__(line, context)
+        # the label depends on the current function scope
+        self.label_name = self.make_label_name()
+
+    def get_template_values(self):
+        return {'label_name': self.label_name}
+
     def make_label_name(self):
 
         func_name = self.get_file_name()
-        if FunctionBaseInstruction.calling_function:
-            func_name = FunctionBaseInstruction.calling_function
+        if self.context.calling_function:
+            func_name = self.context.calling_function
 
         label_name = self.get_tokens()[1]
         return f'{func_name}${label_name}'
 
 class GotoInstruction(BranchingBaseInstruction):
     """Generates the Hack ASM for the 'goto' instruction."""
-    def __init__(self, line):
-        super().__init__(line)
-        self._asm = [
+    def make_asm_template(self):
+        return [
             '// goto',
-            f'@{self.make_label_name()}', # jump to label
+            '@{label_name}', # jump to label
             '0;JMP'
         ]
 
@@ -227,44 +461,70 @@ class IfGotoInstruction(BranchingBaseInstruction):
     Note: this seems to contradict the lecture which state we should
     expect a boolean expression immediately before the if-goto
     """
-    def __init__(self, line):
-        super().__init__(line)
-        self._asm = [
+    def make_asm_template(self):
+        return [
             '// if-goto',
             '@SP', # deincrement stack-pointer & select new top value in stack
             'AM=M-1',
             'D=M', # move it into d for evaluation
-            f'@{self.make_label_name()}',
+            '@{label_name}',
             'D;JNE'
         ]
 
+    def make_cached_asm_template(self, top_in_d):
+        if not top_in_d:
+            return super().make_cached_asm_template(top_in_d)
+
+        # the stack-pointer already points past the rest of the stack
+        return [
+            '// if-goto',
+            '@{label_name}',
+            'D;JNE'
+        ], False
+
 class LabelInstruction(BranchingBaseInstruction):
     """Generates the Hack ASM for the 'label' instruction."""
-    def __init__(self, line):
-        super().__init__(line)
-        self._asm = [
+    def make_asm_template(self):
+        return [
             '// label',
-            f'({self.make_label_name()})' # write label
+            '({label_name})' # write label
         ]
 
 # FUNCTION INSTRUCTIONS
 
 class FunctionBaseInstruction(BaseInstruction):
     """Abstract class for function instructions."""
-    calling_function = ''
+
+    def get_template_values(self):
+        return {'comment': self.get_comment()}
+
+SHARED_CALL_LABEL = '$$CALL'
+SHARED_RETURN_LABEL = '$$RETURN'
 
 class CallInstruction(FunctionBaseInstruction):
     """Generates Hack ASM for 'call' instruction."""
 
-    def __init__(self, line):
-        super().__init__(line)
-        self._asm = [
-            self.get_comment(),
+    def __init__(self, line, context=None):
+        super().__init__(line, context)
+        # the return label depends on the current function scope
+        self.return_label = f'{self.context.calling_function}$ret.{self.get_line_num()}'
+
+    def get_template_values(self):
+        return {
+            'comment': self.get_comment(),
+            'function_name': self.get_tokens()[1],
+            'arg_count': self.get_tokens()[2],
+            'return_label': self.return_label
+        }
+
+    def make_asm_template(self):
+        return [
+            '{comment}',
             '// start initialization of function call',
             '// create temp backup of new argument 0',
             self.calculate_new_argument_segment(),
             '// store return address',
-            f'@{self.calling_function}$ret.{self.get_line_num()}',
+            '@{return_label}',
             'D=A',
             '@SP',
             'A=M',
@@ -302,17 +562,17 @@ class CallInstruction(FunctionBaseInstruction):
             '@SP',
             'M=M+1', # stack-pointer should now be pointing to the top of the stack
             '// jump to function definition',
-            f'@{self.get_tokens()[1]}',
+            '@{function_name}',
             '0;JMP',
             '// return address for called function',
-            f'({self.calling_function}$ret.{self.get_line_num()})',
+            '({return_label})',
             '// end initialization of function call'
         ]
 
     def calculate_new_argument_segment(self):
         """Calculate and store the address for the new argument 0 pointer."""
         asm = [
-            f'@{self.get_tokens()[2]}', # calculate the address of new argument 0
+            '@{arg_count}', # calculate the address of new argument 0
             'D=A',
             '@SP',
             'D=M-D',
@@ -321,19 +581,92 @@ class CallInstruction(FunctionBaseInstruction):
         ]
         return '\n'.join(asm)
 
+class SharedCallInstruction(FunctionBaseInstruction):
+    """
+    Generates Hack ASM for 'call' instruction which jumps to the shared
+    call routine instead of backing up the caller's frame inline.
+
+    The routine expects:
+
+    R13 = address of the called function
+    R14 = number of arguments
+    R15 = return address
+    """
+
+    def __init__(self, line, context=None):
+        super().__init__(line, context)
+        self.arg_count = int(self.get_tokens()[2])
+        # the return label depends on the current function scope
+        self.return_label = f'{self.context.calling_function}$ret.{self.get_line_num()}'
+
+    def get_template_key(self):
+        # 0 and 1 are part of the template
+        return (type(self), min(self.arg_count, 2))
+
+    def get_template_values(self):
+        return {
+            'comment': self.get_comment(),
+            'function_name': self.get_tokens()[1],
+            'arg_count': str(self.arg_count),
+            'return_label': self.return_label
+        }
+
+    def make_asm_template(self):
+        return [
+            '{comment}',
+            '@{function_name}', # store function address
+            'D=A',
+            '@R13',
+            'M=D',
+            self.store_argument_count(),
+            '@{return_label}', # store return address
+            'D=A',
+            '@R15',
+            'M=D',
+            f'@{SHARED_CALL_LABEL}',
+            '0;JMP',
+            '({return_label})'
+        ]
+
+    def store_argument_count(self):
+        """Store the number of arguments in R14."""
+
+        # 0 and 1 can be written to memory directly
+        if self.arg_count <= 1:
+            return '\n'.join(['@R14', f'M={self.arg_count}'])
+
+        asm = [
+            '@{arg_count}',
+            'D=A',
+            '@R14',
+            'M=D'
+        ]
+        return '\n'.join(asm)
+
 class FunctionInstruction(FunctionBaseInstruction):
     """Generates Hack ASM for 'function' instruction."""
 
-    def __init__(self, line):
-        super().__init__(line)
+    def __init__(self, line, context=None):
+        super().__init__(line, context)
 
         # track the current function scope for generating return labels
-        FunctionBaseInstruction.calling_function = self.get_tokens()[1]
+        self.context.calling_function = self.get_tokens()[1]
+
+    def get_template_key(self):
+        # the local variables are part of the template
+        return (type(self), self.get_tokens()[2])
 
-        self._asm = [
+    def get_template_values(self):
+        return {
+            'comment': self.get_comment(),
+            'function_name': self.get_tokens()[1]
+        }
+
+    def make_asm_template(self):
+        return [
             '', # add leading space in asm output
-            self.get_comment(),
-            f'({self.get_tokens()[1]})',
+            '{comment}',
+            '({function_name})',
             '// start local segment initialization',
             '@SP', # grab the current stack pointer address...
             'D=M',
@@ -353,79 +686,112 @@ class FunctionInstruction(FunctionBaseInstruction):
             line.line_num = self.get_line_num()
             line.tokens = ['push', 'constant', '0']
 
-            ins = PushInstruction(line).to_asm()
+            ins = PushInstruction(line, self.context).to_asm()
             local_segment_asm.append(ins)
 
         return ''.join(local_segment_asm).rstrip()
 
 class ReturnInstruction(FunctionBaseInstruction):
     """Generates Hack ASM for 'return' instruction."""
-    def __init__(self, line):
-        super().__init__(line)
-
-        pop_ins = Line(self.get_file_name(), 'pop argument 0')
-        pop_ins.line_num = self.get_line_num()
-        pop_ins.tokens = ['pop', 'argument', '0']
-
-        self._asm = [
-            self.get_comment(),
-            # Make temp backup of return address first because and argument 0 will
-            # occupy the same position on the stack if the function is called with
-            # 0 arguments
-            '// temp backup return address',
-            '@5', # return address is stored in LCL addr - 5
-            'D=A',
-            '@LCL',
-            'A=M-D',
-            'D=M',
-            '@R15',
-            'M=D',
-            '// copy return value to argument 0',
-            PopInstruction(pop_ins).to_asm().rstrip(),
-            '// restore segment pointers for caller function',
-            '@LCL', # move stack-pointer to that local - 1
-            'D=M',
-            '// restore that pointer',
-            '@SP',
-            'AM=D-1',
-            'D=M',
-            '@THAT',
-            'M=D',
-            '// restore this pointer',
-            '@SP',
-            'AM=M-1',
-            'D=M',
-            '@THIS',
-            'M=D',
-            '// restore argument pointer',
-            '// backup current location of argument',
-            '@ARG',
-            'D=M',
-            '@R14', # temp backup of current arg pointer
-            'M=D',
-            '// now restore argument pointer',
-            '@SP',
-            'AM=M-1',
+    def make_asm_template(self):
+        return ['{comment}'] + make_return_asm()
+
+    def make_cached_asm_template(self, top_in_d):
+        return ['{comment}'] + make_return_asm(top_in_d), False
+
+class SharedReturnInstruction(FunctionBaseInstruction):
+    """Generates Hack ASM for 'return' instruction which jumps to the shared return routine."""
+    def make_asm_template(self):
+        return [
+            '{comment}',
+            f'@{SHARED_RETURN_LABEL}',
+            '0;JMP'
+        ]
+
+def make_return_asm(return_value_in_d=False):
+    """
+    Generates the Hack ASM which returns from the current function to its caller.
+
+    With return_value_in_d, the return value is in D instead of on the stack.
+    """
+
+    pop_ins = Line('', 'pop argument 0')
+    pop_ins.tokens = ['pop', 'argument', '0']
+
+    backup_return_value = []
+    copy_return_value = [PopInstruction(pop_ins).to_asm().rstrip()]
+    if return_value_in_d:
+        backup_return_value = [
+            '// temp backup return value',
+            '@R14', # R14 is not used until the return value is copied
+            'M=D'
+        ]
+        copy_return_value = [
+            '@R14',
             'D=M',
             '@ARG',
-            'M=D',
-            '// restore local pointer',
-            '@SP',
-            'AM=M-1',
-            'D=M',
-            '@LCL',
-            'M=D',
-            '// clear function working stack',
-            '@R14', # get backup of arg pointer
-            'D=M',
-            '@SP', # move stack-pointer to location just after return value
-            'AM=D+1',
-            '// Jump to return address',
-            '@R15', # get the address stored in R15
             'A=M',
-            '0;JMP' # and jump to it
+            'M=D'
         ]
 
+    return backup_return_value + [
+        # Make temp backup of return address first because and argument 0 will
+        # occupy the same position on the stack if the function is called with
+        # 0 arguments
+        '// temp backup return address',
+        '@5', # return address is stored in LCL addr - 5
+        'D=A',
+        '@LCL',
+        'A=M-D',
+        'D=M',
+        '@R15',
+        'M=D',
+        '// copy return value to argument 0',
+        *copy_return_value,
+        '// restore segment pointers for caller function',
+        '@LCL', # move stack-pointer to that local - 1
+        'D=M',
+        '// restore that pointer',
+        '@SP',
+        'AM=D-1',
+        'D=M',
+        '@THAT',
+        'M=D',
+        '// restore this pointer',
+        '@SP',
+        'AM=M-1',
+        'D=M',
+        '@THIS',
+        'M=D',
+        '// restore argument pointer',
+        '// backup current location of argument',
+        '@ARG',
+        'D=M',
+        '@R14', # temp backup of current arg pointer
+        'M=D',
+        '// now restore argument pointer',
+        '@SP',
+        'AM=M-1',
+        'D=M',
+        '@ARG',
+        'M=D',
+        '// restore local pointer',
+        '@SP',
+        'AM=M-1',
+        'D=M',
+        '@LCL',
+        'M=D',
+        '// clear function working stack',
+        '@R14', # get backup of arg pointer
+        'D=M',
+        '@SP', # move stack-pointer to location just after return value
+        'AM=D+1',
+        '// Jump to return address',
+        '@R15', # get the address stored in R15
+        'A=M',
+        '0;JMP' # and jump to it
+    ]
+
 # MEMORY INSTRUCTIONS
 
 class MemoryInstruction(BaseInstruction):
@@ -440,6 +806,10 @@ class MemoryInstruction(BaseInstruction):
     TEMP_INDEX = 5
     TEMP_MAX_OFFSET = 8
 
+    # a pop from D steps A up to this offset, which is cheaper than
+    # calculating the address while D holds the value
+    UNROLLED_OFFSET_MAX = 10
+
     symbols = {
         'argument': 'ARG',
         'local': 'LCL',
@@ -447,21 +817,59 @@ class MemoryInstruction(BaseInstruction):
         'that': 'THAT'
     }
 
+    def __init__(self, line, context=None):
+        super().__init__(line, context)
+        self.segment = line.tokens[1]
+        self.offset = line.tokens[2]
+        self.check_offset()
+
     def get_memory_segment(self):
         """Returns the memory segment name."""
-        return self.get_tokens()[1]
+        return self.segment
 
     def get_offset(self):
         """Returns the offset value."""
-        return self.get_tokens()[2]
+        return self.offset
+
+    def check_offset(self):
+        """
+        Checks the offset is within the pointer and temp segments.
+
+        The specification says the pointer offset maps to either THIS or
+        THAT, so it cannot be greater than 1, and temp occupies addresses 5-12.
+        """
+        seg = self.segment
+
+        if seg == 'pointer' and int(self.offset) > self.POINTER_MAX:
+            raise TranslationError(f'at line {self.get_line_num()}. Offset may not be greater than {self.POINTER_MAX} for pointer')
+
+        if seg == 'temp' and int(self.offset) > self.TEMP_MAX_OFFSET:
+            raise TranslationError(f'at line {self.get_line_num()}. Offset may not be greater than {self.TEMP_MAX_OFFSET} for temp')
+
+    def get_template_key(self):
+        # the command as written is part of the comment, and the pointer
+        # offset selects THIS or THAT in the template
+        command = self._line.tokens[0]
+        if self.segment == 'pointer':
+            return (type(self), command, self.segment, self.offset)
+        return (type(self), command, self.segment)
+
+    def get_template_values(self):
+        return {
+            'offset': self.offset,
+            'file_name': self._line.file_name
+        }
+
+    def make_comment_template(self):
+        """Generates the comment line with a placeholder for the offset."""
+        return f'// {self.get_tokens()[0]} {self.segment} ' + '{offset}'
 
 class PushInstruction(MemoryInstruction):
     """Generates the Hack ASM for a push instruction."""
 
-    def __init__(self, line):
-        super().__init__(line)
-        self._asm = [
-            self.get_comment(),
+    def make_asm_template(self):
+        return [
+            self.make_comment_template(),
             self.get_value_from_segment(),
             # This asm is the same for all memory segements
             '@SP', # select top of stack
@@ -471,10 +879,17 @@ class PushInstruction(MemoryInstruction):
             'M=M+1'
         ]
 
+    def make_cached_asm_template(self, top_in_d):
+        # the value stays in D until the next instruction needs the stack
+        asm = [self.make_comment_template()]
+        if top_in_d:
+            asm += WRITE_BACK_STACK_TOP_ASM
+        return asm + [self.get_value_from_segment()], True
+
     def get_value_by_segment_name(self):
         """Get value from memory segment."""
         asm = [
-            f'@{self.get_offset()}', # get the offset as a literal number
+            '@{offset}', # get the offset as a literal number
             'D=A',
             f'@{self.symbols[self.get_memory_segment()]}', # select value at segment 0-index + offset
             'A=D+M',
@@ -485,7 +900,7 @@ class PushInstruction(MemoryInstruction):
     def get_constant(self):
         """Selects a constant value."""
         asm = [
-            f'@{self.get_offset()}',
+            '@{offset}',
             'D=A'
         ]
         return '\n'.join(asm)
@@ -501,13 +916,8 @@ class PushInstruction(MemoryInstruction):
 
         As a result, the offset cannot be greater than 1.
         """
-        offset = self.get_offset()
-
-        if int(offset) > self.POINTER_MAX:
-            raise TranslationError(f'at line {self.get_line_num()}. Offset may not be greater than {self.POINTER_MAX} for pointer')
-
         asm = [
-            f'@{self.POINTER_MAP[offset]}', # select THIS or THAT
+            f'@{self.POINTER_MAP[self.get_offset()]}', # select THIS or THAT
             'D=M' # copy the value stored in THIS or THAT
         ]
         return '\n'.join(asm)
@@ -521,7 +931,7 @@ class PushInstruction(MemoryInstruction):
         have static-overflow checking.
         """
         asm = [
-            f'@{self.get_file_name()}.{self.get_offset()}', # create asm variable called "static.i" (and selected it)
+            '@{file_name}.{offset}', # create asm variable called "static.i" (and selected it)
             'D=M' # get the value stored at that address
         ]
         return '\n'.join(asm)
@@ -532,14 +942,8 @@ class PushInstruction(MemoryInstruction):
 
         The specification says temp occupies addresses 5-12
         """
-
-        offset = self.get_offset()
-
-        if int(offset) > self.TEMP_MAX_OFFSET:
-            raise TranslationError(f'at line {self.get_line_num()}. Offset may not be greater than {self.TEMP_MAX_OFFSET} for temp')
-
         asm = [
-            f'@{self.get_offset()}', # get the offset as a literal number
+            '@{offset}', # get the offset as a literal number
             'D=A',
             f'@{self.TEMP_INDEX}', # select value at segment temp-index + offset
             'A=D+A',
@@ -567,10 +971,9 @@ class PushInstruction(MemoryInstruction):
 class PopInstruction(MemoryInstruction):
     """Generates the Hack ASM for a pop instruction."""
 
-    def __init__(self, line):
-        super().__init__(line)
-        self._asm = [
-            self.get_comment(),
+    def make_asm_template(self):
+        return [
+            self.make_comment_template(),
             self.get_segement_address(),
             '@SP',
             'AM=M-1', # deincrement stack-pointer & select new stack location
@@ -580,10 +983,58 @@ class PopInstruction(MemoryInstruction):
             'M=D' # store value from stack into memory segment
         ]
 
+    def get_cached_template_key(self, top_in_d):
+        # the address of a pop from D is written into the template
+        if top_in_d and self.segment != 'static':
+            return (top_in_d, type(self), self._line.tokens[0], self.segment, self.offset)
+        return super().get_cached_template_key(top_in_d)
+
+    def make_cached_asm_template(self, top_in_d):
+        if not top_in_d:
+            return super().make_cached_asm_template(top_in_d)
+
+        # the stack-pointer already points past the rest of the stack
+        return [self.make_comment_template(), self.store_d_in_segment()], False
+
+    def store_d_in_segment(self):
+        """Stores the value in D at the address of the segment and offset."""
+        seg = self.get_memory_segment()
+        offset = int(self.get_offset())
+
+        if seg == 'pointer':
+            asm = [f'@{self.POINTER_MAP[self.get_offset()]}']
+        elif seg == 'static':
+            asm = ['@{file_name}.{offset}']
+        elif seg == 'temp':
+            asm = [f'@{self.TEMP_INDEX + offset}']
+        elif seg not in self.symbols:
+            raise TranslationError(f'Error at line {self.get_line_num()}. Memory segement "{seg}" not recognized')
+        elif offset <= self.UNROLLED_OFFSET_MAX:
+            # step A to the address, D is not needed for it
+            asm = [f'@{self.symbols[seg]}', 'A=M+1' if offset else 'A=M'] + ['A=A+1'] * (offset - 1)
+        else:
+            return '\n'.join([
+                '@R13', # backup the value in R13
+                'M=D',
+                '@{offset}', # calculate addr = symbol + offset
+                'D=A',
+                f'@{self.symbols[seg]}',
+                'D=D+M',
+                '@R14', # store addr in R14
+                'M=D',
+                '@R13', # restore the value
+                'D=M',
+                '@R14', # store the value at addr
+                'A=M',
+                'M=D'
+            ])
+
+        return '\n'.join(asm + ['M=D'])
+
     def get_address_by_segment_name(self):
         """Get address for memory segment."""
         asm = [
-            f'@{self.get_offset()}', # get the offset as a literal number
+            '@{offset}', # get the offset as a literal number
             'D=A',
             f'@{self.symbols[self.get_memory_segment()]}', # calculate addr = symbol + offset
             'D=D+M',
@@ -603,13 +1054,8 @@ class PopInstruction(MemoryInstruction):
 
         As a result, the offset cannot be greater than 1.
         """
-        offset = self.get_offset()
-
-        if int(offset) > self.POINTER_MAX:
-            raise TranslationError(f'at line {self.get_line_num()}. Offset may not be greater than {self.POINTER_MAX} for pointer')
-
         asm = [
-            f'@{self.POINTER_MAP[offset]}', # select THIS or THAT
+            f'@{self.POINTER_MAP[self.get_offset()]}', # select THIS or THAT
             'D=A', # copy the address for THIS or THAT
             '@R13', # and backup into R13 (non-reserved register)
             'M=D'
@@ -625,7 +1071,7 @@ class PopInstruction(MemoryInstruction):
         have static-overflow checking
         """
         asm = [
-            f'@{self.get_file_name()}.{self.get_offset()}', # create asm variable called "static.i" (and selected it)
+            '@{file_name}.{offset}', # create asm variable called "static.i" (and selected it)
             'D=A', # copy that address in R13
             '@R13',
             'M=D'
@@ -638,14 +1084,8 @@ class PopInstruction(MemoryInstruction):
 
         The specification says temp occupies addresses 5-12
         """
-
-        offset = self.get_offset()
-
-        if int(offset) > self.TEMP_MAX_OFFSET:
-            raise TranslationError(f'at line {self.get_line_num()}. Offset may not be greater than {self.TEMP_MAX_OFFSET} for temp')
-
         asm = [
-            f'@{self.get_offset()}', # get the offset as a literal number
+            '@{offset}', # get the offset as a literal number
             'D=A',
             f'@{self.TEMP_INDEX}', # calculate addr = temp-index + offset
             'D=D+A',
@@ -674,9 +1114,13 @@ class PopInstruction(MemoryInstruction):
 class BootstrapInstruction():
     """Code for booting the program."""
 
+    def __init__(self, shared_calls=False, context=None):
+        self.shared_calls = shared_calls
+        self.context = context if context is not None else TranslationContext()
+
     def to_asm(self):
         # there technically is no calling function
-        FunctionBaseInstruction.calling_function = 'bootstrap'
+        self.context.calling_function = 'bootstrap'
 
         # must use a vm call instruction so function call stack
         # frame backup will occur
@@ -691,11 +1135,22 @@ class BootstrapInstruction():
             'D=A',
             '@SP',
             'M=D',
-            CallInstruction(call_ins).to_asm().rstrip(),
+            self.get_call_instruction(call_ins).to_asm().rstrip(),
             '// end bootstrap code'
         ]
         return '\n'.join(asm) + '\n'
 
+    def get_call_instruction(self, line):
+        """Selects the call instruction for the translation mode."""
+        if self.shared_calls:
+            return SharedCallInstruction(line, self.context)
+        return CallInstruction(line, self.context)
+
+class StackTopWriteBack():
+    """Writes the top of the stack from D back to the stack, where a block of cached instructions ends."""
+    def to_asm(self):
+        return '\n'.join(WRITE_BACK_STACK_TOP_ASM) + '\n'
+
 class EOFInstruction():
     """Infinite loop for the end of the program."""
     def to_asm(self):
@@ -706,3 +1161,153 @@ class EOFInstruction():
             '0;JMP'
         ]
         return '\n'.join(asm) + '\n'
+
+class SharedCallRoutine():
+    """
+    Shared routine which backs up the caller's frame and jumps to the called
+    function. Jumped to by SharedCallInstruction.
+    """
+    def to_asm(self):
+        asm = [
+            '\n// SHARED CALL ROUTINE',
+            f'({SHARED_CALL_LABEL})',
+            '// store return address',
+            '@R15',
+            'D=M',
+            '@SP',
+            'A=M',
+            'M=D',
+            '// backup local pointer',
+            '@LCL',
+            'D=M',
+            '@SP',
+            'AM=M+1',
+            'M=D',
+            '// backup argument pointer',
+            '@ARG',
+            'D=M',
+            '@SP',
+            'AM=M+1',
+            'M=D',
+            '// backup this pointer',
+            '@THIS',
+            'D=M',
+            '@SP',
+            'AM=M+1',
+            'M=D',
+            '// backup that pointer',
+            '@THAT',
+            'D=M',
+            '@SP',
+            'AM=M+1',
+            'M=D',
+            '// increment stack-pointer',
+            '@SP',
+            'MD=M+1',
+            '// set new argument 0 = stack-pointer - 5 - argument count',
+            '@5',
+            'D=D-A',
+            '@R14',
+            'D=D-M',
+            '@ARG',
+            'M=D',
+            '// jump to function definition',
+            '@R13',
+            'A=M',
+            '0;JMP'
+        ]
+        return '\n'.join(asm) + '\n'
+
+class SharedReturnRoutine():
+    """Shared routine for returning to the caller. Jumped to by SharedReturnInstruction."""
+    def to_asm(self):
+        asm = [
+            '\n// SHARED RETURN ROUTINE',
+            f'({SHARED_RETURN_LABEL})'
+        ] + make_return_asm()
+        return '\n'.join(asm) + '\n'
+
+class SharedComparisonRoutine():
+    """
+    Shared routine for an 'eq', 'gt' or 'lt' comparison, which returns to the
+    address stored in R13.
+
+    With top_in_d, the top of the stack is passed in R14 and the result is
+    left in D, for the mode which keeps the top of the stack in D.
+    """
+
+    LABELS = {
+        'eq': '$$EQ',
+        'gt': '$$GT',
+        'lt': '$$LT'
+    }
+
+    JUMPS = {
+        'eq': 'JEQ',
+        'gt': 'JGT',
+        'lt': 'JLT'
+    }
+
+    def __init__(self, command, top_in_d=False):
+        self.command = command
+        self.top_in_d = top_in_d
+
+    @classmethod
+    def get_label(cls, command, top_in_d=False):
+        """Returns the label of the routine for a comparison."""
+        label = cls.LABELS[command]
+        return f'{label}.D' if top_in_d else label
+
+    def to_asm(self):
+        label = self.get_label(self.command, self.top_in_d)
+        if self.top_in_d:
+            return self.make_top_in_d_asm(label)
+
+        asm = [
+            f'\n// SHARED {self.command.upper()} ROUTINE',
+            f'({label})',
+            '@R13', # backup the return address
+            'M=D',
+            '@SP', # deincrement stack-pointer & select new stack location
+            'AM=M-1',
+            'D=M', # copy value at stack-pointer
+            'A=A-1', # select position below stack-pointer
+            'D=M-D', # diff selected values
+            'M=-1', # set to true
+            f'@{label}.TRUE', # if the comparison holds, keep true
+            f'D;{self.JUMPS[self.command]}',
+            '@SP', # else, set to false
+            'A=M-1',
+            'M=0',
+            f'({label}.TRUE)',
+            '@R13', # jump to the return address
+            'A=M',
+            '0;JMP'
+        ]
+        return '\n'.join(asm) + '\n'
+
+    def make_top_in_d_asm(self, label):
+        """Generates the ASM of the routine which compares with the value in R14 and leaves the result in D."""
+        asm = [
+            f'\n// SHARED {self.command.upper()} ROUTINE (TOP OF STACK IN D)',
+            f'({label})',
+            '@R13', # backup the return address
+            'M=D',
+            '@SP', # deincrement stack-pointer & select the value below the top
+            'AM=M-1',
+            'D=M',
+            '@R14', # diff with the top of the stack
+            'D=D-M',
+            f'@{label}.TRUE', # if the comparison holds, return true
+            f'D;{self.JUMPS[self.command]}',
+            'D=0', # else, return false
+            '@R13',
+            'A=M',
+            '0;JMP',
+            f'({label}.TRUE)',
+            'D=-1',
+            '@R13', # jump to the return address
+            'A=M',
+            '0;JMP'
+        ]
+        return '\n'.join(asm) + '\n'
@@ -1,4 +1,4 @@
-from constants import ARITHMETIC_LOGICAL_INS_MAP, BRANCH_INS_MAP, FUNCTION_INS_MAP, MEMORY_INS_MAP, MEMORY_SEGMENTS
+from constants import ARITHMETIC_LOGICAL_INS_MAP, BRANCH_INS_MAP, FUNCTION_INS_MAP, MEMORY_INS_MAP, MEMORY_SEGMENTS, SHARED_COMPARISON_INS_MAP, SHARED_FUNCTION_INS_MAP
 from exceptions import ParseError
 
 def tokenize(raw_line):
@@ -25,20 +25,34 @@ def check_offset(line, cmd_2):
     except ValueError:
         raise ParseError(f'Invalid vm instruction at {line.file_name}:{line.line_num}\n\n{line}\n\n"{cmd_2}" is not a valid offset.')
 
-def parse_instruction(line):
-    """Parses the line and returns the associated instruction object."""
+def parse_instruction(line, shared_calls=False, shared_comparisons=False, context=None):
+    """
+    Parses the line and returns the associated instruction object.
+
+    With shared_calls, call and return instructions jump to the shared
+    call and return routines. With shared_comparisons, eq, gt and lt
+    instructions jump to a shared routine for the comparison.
+
+    The instruction reads and updates the function scope of the context,
+    without one the line is parsed in a scope of its own.
+    """
 
     line.tokens = tokenize(line.raw_line)
     token_count = len(line.tokens)
 
+    function_ins_map = SHARED_FUNCTION_INS_MAP if shared_calls else FUNCTION_INS_MAP
+
     # arithmetic/logical commands + function returns
     if token_count == 1:
         cmd = line.tokens[0].lower()
-        if cmd in ARITHMETIC_LOGICAL_INS_MAP:
-            return ARITHMETIC_LOGICAL_INS_MAP[cmd](line)
+        if shared_comparisons and cmd in SHARED_COMPARISON_INS_MAP:
+            return SHARED_COMPARISON_INS_MAP[cmd](line, context)
+
+        elif cmd in ARITHMETIC_LOGICAL_INS_MAP:
+            return ARITHMETIC_LOGICAL_INS_MAP[cmd](line, context)
 
-        elif cmd in FUNCTION_INS_MAP:
-            return FUNCTION_INS_MAP[cmd](line)
+        elif cmd in function_ins_map:
+            return function_ins_map[cmd](line, context)
 
         else:
             raise ParseError(f'Invalid vm instruction at {line.file_name}:{line.line_num}\n\n{line}\n\n"{cmd}" is not a valid arithmetic/logical command.')
@@ -49,7 +63,7 @@ def parse_instruction(line):
         if cmd_0 not in BRANCH_INS_MAP:
             raise ParseError(f'Invalid vm instruction at {line.file_name}:{line.line_num}\n\n{line}\n\n"{cmd_0}" is not a valid branching command.')
 
-        return BRANCH_INS_MAP[cmd_0](line)
+        return BRANCH_INS_MAP[cmd_0](line, context)
 
     # memory commands + function declarations / calls
     elif token_count == 3:
@@ -62,11 +76,11 @@ def parse_instruction(line):
 
             check_offset(line, line.tokens[2])
 
-            return MEMORY_INS_MAP[cmd_0](line)
+            return MEMORY_INS_MAP[cmd_0](line, context)
 
-        elif cmd_0 in FUNCTION_INS_MAP:
+        elif cmd_0 in function_ins_map:
             check_offset(line, line.tokens[2])
-            return FUNCTION_INS_MAP[cmd_0](line)
+            return function_ins_map[cmd_0](line, context)
 
         else:
             raise ParseError(f'Invalid vm instruction at {line.file_name}:{line.line_num}\n\n{line}\n\n"{cmd_0}" is not a valid memory command.')
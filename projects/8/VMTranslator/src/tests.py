@@ -1,10 +1,19 @@
+import tempfile
 import unittest
+from array import array
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import instructions as ins
-from exceptions import ParseError, TranslationError, VMTranslatorError
-from file_util import get_input_lines, get_vm_files, Line
+from call_graph import build_call_graph, find_live_functions
+from batch_emulator import BatchHackEmulator, np
+from emulator import assemble, HackEmulator
+from exceptions import AssemblyError, ParseError, TranslationError, VMTranslatorError
+from file_util import AsmFileWriter, count_asm_lines, count_rom_instructions, get_input_lines, get_vm_files, Line, read_input_lines
 from parser import check_offset, parse_instruction, tokenize
+from translator import (count_comparison_lines_saved, count_dead_function_rom, RoutineUsage, scan_vm_file, translate, translate_files_in_parallel, translate_lines,
+                        translate_program)
 
 class TestInstructions(unittest.TestCase):
 
@@ -24,6 +33,26 @@ class TestInstructions(unittest.TestCase):
         with self.assertRaises(TranslationError):
             parse_instruction(Line('test', 'pop pointer 5'))
 
+    def test_get_temp_push_invalid_offset(self):
+        """Verify error checking in push temp."""
+        with self.assertRaises(TranslationError):
+            parse_instruction(Line('test', 'push temp 9'))
+
+    def test_asm_template_substitute(self):
+        """Placeholders are replaced by their values."""
+        template = ins.AsmTemplate(['// {name}', '@{name}.{offset}', 'D=M'])
+        output = template.substitute({'name': 'Main', 'offset': '2'})
+        self.assertEqual(output, '// Main\n@Main.2\nD=M\n')
+
+    def test_template_shared_by_instructions(self):
+        """Instructions with the same key share a template but keep their own values."""
+        first = parse_instruction(Line('First', 'push static 1'))
+        second = parse_instruction(Line('Second', 'push static 2'))
+        self.assertEqual(first.get_template_key(), second.get_template_key())
+        self.assertIn('@First.1\n', first.to_asm())
+        self.assertIn('@Second.2\n', second.to_asm())
+        self.assertEqual(first.to_asm().replace('First.1', 'Second.2').replace('static 1', 'static 2'), second.to_asm())
+
 class TestParser(unittest.TestCase):
 
     def test_tokenize(self):
@@ -146,6 +175,23 @@ class TestParser(unittest.TestCase):
         output = parse_instruction(Line('test', 'return'))
         self.assertIsInstance(output, ins.ReturnInstruction)
 
+    def test_parse_instruction_shared_call(self):
+        """Test call command with shared calls"""
+        output = parse_instruction(Line('test', 'call MyFunc 1'), shared_calls=True)
+        self.assertIsInstance(output, ins.SharedCallInstruction)
+
+    def test_parse_instruction_shared_comparison(self):
+        """Test comparison commands with shared comparisons"""
+        for command in ['eq', 'gt', 'lt']:
+            output = parse_instruction(Line('test', command), shared_comparisons=True)
+            self.assertIsInstance(output, ins.SharedComparisonInstruction)
+            self.assertEqual(output.command, command)
+
+    def test_parse_instruction_shared_return(self):
+        """Test return command with shared calls"""
+        output = parse_instruction(Line('test', 'return'), shared_calls=True)
+        self.assertIsInstance(output, ins.SharedReturnInstruction)
+
     def test_parse_instruction_push(self):
         """Test push command"""
         output = parse_instruction(Line('test', 'push static 1'))
@@ -181,6 +227,322 @@ class TestParser(unittest.TestCase):
         with self.assertRaises(ParseError):
             parse_instruction(Line('test', 'function myfunction -1'))
 
+class TestTranslator(unittest.TestCase):
+
+    def test_translate_lines_matches_translate(self):
+        """The streamed ASM is the same as the translated list."""
+        vm_files, _ = get_vm_files('../../test_files/FibonacciElement')
+        lines, count = get_input_lines(vm_files)
+        streamed = translate_lines(read_input_lines(vm_files), len(vm_files))
+        self.assertEqual(list(streamed), translate(lines, count))
+
+    def test_translate_shared_calls(self):
+        """Shared routines are written once and the program gets smaller."""
+        vm_files, _ = get_vm_files('../../test_files/FibonacciElement')
+
+        lines, count = get_input_lines(vm_files)
+        inline_asm = translate(lines, count)
+
+        lines, count = get_input_lines(vm_files)
+        shared_asm = translate(lines, count, shared_calls=True)
+
+        output = ''.join(shared_asm)
+        self.assertEqual(output.count(f'({ins.SHARED_CALL_LABEL})'), 1)
+        self.assertEqual(output.count(f'({ins.SHARED_RETURN_LABEL})'), 1)
+        self.assertLess(count_rom_instructions(shared_asm), count_rom_instructions(inline_asm))
+
+    def test_translate_shared_comparisons(self):
+        """Each comparison routine used is written once and the ASM gets smaller."""
+        lines = [Line('test', l) for l in ['push constant 1', 'push constant 2', 'lt', 'push constant 1', 'push constant 2', 'lt', 'eq']]
+        inline_asm = translate(lines)
+        shared_asm = translate(lines, shared_comparisons=True)
+
+        output = ''.join(shared_asm)
+        self.assertEqual(output.count('($$LT)'), 1)
+        self.assertEqual(output.count('($$EQ)'), 1)
+        self.assertNotIn('($$GT)', output)
+        self.assertLess(count_asm_lines(shared_asm), count_asm_lines(inline_asm))
+
+    def test_count_comparison_lines_saved(self):
+        """The lines saved by the shared comparisons are counted from the shared translation alone."""
+        raw_lines = ['push constant 1', 'push constant 2', 'lt', 'push constant 1', 'push constant 2', 'lt', 'eq', 'not', 'gt']
+        for cache_stack_top in [False, True]:
+            with self.subTest(cache_stack_top=cache_stack_top):
+                lines = [Line('test', l) for l in raw_lines]
+                inline_count = count_asm_lines(translate_lines(lines, cache_stack_top=cache_stack_top))
+                routine_usage = RoutineUsage()
+                lines = [Line('test', l) for l in raw_lines]
+                shared_count = count_asm_lines(translate_lines(lines, shared_comparisons=True, cache_stack_top=cache_stack_top,
+                                                               routine_usage=routine_usage))
+                self.assertEqual(sum(routine_usage.comparison_sites.values()), 4)
+                self.assertEqual(count_comparison_lines_saved(routine_usage, cache_stack_top), inline_count - shared_count)
+
+    def test_translate_shared_calls_without_functions(self):
+        """Shared routines are not written when nothing jumps to them."""
+        vm_files, _ = get_vm_files('../../test_files/BasicLoop')
+        lines, count = get_input_lines(vm_files)
+        output = ''.join(translate(lines, count, shared_calls=True))
+        self.assertNotIn(ins.SHARED_CALL_LABEL, output)
+        self.assertNotIn(ins.SHARED_RETURN_LABEL, output)
+
+    def test_translate_files_in_parallel_matches_serial(self):
+        """Translating each file in a worker process gives the same ASM as the serial translation."""
+        vm_files, _ = get_vm_files('../../test_files/FibonacciElement')
+        for shared_calls, shared_comparisons in [(False, False), (True, True)]:
+            serial = ''.join(translate_lines(read_input_lines(vm_files), len(vm_files), shared_calls, shared_comparisons))
+            parallel = ''.join(translate_files_in_parallel(vm_files, 2, shared_calls, shared_comparisons))
+            self.assertEqual(parallel, serial)
+
+    def test_translate_cache_stack_top_in_parallel_matches_serial(self):
+        """The top of the stack is written back at the end of each file, so the files can be translated on their own."""
+        vm_files, _ = get_vm_files('../../test_files/FibonacciElement')
+        serial = ''.join(translate_lines(read_input_lines(vm_files), len(vm_files), cache_stack_top=True))
+        parallel = ''.join(translate_files_in_parallel(vm_files, 2, cache_stack_top=True))
+        self.assertEqual(parallel, serial)
+
+    def test_translate_program_in_threads(self):
+        """Programs translated in several threads at once are the same as when translated alone."""
+        programs = ['FibonacciElement', 'NestedCall', 'StaticsTest', 'BasicLoop']
+        vm_files = [get_vm_files(f'../../test_files/{program}')[0] for program in programs]
+        expected = [translate_program(files) for files in vm_files]
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(translate_program, vm_files * 4))
+
+        self.assertEqual(results, expected * 4)
+
+    def test_translate_does_not_share_function_scope(self):
+        """A translation does not start in the last function of the translation before it."""
+        lines = [Line('test', 'label LOOP')]
+        first = translate(lines)
+        translate([Line('test', 'function Main.main 0')])
+        self.assertEqual(translate(lines), first)
+        self.assertIn('(test$LOOP)', ''.join(first))
+
+    def test_scan_vm_file(self):
+        """All lines are counted and the last function declared is found."""
+        path = Path('../../test_files/FibonacciElement/Main.vm')
+        line_count, last_function = scan_vm_file(path)
+        self.assertEqual(line_count, len(path.read_text().splitlines()))
+        self.assertEqual(last_function, 'Main.fibonacci')
+
+class TestCallGraph(unittest.TestCase):
+
+    def make_lines(self):
+        sys_lines = ['function Sys.init 0', 'call Main.main 0', 'label HALT', 'goto HALT']
+        main_lines = [
+            'function Main.main 0', 'call Main.used 0', 'return',
+            'function Main.used 0', 'push constant 1', 'return',
+            'function Main.unused 0', 'call Main.used 0', 'push constant 1', 'push constant 2', 'eq', 'return'
+        ]
+        return [Line('Sys', l) for l in sys_lines] + [Line('Main', l) for l in main_lines]
+
+    def test_build_call_graph(self):
+        """Each function maps to the functions it calls."""
+        call_graph = build_call_graph(self.make_lines())
+        self.assertEqual(call_graph['Sys.init'], {'Main.main'})
+        self.assertEqual(call_graph['Main.unused'], {'Main.used'})
+        self.assertEqual(call_graph[None], set())
+
+    def test_find_live_functions(self):
+        """Only functions reached from Sys.init are live."""
+        live_functions = find_live_functions(build_call_graph(self.make_lines()))
+        self.assertEqual(live_functions, {'Sys.init', 'Main.main', 'Main.used'})
+
+    def test_find_live_functions_without_entry(self):
+        """Every function is kept when there is no Sys.init."""
+        self.assertIsNone(find_live_functions(build_call_graph([Line('Main', 'function Main.main 0')])))
+
+    def test_translate_without_dead_functions(self):
+        """Dead functions are not translated and the labels of the others do not change."""
+        lines = self.make_lines()
+        live_functions = find_live_functions(build_call_graph(lines))
+        full_asm = ''.join(translate(lines, 2, shared_comparisons=True))
+        asm = ''.join(translate_lines(self.make_lines(), 2, shared_comparisons=True, live_functions=live_functions))
+
+        self.assertNotIn('(Main.unused)', asm)
+        self.assertNotIn('($$EQ)', asm)
+        self.assertIn('(Main.used)', asm)
+        self.assertIn('Sys.init$HALT', asm)
+        self.assertTrue(asm.startswith(full_asm.split('// function Main.unused')[0]))
+
+    def test_count_dead_function_rom(self):
+        """The ROM words removed are counted from the dead functions and the routines only they jump to."""
+        live_functions = find_live_functions(build_call_graph(self.make_lines()))
+        for shared_calls, cache_stack_top in [(False, False), (True, False), (True, True)]:
+            with self.subTest(shared_calls=shared_calls, cache_stack_top=cache_stack_top):
+                full_rom_size = count_rom_instructions(translate_lines(self.make_lines(), 2, shared_calls, True, cache_stack_top=cache_stack_top))
+                routine_usage = RoutineUsage()
+                rom_size = count_rom_instructions(translate_lines(self.make_lines(), 2, shared_calls, True, live_functions, cache_stack_top,
+                                                                  routine_usage))
+                removed = count_dead_function_rom(self.make_lines(), live_functions, routine_usage, shared_calls, True, cache_stack_top)
+                self.assertEqual(rom_size + removed, full_rom_size)
+
+class TestEmulator(unittest.TestCase):
+
+    def run_vm_lines(self, vm_lines, **kwargs):
+        """Translates and runs VM lines with the stack starting at 256."""
+        asm = ''.join(translate([Line('test', l) for l in vm_lines], **kwargs))
+        emulator = HackEmulator.from_asm(asm)
+        emulator.ram[0] = 256
+        emulator.run(max_cycles=10_000)
+        return emulator
+
+    def test_assemble(self):
+        """Hack ASM is assembled into the machine words of the Hack specification."""
+        rom, _ = assemble('// Add.asm\n@2\nD=A\n@3\nD=D+A\n@0\nM=D\n')
+        self.assertEqual(list(rom), [0b10, 0b1110110000010000, 0b11, 0b1110000010010000, 0b0, 0b1110001100001000])
+
+    def test_assemble_symbols(self):
+        """Labels point to the next instruction and new symbols are variables from 16."""
+        rom, symbols = assemble('@i\nM=1\n(LOOP)\n@LOOP\n0;JMP\n@SP\n')
+        self.assertEqual(symbols['LOOP'], 2)
+        self.assertEqual(list(rom)[0::2], [16, 2, 0])
+
+    def test_assemble_invalid_computation(self):
+        with self.assertRaises(AssemblyError):
+            assemble('D=D*A')
+
+    def test_run_arithmetic(self):
+        """The translated program halts at the EOF loop with the result on the stack."""
+        emulator = self.run_vm_lines(['push constant 7', 'push constant 8', 'add', 'push constant 20', 'sub', 'neg'])
+        self.assertTrue(emulator.halted)
+        self.assertEqual(emulator.ram[0], 257)
+        self.assertEqual(emulator.ram[256], 5)
+
+    def test_run_comparisons(self):
+        """True is -1 and false is 0, with inline and shared comparisons."""
+        vm_lines = ['push constant 1', 'push constant 2', 'lt', 'push constant 1', 'push constant 2', 'gt', 'push constant 3', 'push constant 3', 'eq']
+        for shared_comparisons in [False, True]:
+            emulator = self.run_vm_lines(vm_lines, shared_comparisons=shared_comparisons)
+            self.assertEqual(list(emulator.ram[256:259]), [0xFFFF, 0, 0xFFFF])
+
+    def test_run_shared_comparisons_cache_stack_top(self):
+        """Shared comparisons with the top of the stack in D give the same results in fewer ROM words."""
+        vm_lines = [
+            'push constant 1', 'push constant 2', 'lt', 'push constant 5', 'pop temp 0', 'push constant 1', 'push temp 0', 'gt',
+            'push constant 3', 'push constant 3', 'eq', 'push constant 2', 'push constant 1', 'gt', 'and', 'not'
+        ]
+        for shared_comparisons in [False, True]:
+            emulator = self.run_vm_lines(vm_lines, shared_comparisons=shared_comparisons, cache_stack_top=True)
+            self.assertEqual(emulator.ram[0], 259)
+            self.assertEqual(list(emulator.ram[256:259]), [0xFFFF, 0, 0])
+
+        rom_sizes = [count_rom_instructions(translate([Line('test', l) for l in vm_lines * 8], shared_comparisons=shared_comparisons, cache_stack_top=True))
+                     for shared_comparisons in [False, True]]
+        self.assertLess(rom_sizes[1], rom_sizes[0])
+
+    def test_run_FibonacciElement(self):
+        """The bootstrap calls Sys.init, which computes fibonacci(4) and loops forever."""
+        vm_files, _ = get_vm_files('../../test_files/FibonacciElement')
+        for shared_calls, cache_stack_top in [(False, False), (True, False), (False, True), (True, True)]:
+            emulator = HackEmulator.from_asm(translate_program(vm_files, shared_calls, cache_stack_top=cache_stack_top))
+            emulator.run(max_cycles=100_000)
+            self.assertTrue(emulator.halted)
+            self.assertEqual(emulator.ram[0], 262)
+            self.assertEqual(emulator.ram[261], 3)
+
+    def test_run_cache_stack_top(self):
+        """Keeping the top of the stack in D gives the same stack and segments in fewer cycles."""
+        vm_lines = [
+            'push constant 3000', 'pop pointer 0', 'push constant 3010', 'pop pointer 1',
+            'push constant 7', 'push constant 8', 'add', 'pop local 0',
+            'push constant 9', 'neg', 'pop local 12',
+            'push local 0', 'push constant 5', 'sub', 'pop this 2',
+            'push constant 6', 'push constant 3', 'lt', 'not', 'pop that 0',
+            'push constant 1', 'push constant 1', 'eq', 'push constant 2', 'push constant 1', 'gt', 'and', 'pop temp 3',
+            'push constant 12', 'push constant 10', 'or', 'pop static 1',
+            'push local 0', 'push constant 15', 'eq', 'if-goto DONE', 'push constant 99', 'pop local 1',
+            'label DONE',
+            'push this 2', 'push that 0', 'push temp 3', 'push static 1'
+        ]
+        emulators = []
+        for cache_stack_top in [False, True]:
+            emulator = HackEmulator.from_asm(''.join(translate([Line('test', l) for l in vm_lines], cache_stack_top=cache_stack_top)))
+            emulator.ram[0:3] = array('H', [256, 300, 400])
+            emulator.run(max_cycles=10_000)
+            self.assertTrue(emulator.halted)
+            emulators.append(emulator)
+
+        default, cached = emulators
+        self.assertEqual(list(cached.ram[300:313]), [15] + [0] * 11 + [0xFFF7])
+        self.assertEqual(list(cached.ram[256:260]), [10, 0xFFFF, 0xFFFF, 14])
+        for start, end in [(0, 5), (5, 13), (16, 17), (256, 260), (300, 313), (3000, 3003), (3010, 3011)]:
+            self.assertEqual(list(cached.ram[start:end]), list(default.ram[start:end]))
+        self.assertLess(cached.cycles, default.cycles)
+
+    def test_run_jump_uses_previous_address(self):
+        """A jump goes to the address in A from before the instruction, like the Hack CPU."""
+        emulator = HackEmulator.from_asm('@4\nA=A+1;JMP\n@SP\n0;JMP\n@R1\nM=1\n')
+        emulator.run(max_cycles=4)
+        self.assertEqual(emulator.ram[1], 1)
+
+    def test_run_max_cycles(self):
+        """The program stops after max_cycles and can be run again from there."""
+        emulator = HackEmulator.from_asm('(LOOP)\n@SP\nM=M+1\n@LOOP\n0;JMP\n')
+        self.assertEqual(emulator.run(max_cycles=8), 8)
+        self.assertFalse(emulator.halted)
+        self.assertEqual(emulator.ram[0], 2)
+        emulator.run(max_cycles=4)
+        self.assertEqual(emulator.cycles, 12)
+        self.assertEqual(emulator.ram[0], 3)
+
+class TestBatchEmulator(unittest.TestCase):
+
+    # sums n, n-1, ..., 1 for n = RAM[3000] & 31 and compares RAM[3002] with RAM[3003]
+    VM_LINES = [
+        'function Sys.init 2', 'push constant 3000', 'pop pointer 1', 'push that 0', 'push constant 31', 'and', 'pop local 0',
+        'push constant 0', 'pop local 1', 'label LOOP', 'push local 0', 'push constant 0', 'eq', 'if-goto END',
+        'push local 1', 'push local 0', 'add', 'pop local 1', 'push local 0', 'push constant 1', 'sub', 'pop local 0', 'goto LOOP',
+        'label END', 'push local 1', 'pop that 1', 'push that 2', 'push that 3', 'lt', 'pop that 4', 'label HALT', 'goto HALT'
+    ]
+
+    def translate_vm_lines(self, **kwargs):
+        return ''.join(translate([Line('Sys', l) for l in self.VM_LINES], 2, **kwargs))
+
+    @unittest.skipIf(np is None, 'NumPy is not installed')
+    def test_batch_matches_single(self):
+        """Each machine ends in the same state as when it is run on its own."""
+        asm = self.translate_vm_lines()
+        batch = BatchHackEmulator.from_asm(asm, machine_count=32)
+        batch.randomize_ram(3000, 3004, seed=1)
+        initial_ram = batch.ram.copy()
+        batch.run(max_cycles=100_000)
+
+        self.assertTrue(batch.halted.all())
+        for i in range(batch.machine_count):
+            emulator = HackEmulator.from_asm(asm)
+            emulator.ram[3000:3004] = array('H', initial_ram[i, 3000:3004].tolist())
+            emulator.run(max_cycles=100_000)
+            self.assertEqual(emulator.cycles, batch.cycles[i])
+            self.assertEqual(list(emulator.ram[3000:3005]), batch.ram[i, 3000:3005].tolist())
+
+    @unittest.skipIf(np is None, 'NumPy is not installed')
+    def test_batch_translations_agree(self):
+        """Shared calls and comparisons give the same results as the default translation."""
+        results = []
+        for kwargs in [{}, {'shared_calls': True, 'shared_comparisons': True}]:
+            batch = BatchHackEmulator.from_asm(self.translate_vm_lines(**kwargs), machine_count=64)
+            batch.randomize_ram(3000, 3004, seed=2)
+            batch.run(max_cycles=100_000)
+            self.assertTrue(batch.halted.all())
+            results.append(batch.ram[:, 3000:3005].tolist())
+
+        self.assertEqual(results[0], results[1])
+
+    @unittest.skipIf(np is None, 'NumPy is not installed')
+    def test_batch_max_cycles(self):
+        """Each machine stops after max_cycles."""
+        batch = BatchHackEmulator.from_asm(self.translate_vm_lines(), machine_count=8)
+        batch.randomize_ram(3000, 3004, seed=3)
+        batch.run(max_cycles=300)
+        self.assertEqual(batch.cycles.tolist(), [300] * 8)
+
+    def test_batch_requires_numpy(self):
+        with mock.patch('batch_emulator.np', None):
+            with self.assertRaises(VMTranslatorError):
+                BatchHackEmulator.from_asm('@SP\n')
+
 class TestFileUtil(unittest.TestCase):
 
     def test_line_is_empty(self):
@@ -193,6 +555,38 @@ class TestFileUtil(unittest.TestCase):
         l = Line('test', '// comment')
         self.assertTrue(l.is_comment())
 
+    def test_count_rom_instructions(self):
+        """Labels and comments are not counted."""
+        asm = ['// comment\n(LABEL)\n@LABEL\n0;JMP\n', '\n@SP\n']
+        self.assertEqual(count_rom_instructions(asm), 3)
+
+    def test_read_input_lines_is_lazy(self):
+        """Files are not opened until their lines are needed."""
+        lines = read_input_lines([Path('../../test_files/NestedCall/Sys.vm'), Path('missing.vm')])
+        self.assertIsInstance(next(lines), Line)
+
+    def test_asm_file_writer_chunks(self):
+        """Writing in chunks gives the same file as writing all at once."""
+        asm = ['// comment\n@SP\n', '(LABEL)\n@LABEL\n0;JMP\n', '\n@SP\nM=M+1\n']
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output_path = Path(temp_dir, 'Test.asm')
+            writer = AsmFileWriter(output_path, chunk_size=2)
+            writer.write_all(iter(asm))
+            self.assertEqual(output_path.read_text(), ''.join(asm))
+            self.assertEqual(writer.line_count, count_asm_lines(asm))
+            self.assertEqual(writer.rom_size, count_rom_instructions(asm))
+
+    def test_asm_file_writer_parse_error(self):
+        """A parse error part way through the translation leaves no ASM file."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            vm_path = Path(temp_dir, 'Test.vm')
+            vm_path.write_text('push constant 1\n' * 3000 + 'foo bar\n')
+            output_path = Path(temp_dir, 'Test.asm')
+            writer = AsmFileWriter(output_path)
+            with self.assertRaises(VMTranslatorError):
+                writer.write_all(translate_lines(read_input_lines([vm_path]), 1))
+            self.assertEqual(sorted(path.name for path in Path(temp_dir).iterdir()), ['Test.vm'])
+
     def test_get_input_lines_success_NestedCall(self):
         """Test get_input_lines returns data from NestedCall/Sys.vm."""
         paths = [Path('../../test_files/NestedCall/Sys.vm')]
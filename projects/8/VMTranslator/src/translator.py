@@ -1,28 +1,307 @@
-from instructions import BootstrapInstruction, EOFInstruction
-from parser import parse_instruction
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
 
-def translate(input_lines, file_count=1):
-    """Parses and converts Jack VM commands into Hack ASM."""
+from call_graph import get_declared_function
+from file_util import count_asm_lines, count_rom_instructions, Line, read_input_lines
+from instructions import (BootstrapInstruction, EOFInstruction, SharedCallInstruction, SharedCallRoutine, SharedComparisonInstruction,
+                          SharedComparisonRoutine, SharedReturnInstruction, SharedReturnRoutine, StackTopWriteBack, TranslationContext)
+from parser import parse_instruction, tokenize
 
-    instructions = []
+class RoutineUsage():
+    """Tracks which shared routines are jumped to by the translated instructions."""
+
+    def __init__(self, uses_call_routine=False):
+        self.uses_call_routine = uses_call_routine
+        self.uses_return_routine = False
+        # (command, whether the top of the stack is in D) of each comparison routine
+        self.comparison_routines = set()
+        # number of shared comparisons by (command, whether the top of the stack was in D before it)
+        self.comparison_sites = Counter()
+
+    def add(self, ins, cache_stack_top=False, top_in_d=False):
+        """Records the shared routine an instruction jumps to, if any."""
+        if isinstance(ins, SharedCallInstruction):
+            self.uses_call_routine = True
+        elif isinstance(ins, SharedReturnInstruction):
+            self.uses_return_routine = True
+        elif isinstance(ins, SharedComparisonInstruction):
+            self.comparison_routines.add((ins.command, cache_stack_top))
+            self.comparison_sites[(ins.command, top_in_d)] += 1
+
+    def update(self, other):
+        """Adds the routines used by another translation, such as a single file."""
+        self.uses_call_routine = self.uses_call_routine or other.uses_call_routine
+        self.uses_return_routine = self.uses_return_routine or other.uses_return_routine
+        self.comparison_routines |= other.comparison_routines
+        self.comparison_sites += other.comparison_sites
+
+    def difference(self, other):
+        """Returns the routines used by this translation but not by another one."""
+        routine_usage = RoutineUsage(self.uses_call_routine and not other.uses_call_routine)
+        routine_usage.uses_return_routine = self.uses_return_routine and not other.uses_return_routine
+        routine_usage.comparison_routines = self.comparison_routines - other.comparison_routines
+        return routine_usage
+
+    def to_asm(self):
+        """Yields the ASM of each routine used, in a fixed order."""
+        if self.uses_call_routine:
+            yield SharedCallRoutine().to_asm()
+        if self.uses_return_routine:
+            yield SharedReturnRoutine().to_asm()
+
+        for command in SharedComparisonRoutine.LABELS:
+            for top_in_d in [False, True]:
+                if (command, top_in_d) in self.comparison_routines:
+                    yield SharedComparisonRoutine(command, top_in_d).to_asm()
+
+def init_routine_usage(routine_usage, uses_call_routine):
+    """Returns the RoutineUsage passed to a translation, or a new one, with the bootstrap's use of the call routine."""
+    if routine_usage is None:
+        return RoutineUsage(uses_call_routine)
+
+    routine_usage.uses_call_routine = routine_usage.uses_call_routine or uses_call_routine
+    return routine_usage
+
+def count_comparison_lines_saved(routine_usage, cache_stack_top=False):
+    """
+    Returns the number of ASM lines the shared comparison routines saved in a
+    translation. Each comparison saves the inline ASM less its jump to the
+    routine, and each routine used is written once.
+    """
+    saved = 0
+    for (command, top_in_d), count in routine_usage.comparison_sites.items():
+        line = Line('', command)
+        inline_ins = parse_instruction(line)
+        shared_ins = parse_instruction(line, shared_comparisons=True)
+        if cache_stack_top:
+            inline_asm, _ = inline_ins.to_cached_asm(top_in_d)
+            shared_asm, _ = shared_ins.to_cached_asm(top_in_d)
+        else:
+            inline_asm = inline_ins.to_asm()
+            shared_asm = shared_ins.to_asm()
+        saved += count * (count_asm_lines([inline_asm]) - count_asm_lines([shared_asm]))
+
+    for command, top_in_d in routine_usage.comparison_routines:
+        saved -= count_asm_lines([SharedComparisonRoutine(command, top_in_d).to_asm()])
+
+    return saved
+
+def find_function_scopes(numbered_lines):
+    """
+    Yields each numbered line with the function it is part of, or None before
+    the first declaration of its file. A function body ends at the next
+    declaration or at the end of its file.
+    """
+    function = None
+    file_name = None
+
+    for line_num, line in numbered_lines:
+
+        if line.file_name != file_name:
+            file_name = line.file_name
+            function = None
+
+        if line.raw_line[:8].lower() == 'function':
+            declared_function = get_declared_function(tokenize(line.raw_line))
+            if declared_function is not None:
+                function = declared_function
+
+        yield function, line_num, line
+
+def skip_dead_functions(numbered_lines, live_functions, context):
+    """
+    Yields the numbered lines which are not part of a function missing from
+    live_functions.
+
+    The function scope is still updated by the skipped declarations, so the
+    labels of the remaining lines are the same as in the full translation.
+    """
+    for function, line_num, line in find_function_scopes(numbered_lines):
+        if function is None or function in live_functions:
+            yield line_num, line
+        else:
+            context.calling_function = function
+
+def count_dead_function_rom(input_lines, live_functions, routine_usage, shared_calls=False, shared_comparisons=False, cache_stack_top=False):
+    """
+    Returns the number of ROM words removed with the functions missing from
+    live_functions. Only the dead functions are translated, and the shared
+    routines which no function in the routine_usage of the translation jumps
+    to are counted as well.
+    """
+    dead_lines = (line for function, _, line in find_function_scopes(enumerate(input_lines, 1))
+                  if function is not None and function not in live_functions)
+
+    dead_routine_usage = RoutineUsage()
+    rom_size = count_rom_instructions(translate_instructions(dead_lines, dead_routine_usage, TranslationContext(), shared_calls,
+                                                             shared_comparisons, cache_stack_top=cache_stack_top))
+    return rom_size + count_rom_instructions(dead_routine_usage.difference(routine_usage).to_asm())
+
+def translate_instructions(input_lines, routine_usage, context, shared_calls=False, shared_comparisons=False, line_offset=0, live_functions=None,
+                           cache_stack_top=False):
+    """
+    Yields the ASM of each instruction in the lines. Line numbers start after
+    line_offset, so the labels of a file translated on its own are the same
+    as when it is translated after the files before it.
+
+    With live_functions, only the functions in the set are translated. With
+    cache_stack_top, the top of the stack is kept in D between instructions
+    and written back at the end of each file.
+    """
+    numbered_lines = enumerate(input_lines, line_offset + 1)
+    if live_functions is not None:
+        numbered_lines = skip_dead_functions(numbered_lines, live_functions, context)
+
+    top_in_d = False
+    file_name = None
+
+    for line_num, line in numbered_lines:
+
+        # a file is translated the same on its own as after the files before it
+        if line.file_name != file_name:
+            file_name = line.file_name
+            if top_in_d:
+                yield StackTopWriteBack().to_asm()
+                top_in_d = False
+
+        if line.is_empty() or line.is_comment():
+            continue
+
+        line.line_num = line_num
+        ins = parse_instruction(line, shared_calls, shared_comparisons, context)
+        routine_usage.add(ins, cache_stack_top, top_in_d)
+
+        if cache_stack_top:
+            asm, top_in_d = ins.to_cached_asm(top_in_d)
+            yield asm
+        else:
+            yield ins.to_asm()
+
+    if top_in_d:
+        yield StackTopWriteBack().to_asm()
+
+def translate_lines(input_lines, file_count=1, shared_calls=False, shared_comparisons=False, live_functions=None, cache_stack_top=False,
+                    routine_usage=None):
+    """
+    Parses and converts Jack VM commands into Hack ASM, yielding the ASM of
+    each instruction as soon as its line is parsed.
+
+    input_lines may be any iterable of Line objects, so the lines can be read
+    lazily and only one instruction is held in memory at a time.
+
+    With shared_calls, each call and return jumps to a single shared routine
+    which is written once after the end of the program. With
+    shared_comparisons, so does each eq, gt and lt. With live_functions, the
+    functions missing from the set are not translated. With cache_stack_top,
+    the top of the stack is kept in D between the instructions of a block,
+    so a value pushed and then used is not stored on the stack.
+
+    All state of the translation is kept in its own context, so lines can be
+    translated in several threads at the same time. A RoutineUsage may be
+    passed in to read the routines and comparisons of the translation.
+    """
+    context = TranslationContext()
+
+    # only write the shared routines which are jumped to
+    routine_usage = init_routine_usage(routine_usage, shared_calls and file_count > 1)
 
     # insert bootstrap code when translating multiple files
     if file_count > 1:
-        instructions.append(BootstrapInstruction())
+        yield BootstrapInstruction(shared_calls, context).to_asm()
+
+    yield from translate_instructions(input_lines, routine_usage, context, shared_calls, shared_comparisons, live_functions=live_functions,
+                                      cache_stack_top=cache_stack_top)
+
+    yield EOFInstruction().to_asm()
+    yield from routine_usage.to_asm()
+
+def translate(input_lines, file_count=1, shared_calls=False, shared_comparisons=False, cache_stack_top=False):
+    """Parses and converts Jack VM commands into a list of Hack ASM."""
+    return list(translate_lines(input_lines, file_count, shared_calls, shared_comparisons, cache_stack_top=cache_stack_top))
 
-    for i, line in enumerate(input_lines):
+def translate_program(files, shared_calls=False, shared_comparisons=False, cache_stack_top=False):
+    """
+    Translates a list of VM file paths and returns the ASM of the program.
 
+    The function is reentrant, so it can be called by a long-running process
+    or by several threads at the same time.
+    """
+    vm_files = [Path(file) for file in files]
+    return ''.join(translate_lines(read_input_lines(vm_files), len(vm_files), shared_calls, shared_comparisons, cache_stack_top=cache_stack_top))
+
+def scan_vm_file(path):
+    """
+    Returns the number of lines in a VM file and the name of the last function
+    declared in it, or None if it declares no functions.
+    """
+    line_count = 0
+    last_function = None
+
+    for line in read_input_lines([path]):
+        line_count += 1
         if line.is_empty() or line.is_comment():
             continue
 
-        line.line_num = i + 1
-        ins = parse_instruction(line)
-        instructions.append(ins)
+        declared_function = get_declared_function(tokenize(line.raw_line))
+        if declared_function is not None:
+            last_function = declared_function
+
+    return line_count, last_function
+
+def translate_vm_file(path, line_offset, calling_function, shared_calls=False, shared_comparisons=False, live_functions=None, cache_stack_top=False):
+    """
+    Translates a single VM file inside of a worker process.
+
+    The file's labels depend on the lines and the function scope before it,
+    so both are passed in. Returns the ASM of the file and the shared routines
+    it jumps to.
+    """
+    context = TranslationContext(calling_function)
+    routine_usage = RoutineUsage()
+    asm = ''.join(translate_instructions(read_input_lines([path]), routine_usage, context, shared_calls, shared_comparisons, line_offset, live_functions,
+                                         cache_stack_top))
+    return asm, routine_usage
+
+def translate_files_in_parallel(vm_files, job_count=None, shared_calls=False, shared_comparisons=False, live_functions=None, cache_stack_top=False,
+                                routine_usage=None):
+    """
+    Translates each VM file in a pool of worker processes, yielding the ASM in
+    the same order as translate_lines.
+
+    The line offset and function scope at the start of each file are found
+    with a quick scan of the files before it, so the output is the same as
+    translating the files one after another.
+    """
+    file_count = len(vm_files)
+    context = TranslationContext()
+    routine_usage = init_routine_usage(routine_usage, shared_calls and file_count > 1)
+
+    if file_count > 1:
+        yield BootstrapInstruction(shared_calls, context).to_asm()
+
+    line_offsets = []
+    calling_functions = []
+    line_offset = 0
+    calling_function = context.calling_function
+
+    for path in vm_files:
+        line_offsets.append(line_offset)
+        calling_functions.append(calling_function)
+
+        line_count, last_function = scan_vm_file(path)
+        line_offset += line_count
+        if last_function is not None:
+            calling_function = last_function
 
-    instructions.append(EOFInstruction())
+    worker = partial(translate_vm_file, shared_calls=shared_calls, shared_comparisons=shared_comparisons, live_functions=live_functions,
+                     cache_stack_top=cache_stack_top)
 
-    asm = []
-    for ins in instructions:
-        asm.append(ins.to_asm())
+    with ProcessPoolExecutor(max_workers=job_count) as executor:
+        for asm, file_routine_usage in executor.map(worker, vm_files, line_offsets, calling_functions):
+            routine_usage.update(file_routine_usage)
+            yield asm
 
-    return asm
+    yield EOFInstruction().to_asm()
+    yield from routine_usage.to_asm()
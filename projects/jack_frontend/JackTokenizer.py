@@ -0,0 +1,353 @@
+from array import array
+
+from .exceptions import JackTokenizerError
+from .lexical_elements import get_token, SYMBOLS, TOKEN_PATTERN
+from .tokens import StringConstantToken
+from .xml_sinks import NullSink, XmlFileSink
+
+class JackTokenizer():
+    """
+    Tokenizer for the Jack language.
+
+    Create a single instance of JackTokenizer for each Jack file.
+    """
+
+    def __init__(self, jack_file_path, xml_output=False, xml_name_suffix=''):
+        """
+        When xml_output is True, the tokens are streamed to the XML token
+        file, with xml_name_suffix inserted before its extension.
+        """
+
+        self.parent_dir = jack_file_path.parent
+        self.file_name = jack_file_path.stem
+        self.xml_name_suffix = xml_name_suffix
+
+        self.cursor = 0
+        self.current_token = None
+        self.line_num = 1
+        self.is_single_line_comment = False
+        self.is_multi_line_comment = False
+        self.skip_xml = False
+
+        # tokens are streamed to the XML file as they are consumed
+        if xml_output:
+            try:
+                self.xml_sink = XmlFileSink(self.get_xml_output_file_path(), 'tokens', indent=0)
+            except OSError as error:
+                raise IOError(f"Unable to create XML token file at: '{self.get_xml_output_file_path()}'") from error
+        else:
+            self.xml_sink = NullSink()
+
+        with open(jack_file_path, 'r', encoding='utf-8') as jack_file:
+            self.raw_source_code = jack_file.read()
+            self.raw_course_code_char_count = len(self.raw_source_code)
+
+    def get_xml_output_file_path(self):
+        """Returns the output file path for the XML file."""
+        return f'{self.parent_dir}/{self.file_name}T{self.xml_name_suffix}.xml'
+
+    def add_token_to_xml(self):
+        """Inserts the current token into the XML output."""
+        if not self.skip_xml and self.current_token is not None:
+            self.xml_sink.add_token(self.current_token)
+
+    def write_xml(self):
+        """Completes the XML token file."""
+        self.xml_sink.close()
+
+    def discard_xml(self):
+        """Removes the XML token file if it was not completed."""
+        self.xml_sink.discard()
+
+    def char_is_skippable(self):
+        """Determines if the current char can be skipped during tokenization."""
+
+        # check for comment start
+        if (not self.is_single_line_comment
+            and not self.is_multi_line_comment
+            and self.cursor < (self.raw_course_code_char_count - 2)
+        ):
+            potential_comment = self.raw_source_code[self.cursor:(self.cursor + 2)]
+            if potential_comment == '//':
+                self.is_single_line_comment = True
+            elif potential_comment == '/*':
+                self.is_multi_line_comment = True
+
+        # check for comment end
+        if self.is_single_line_comment:
+            if self.raw_source_code[self.cursor] == '\n':
+                self.is_single_line_comment = False
+
+        elif self.is_multi_line_comment and self.cursor < (self.raw_course_code_char_count - 2):
+            if self.raw_source_code[self.cursor:(self.cursor + 2)] == '*/':
+                self.is_multi_line_comment = False
+                self.cursor += 2
+
+        if self.is_single_line_comment or self.is_multi_line_comment:
+            return True
+
+        if self.raw_source_code[self.cursor].isspace():
+            if self.raw_source_code[self.cursor] == '\n':
+                self.line_num += 1
+            return True
+
+        return False
+
+    def char_terminates_token(self):
+        """Determines if the current char terminates a token scan."""
+
+        if self.raw_source_code[self.cursor] in SYMBOLS:
+            return True
+
+        if self.char_is_skippable():
+            return True
+
+        return False
+
+    def hasMoreTokens(self):
+        """Determines if the current Jack file can contain additional tokens."""
+        return self.cursor < self.raw_course_code_char_count
+
+    def advance(self):
+        """Select the next token in the Jack file."""
+
+        if not self.hasMoreTokens():
+            self.current_token = None
+            raise JackTokenizerError('Tokenizer has reached the end of the file')
+
+        scanning_token = False
+        scanning_string_constant = False
+        token_start = 0
+
+        while self.hasMoreTokens():
+
+            # start token scan
+            if not scanning_token:
+
+                if not self.char_is_skippable():
+
+                    # symbols do not occupy more than a single char
+                    if self.raw_source_code[self.cursor] in SYMBOLS:
+                        self.current_token = get_token(self.raw_source_code[self.cursor])
+                        self.add_token_to_xml()
+                        self.cursor += 1
+                        break
+
+                    # all other tokens are 2+ characters
+                    else:
+                        # handle string constants
+                        if self.raw_source_code[self.cursor] == '"':
+                            scanning_string_constant = True
+
+                        scanning_token = True
+                        token_start = self.cursor
+
+            # end token scan
+            else:
+
+                # terminate string constants
+                if scanning_string_constant and self.raw_source_code[self.cursor] == '"':
+                    # strip off the leading and trailing double-quotes
+                    string_constant = self.raw_source_code[(token_start + 1):self.cursor]
+                    self.current_token = StringConstantToken(string_constant)
+                    self.add_token_to_xml()
+                    scanning_token = False
+                    scanning_string_constant = False
+                    self.cursor += 1
+                    break
+
+                if not scanning_string_constant and self.char_terminates_token():
+                    self.current_token = get_token(self.raw_source_code[token_start:self.cursor])
+                    self.add_token_to_xml()
+                    scanning_token = False
+                    break
+
+            self.cursor += 1
+
+    def tokenType(self):
+        """Get the type of the current token."""
+        if self.current_token:
+            return self.current_token.type
+        return None
+
+    def peek_next_token(self):
+        """Look at the next token without advancing."""
+
+        # take snapshot of state
+        cursor_backup = self.cursor
+        current_token_backup = self.current_token
+        line_num_backup = self.line_num
+        is_single_line_comment_backup = self.is_single_line_comment
+        is_multi_line_comment_backup = self.is_multi_line_comment
+        self.skip_xml = True
+
+        self.advance()
+        next_token = self.current_token
+
+        # restore state
+        self.cursor = cursor_backup
+        self.current_token = current_token_backup
+        self.line_num = line_num_backup
+        self.is_single_line_comment = is_single_line_comment_backup
+        self.is_multi_line_comment = is_multi_line_comment_backup
+        self.skip_xml = False
+
+        return next_token
+
+class JackRegexTokenizer(JackTokenizer):
+    """
+    Tokenizer for the Jack language backed by a single compiled pattern.
+
+    Produces the same tokens and line numbers as JackTokenizer, but each
+    advance is a handful of regex matches instead of a char-by-char walk.
+    """
+
+    def scan_next_token(self):
+        """
+        Scans from the cursor to the end of the next token without changing state.
+
+        Returns the token (None when only whitespace and comments remain), the
+        new cursor position, and the new line number.
+        """
+        source = self.raw_source_code
+        cursor = self.cursor
+        line_num = self.line_num
+        after_block_comment = False
+
+        while True:
+
+            # JackTokenizer does not check for a comment start on the char
+            # immediately after '*/' so a '/' there is always a symbol
+            if after_block_comment and source.startswith('/', cursor):
+                return get_token('/'), cursor + 1, line_num
+
+            match = TOKEN_PATTERN.match(source, cursor)
+            if match is None:
+                return None, self.raw_course_code_char_count, line_num
+
+            kind = match.lastgroup
+            cursor = match.end()
+            after_block_comment = False
+
+            if kind == 'whitespace':
+                line_num += match.group().count('\n')
+
+            elif kind == 'block_comment':
+                # newlines inside of multi-line comments are not counted
+                after_block_comment = True
+
+            elif kind == 'string':
+                return StringConstantToken(match.group('string')), cursor, line_num
+
+            elif kind == 'symbol':
+                return get_token(match.group()), cursor, line_num
+
+            elif kind == 'word':
+                # the cursor stops on the char that terminated the token, which
+                # is counted now and again by the next scan when it is a newline
+                if source.startswith('\n', cursor):
+                    line_num += 1
+                return get_token(match.group()), cursor, line_num
+
+    def advance(self):
+        """Select the next token in the Jack file."""
+
+        if not self.hasMoreTokens():
+            self.current_token = None
+            raise JackTokenizerError('Tokenizer has reached the end of the file')
+
+        next_token, self.cursor, self.line_num = self.scan_next_token()
+
+        # only whitespace and comments remained, keep the current token
+        if next_token is not None:
+            self.current_token = next_token
+            self.add_token_to_xml()
+
+    def peek_next_token(self):
+        """Look at the next token without advancing."""
+
+        if not self.hasMoreTokens():
+            raise JackTokenizerError('Tokenizer has reached the end of the file')
+
+        next_token, _, _ = self.scan_next_token()
+        if next_token is None:
+            return self.current_token
+        return next_token
+
+class JackBufferedTokenizer(JackRegexTokenizer):
+    """
+    Tokenizer for the Jack language that lexes the whole file up front.
+
+    Tokens, line numbers, and cursor positions are stored in a buffer so
+    advance() and peek_next_token() are index operations.
+    """
+
+    def __init__(self, jack_file_path, xml_output=False, xml_name_suffix=''):
+        super().__init__(jack_file_path, xml_output, xml_name_suffix)
+
+        self.token_index = -1
+        self.tokens = []
+        self.token_lines = array('I')
+        self.token_cursors = array('I')
+
+        # a lexing error is raised when the tokenizer reaches it, not when
+        # the file is loaded, to match the other tokenizers
+        self.lex_error = None
+
+        while self.cursor < self.raw_course_code_char_count:
+            try:
+                next_token, self.cursor, self.line_num = self.scan_next_token()
+            except JackTokenizerError as error:
+                self.lex_error = error
+                break
+            if next_token is not None:
+                self.tokens.append(next_token)
+                self.token_lines.append(self.line_num)
+                self.token_cursors.append(self.cursor)
+
+        # state after the last token (only whitespace and comments remain)
+        self.end_line_num = self.line_num
+        self.end_cursor = self.cursor
+
+        self.cursor = 0
+        self.line_num = 1
+
+    def advance(self):
+        """Select the next token in the Jack file."""
+
+        next_index = self.token_index + 1
+
+        if next_index < len(self.tokens):
+            self.token_index = next_index
+            self.current_token = self.tokens[next_index]
+            self.line_num = self.token_lines[next_index]
+            self.cursor = self.token_cursors[next_index]
+            self.add_token_to_xml()
+            return
+
+        if self.lex_error is not None:
+            raise self.lex_error
+
+        if not self.hasMoreTokens():
+            self.current_token = None
+            raise JackTokenizerError('Tokenizer has reached the end of the file')
+
+        # only whitespace and comments remain, keep the current token
+        self.line_num = self.end_line_num
+        self.cursor = self.end_cursor
+
+    def peek_next_token(self, k=1):
+        """Look at the token k positions ahead without advancing."""
+
+        peek_index = self.token_index + k
+
+        if peek_index < len(self.tokens):
+            return self.tokens[peek_index]
+
+        if self.lex_error is not None:
+            raise self.lex_error
+
+        if k == 1 and self.hasMoreTokens():
+            return self.current_token
+
+        raise JackTokenizerError('Tokenizer has reached the end of the file')
@@ -0,0 +1,4 @@
+"""
+Jack front-end shared by the JackAnalyzer of project 10 and the JackCompiler
+of project 11: the tokens, the tokenizers and the XML output.
+"""
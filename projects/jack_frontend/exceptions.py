@@ -0,0 +1,8 @@
+class JackError(Exception):
+    """Base exception for errors handled by the Jack front-end and the tools which use it."""
+    def __str__(self):
+        return f'Error - {self.args[0]}'
+
+class JackTokenizerError(JackError):
+    """Exception for errors handled by the JackTokenizer."""
+    pass
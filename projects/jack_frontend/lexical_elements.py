@@ -0,0 +1,82 @@
+import re
+import sys
+
+from . import tokens as T
+
+KEYWORDS = {
+    'class',
+    'constructor',
+    'function',
+    'method',
+    'field',
+    'static',
+    'var',
+    'int',
+    'char',
+    'boolean',
+    'void',
+    'true',
+    'false',
+    'null',
+    'this',
+    'let',
+    'do',
+    'if',
+    'else',
+    'while',
+    'return'
+}
+
+SYMBOLS = {
+    '(',
+    ')',
+    '{',
+    '}',
+    '[',
+    ']',
+    '.',
+    ',',
+    ';',
+    '+',
+    '-',
+    '*',
+    '/',
+    '&',
+    '|',
+    '<',
+    '>',
+    '=',
+    '~'
+}
+
+# keywords and symbols never change, so a single token is shared for each
+KEYWORD_TOKENS = {keyword: T.KeywordToken(keyword) for keyword in KEYWORDS}
+SYMBOL_TOKENS = {symbol: T.SymbolToken(symbol) for symbol in SYMBOLS}
+
+_SYMBOL_CLASS = ''.join(re.escape(symbol) for symbol in sorted(SYMBOLS))
+
+# single compiled pattern used by JackRegexTokenizer, alternatives are tried in
+# order so comments always take priority over the '/' symbol
+TOKEN_PATTERN = re.compile(
+    r'(?P<whitespace>\s+)'
+    r'|(?P<line_comment>//[^\n]*)'
+    # the closing '*/' may reuse the opening '*' (ex: '/*/')
+    r'|(?P<block_comment>/(?=\*)[\s\S]*?(?:\*/|\Z))'
+    r'|"(?P<string>[^"]*)"'
+    rf'|(?P<symbol>[{_SYMBOL_CLASS}])'
+    rf'|(?P<word>[^\s"{_SYMBOL_CLASS}][^\s{_SYMBOL_CLASS}]*)'
+)
+
+def get_token(value):
+    """Returns the token type based on a sequence of chars."""
+
+    if value in KEYWORD_TOKENS:
+        return KEYWORD_TOKENS[value]
+
+    if value in SYMBOL_TOKENS:
+        return SYMBOL_TOKENS[value]
+
+    if T.IntegerConstantToken.is_integer_token(value):
+        return T.IntegerConstantToken(value)
+
+    return T.IdentifierToken(sys.intern(value))
@@ -1,12 +1,18 @@
-from constants import TOKEN_TYPE
-from exceptions import JackTokenizerError
+from .constants import TOKEN_TYPE
+from .exceptions import JackTokenizerError
 
 class BaseToken():
-    """Base class for all Tokens."""
+    """
+    Base class for all Tokens.
+
+    Tokens only store their value, the type is shared by each token class.
+    """
+
+    __slots__ = ('value',)
+    type = 'token'
 
     def __init__(self, value=''):
         self.value = value
-        self.type = 'token'
 
     def get_xml_value(self):
         """Returns the token's value formatted for xml."""
@@ -15,6 +21,9 @@ class BaseToken():
 class IdentifierToken(BaseToken):
     """Class, method, function, or variable names."""
 
+    __slots__ = ()
+    type = TOKEN_TYPE.IDENTIFIER
+
     def __init__(self, value):
 
         # first char cannot be a number
@@ -31,18 +40,16 @@ class IdentifierToken(BaseToken):
                 raise JackTokenizerError(f"Identifier '{value}' contains illegal characters")
 
         self.value = value
-        self.type = TOKEN_TYPE.IDENTIFIER
 
 class IntegerConstantToken(BaseToken):
     """Integers from 0-32767."""
 
+    __slots__ = ()
+    type = TOKEN_TYPE.INTEGER_CONSTANT
+
     MIN = 0
     MAX = 32767
 
-    def __init__(self, value):
-        self.value = value
-        self.type = TOKEN_TYPE.INTEGER_CONSTANT
-
     @staticmethod
     def is_integer_token(value):
         try:
@@ -56,20 +63,17 @@ class IntegerConstantToken(BaseToken):
 class KeywordToken(BaseToken):
     """One of the language defined keywords."""
 
-    def __init__(self, value):
-        self.value = value
-        self.type = TOKEN_TYPE.KEYWORD
+    __slots__ = ()
+    type = TOKEN_TYPE.KEYWORD
 
 class StringConstantToken(BaseToken):
     """A sequence of chars bounded by double-quotes."""
 
-    def __init__(self, value):
-        self.value = value
-        self.type = TOKEN_TYPE.STRING_CONSTANT
+    __slots__ = ()
+    type = TOKEN_TYPE.STRING_CONSTANT
 
 class SymbolToken(BaseToken):
     """One of the language defined symbols."""
 
-    def __init__(self, value):
-        self.value = value
-        self.type = TOKEN_TYPE.SYMBOL
+    __slots__ = ()
+    type = TOKEN_TYPE.SYMBOL
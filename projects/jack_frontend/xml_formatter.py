@@ -0,0 +1,91 @@
+from pathlib import Path
+
+def escape_xml(text):
+    """Escapes the XML special characters in element text and attribute values."""
+    return (text.replace('&', '&amp;')
+                .replace('<', '&lt;')
+                .replace('"', '&quot;')
+                .replace('>', '&gt;'))
+
+class XmlStreamWriter():
+    """
+    Pretty-printing XML serializer which writes elements straight to a file as
+    they are created.
+
+    Elements with no content are written as <xml/> unless they are marked
+    empty, which writes the start and end tags on separate lines instead.
+    """
+
+    def __init__(self, output_path, indent=2):
+        self.output_path = output_path
+        self.output_file = open(output_path, 'w')
+        self.indent = ' ' * indent
+        # names of the open elements, the root is at the bottom of the stack
+        self.element_stack = []
+        # the start tag of the top element is left unterminated until its
+        # content is known
+        self.start_tag_pending = False
+        self.top_marked_empty = False
+
+    def write_pending_start_tag(self):
+        """Terminates the start tag of the top element before writing its content."""
+        if self.start_tag_pending:
+            self.output_file.write('>\n')
+            self.start_tag_pending = False
+
+    def write_start_tag(self, name, attrs):
+        """Writes an unterminated start tag at the current depth."""
+        self.write_pending_start_tag()
+        self.top_marked_empty = False
+        self.output_file.write(f'{self.indent * len(self.element_stack)}<{name}')
+        if attrs is not None:
+            for k, v in attrs.items():
+                self.output_file.write(f' {k}="{escape_xml(str(v))}"')
+
+    def add_element(self, name, text, attrs=None):
+        """
+        Writes a complete element containing only text.
+
+        Optionally define custom attributes for XML tag.
+        """
+        self.write_start_tag(name, attrs)
+        self.output_file.write(f'>{escape_xml(text)}</{name}>\n')
+
+    def open_element(self, name, attrs=None):
+        """Writes the start of an element so subsequent elements are nested in it."""
+        self.write_start_tag(name, attrs)
+        self.element_stack.append(name)
+        self.start_tag_pending = True
+
+    def mark_empty(self):
+        """XML formatting helper for ensuring tags follow the <xml><xml/> format instead of </xml>."""
+        self.write_pending_start_tag()
+        self.top_marked_empty = True
+
+    def close_element(self):
+        """Writes the end of the top element."""
+        name = self.element_stack.pop()
+        if self.start_tag_pending:
+            self.output_file.write('/>\n')
+            self.start_tag_pending = False
+        elif self.top_marked_empty:
+            # the end tag is not indented
+            self.output_file.write(f'</{name}>\n')
+            self.top_marked_empty = False
+        else:
+            self.output_file.write(f'{self.indent * len(self.element_stack)}</{name}>\n')
+
+    def close(self):
+        """Closes any elements which are still open and the output file."""
+        if self.output_file.closed:
+            return
+        while self.element_stack:
+            self.close_element()
+        self.output_file.close()
+
+    def discard(self):
+        """Closes and removes a file which was not completed, a closed file is kept."""
+        if self.output_file.closed:
+            return
+        self.output_file.close()
+        Path(self.output_path).unlink(missing_ok=True)
@@ -0,0 +1,61 @@
+from .xml_formatter import XmlStreamWriter
+
+class XmlFileSink():
+    """Streams tokens and parse tree elements to an XML file as they are captured."""
+
+    enabled = True
+
+    def __init__(self, output_path, root_name, indent):
+        self.writer = XmlStreamWriter(output_path, indent)
+        self.writer.open_element(root_name)
+
+    def add_token(self, token, attrs=None):
+        """
+        Inserts a token into the most recently opened element.
+
+        Optionally define custom attributes for XML tag.
+        """
+        self.writer.add_element(token.type, token.get_xml_value(), attrs)
+
+    def open_element(self, name):
+        """Creates a new sub-element so subsequent elements are nested in it."""
+        self.writer.open_element(name)
+
+    def close_element(self):
+        """Closes the most recently opened element."""
+        self.writer.close_element()
+
+    def mark_empty(self):
+        """XML formatting helper for ensuring tags follow the <xml><xml/> format instead of </xml>."""
+        self.writer.mark_empty()
+
+    def close(self):
+        """Closes the root element, and any elements left open by an error, and the file."""
+        self.writer.close()
+
+    def discard(self):
+        """Closes and removes the file if it was not completed."""
+        self.writer.discard()
+
+class NullSink():
+    """Discards tokens and parse tree elements when no XML output is requested."""
+
+    enabled = False
+
+    def add_token(self, token, attrs=None):
+        pass
+
+    def open_element(self, name):
+        pass
+
+    def close_element(self):
+        pass
+
+    def mark_empty(self):
+        pass
+
+    def close(self):
+        pass
+
+    def discard(self):
+        pass